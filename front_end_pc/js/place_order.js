@@ -11,6 +11,8 @@ var vm = new Vue({
         total_amount: 0,
         payment_amount: 0,
         order_submitting: false, // 正在提交订单标志
+        // 提交订单的幂等键,重复提交时服务器返回第一次提交的结果
+        idempotency_key: Date.now().toString(36) + Math.random().toString(36).substr(2),
         pay_method: 1, // 支付方式,
         nowsite:0, // 默认地址
         addresses: []
@@ -36,36 +38,49 @@ var vm = new Vue({
                 }
             })
         // 获取结算商品信息
-        axios.get(this.host+'/orders/settlement/', {
-                headers: {
-                    'Authorization': 'JWT ' + this.token
-                },
-                responseType: 'json'
-            })
-            .then(response => {
-                this.skus = response.data.skus;
-                this.freight = response.data.freight;
-                this.total_count = 0;
-                this.total_amount = 0;
-                for(var i=0; i<this.skus.length; i++){
-                    var amount = parseFloat(this.skus[i].price)*this.skus[i].count;
-                    this.skus[i].amount = amount.toFixed(2);
-                    this.total_count += this.skus[i].count;
-                    this.total_amount += amount;
-                }
-                this.payment_amount = parseFloat(this.freight) + this.total_amount;
-                this.payment_amount = this.payment_amount.toFixed(2);
-                this.total_amount = this.total_amount.toFixed(2);
-            })
-            .catch(error => {
-                if (error.response.status == 401){
-                    location.href = '/login.html?next=/cart.html';
-                } else{
-                    console.log(error.response.data);
-                }
-            })
+        this.get_settlement();
+    },
+    watch: {
+        // 切换收货地址之后重新获取结算信息(运费)
+        nowsite: function(){
+            this.get_settlement();
+        }
     },
     methods: {
+        // 获取结算商品信息和运费
+        get_settlement: function(){
+            axios.get(this.host+'/orders/settlement/', {
+                    params: {
+                        address_id: this.nowsite || undefined
+                    },
+                    headers: {
+                        'Authorization': 'JWT ' + this.token
+                    },
+                    responseType: 'json'
+                })
+                .then(response => {
+                    this.skus = response.data.skus;
+                    this.freight = response.data.freight;
+                    this.total_count = 0;
+                    this.total_amount = 0;
+                    for(var i=0; i<this.skus.length; i++){
+                        var amount = parseFloat(this.skus[i].price)*this.skus[i].count;
+                        this.skus[i].amount = amount.toFixed(2);
+                        this.total_count += this.skus[i].count;
+                        this.total_amount += amount;
+                    }
+                    this.payment_amount = parseFloat(this.freight) + this.total_amount;
+                    this.payment_amount = this.payment_amount.toFixed(2);
+                    this.total_amount = this.total_amount.toFixed(2);
+                })
+                .catch(error => {
+                    if (error.response.status == 401){
+                        location.href = '/login.html?next=/cart.html';
+                    } else{
+                        console.log(error.response.data);
+                    }
+                })
+        },
         // 退出
         logout: function(){
             sessionStorage.clear();
@@ -82,7 +97,8 @@ var vm = new Vue({
                         pay_method: this.pay_method
                     }, {
                         headers: {
-                            'Authorization': 'JWT ' + this.token
+                            'Authorization': 'JWT ' + this.token,
+                            'Idempotency-Key': this.idempotency_key
                         },
                         responseType: 'json'
                     })
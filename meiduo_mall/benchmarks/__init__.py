@@ -0,0 +1,13 @@
+# 购物车和下单接口的压力测试
+# 使用SQLite数据库和本地redis(或进程内的fakeredis)启动项目,生成测试用户和商品,
+# 通过线程池/进程池并发调用Django测试客户端,统计每个接口的延迟分位数、吞吐量、数据库查询次数和redis命令数
+#
+# 使用方法(在manage.py所在目录执行):
+#   python -m benchmarks.run --users 50 --skus 200 --sessions 500 --concurrency 8 --output bench.json
+#   python -m benchmarks.run --redis-url redis://127.0.0.1:6379 --processes ...   # 使用本地redis和进程池
+#   python -m benchmarks.run ... --baseline old.json   # 和上一次的结果对比
+# 不指定--redis-url时使用fakeredis(需要安装fakeredis和lupa),只支持线程池
+# 指定--database-url时使用MySQL代替SQLite(数据会被清空,请使用单独的数据库)
+#
+# 库存竞争压测(对比乐观锁、悲观锁、条件更新和redis库存预留),使用方法见benchmarks/contention.py:
+#   python -m benchmarks.contention --buyers 50 --attempts 20 --hot-skus 5 --stock 500
@@ -0,0 +1,86 @@
+# 压测指标: 每个请求的延迟、数据库查询次数和redis命令数
+import threading
+
+import redis
+
+# 当前线程执行的redis命令数
+_local = threading.local()
+
+
+def install_redis_counter():
+    """统计每个线程执行的redis命令数(管道中的命令逐条统计)"""
+    if getattr(redis.StrictRedis, '_bench_counted', False):
+        return
+
+    execute_command = redis.StrictRedis.execute_command
+
+    def counted_execute_command(self, *args, **options):
+        _local.count = getattr(_local, 'count', 0) + 1
+        return execute_command(self, *args, **options)
+
+    # 管道对象在执行时统计管道中的命令数
+    pipeline_class = getattr(redis.client, 'BasePipeline', redis.client.Pipeline)
+    pipeline_execute = pipeline_class.execute
+
+    def counted_pipeline_execute(self, *args, **kwargs):
+        _local.count = getattr(_local, 'count', 0) + len(self.command_stack)
+        return pipeline_execute(self, *args, **kwargs)
+
+    redis.StrictRedis.execute_command = counted_execute_command
+    pipeline_class.execute = counted_pipeline_execute
+    redis.StrictRedis._bench_counted = True
+
+
+def reset_redis_count():
+    _local.count = 0
+
+
+def get_redis_count():
+    return getattr(_local, 'count', 0)
+
+
+def percentile(sorted_values, p):
+    """最近秩法计算分位数,sorted_values为排好序的列表"""
+    if not sorted_values:
+        return 0
+
+    index = max(int(round(p / 100.0 * len(sorted_values))) - 1, 0)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+def summarize(samples, duration):
+    """
+    汇总一组请求的指标
+    samples: [{'latency': <秒>, 'status': <状态码>, 'queries': <查询次数>, 'redis': <命令数>}, ...]
+    duration: 压测总耗时(秒)
+    """
+    latencies = sorted(sample['latency'] * 1000 for sample in samples)
+    queries = [sample['queries'] for sample in samples]
+    commands = [sample['redis'] for sample in samples]
+
+    statuses = {}
+    for sample in samples:
+        statuses[str(sample['status'])] = statuses.get(str(sample['status']), 0) + 1
+
+    count = len(samples)
+    return {
+        'requests': count,
+        'errors': sum(1 for sample in samples if sample['status'] >= 500),
+        'status': statuses,
+        'throughput': round(count / duration, 2) if duration else 0,
+        'latency_ms': {
+            'mean': round(sum(latencies) / count, 3) if count else 0,
+            'p50': round(percentile(latencies, 50), 3),
+            'p95': round(percentile(latencies, 95), 3),
+            'p99': round(percentile(latencies, 99), 3),
+            'max': round(latencies[-1], 3) if count else 0,
+        },
+        'db_queries': {
+            'mean': round(sum(queries) / count, 2) if count else 0,
+            'max': max(queries) if count else 0,
+        },
+        'redis_commands': {
+            'mean': round(sum(commands) / count, 2) if count else 0,
+            'max': max(commands) if count else 0,
+        },
+    }
@@ -0,0 +1,81 @@
+# 生成压测数据: 地区、商品分类、SKU、用户和收货地址
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from rest_framework_jwt.settings import api_settings
+
+from areas.models import Area
+from goods.models import GoodsCategory, Brand, Goods, SKU
+from users.models import User, Address
+
+
+def create_tables():
+    """创建数据库表并清空数据"""
+    call_command('migrate', interactive=False, verbosity=0)
+    call_command('flush', interactive=False, verbosity=0)
+
+
+def seed(users_count, skus_count, stock):
+    """
+    生成压测数据
+    返回: {
+        'users': [{'id': <user_id>, 'token': <jwt token>, 'address': <address_id>}, ...],
+        'skus': [<sku_id>, ...]
+    }
+    """
+    # 1.地区
+    province = Area.objects.create(name='压测省')
+    city = Area.objects.create(name='压测市', parent=province)
+    district = Area.objects.create(name='压测区', parent=city)
+
+    # 2.商品: 所有SKU属于同一个SPU
+    category1 = GoodsCategory.objects.create(name='压测一级')
+    category2 = GoodsCategory.objects.create(name='压测二级', parent=category1)
+    category3 = GoodsCategory.objects.create(name='压测三级', parent=category2)
+    brand = Brand.objects.create(name='压测品牌', logo='bench.jpg', first_letter='Y')
+    goods = Goods.objects.create(name='压测商品', brand=brand, category1=category1,
+                                 category2=category2, category3=category3)
+
+    SKU.objects.bulk_create([
+        SKU(
+            name='压测商品%d' % i,
+            caption='',
+            goods=goods,
+            category=category3,
+            price=Decimal('%d.00' % (i % 100 + 1)),
+            cost_price=Decimal('1.00'),
+            market_price=Decimal('%d.00' % (i % 100 + 2)),
+            stock=stock,
+            default_image_url='bench.jpg'
+        ) for i in range(skus_count)
+    ])
+    sku_ids = list(SKU.objects.filter(goods=goods).order_by('id').values_list('id', flat=True))
+
+    # 3.用户和收货地址
+    password = make_password('bench123')
+    User.objects.bulk_create([
+        User(username='bench%06d' % i, password=password, mobile='13%09d' % i) for i in range(users_count)
+    ])
+    users = list(User.objects.filter(username__startswith='bench').order_by('id'))
+
+    Address.objects.bulk_create([
+        Address(user=user, title='压测地址', receiver=user.username, province=province, city=city,
+                district=district, place='压测路1号', mobile=user.mobile) for user in users
+    ])
+    address_ids = dict(Address.objects.filter(user__in=users).values_list('user_id', 'id'))
+
+    # 4.生成每个用户的jwt token
+    jwt_payload_handler = api_settings.JWT_PAYLOAD_HANDLER
+    jwt_encode_handler = api_settings.JWT_ENCODE_HANDLER
+
+    return {
+        'users': [
+            {
+                'id': user.id,
+                'token': jwt_encode_handler(jwt_payload_handler(user)),
+                'address': address_ids[user.id]
+            } for user in users
+        ],
+        'skus': sku_ids
+    }
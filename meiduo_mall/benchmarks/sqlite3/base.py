@@ -0,0 +1,10 @@
+# 压力测试使用的SQLite数据库后端
+# SQLite的事务默认在第一次写入时才获取写锁,并发的事务都已经读取数据之后同时写入时,
+# 后写入的事务不会等待锁(OPTIONS中的timeout不起作用)而是直接报错database is locked;
+# 事务开始时就获取写锁(BEGIN IMMEDIATE),并发的事务按照timeout等待,依次执行
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
@@ -1,2 +1,18 @@
 # 设置中间人地址
-broker_url = 'redis://127.0.0.1:6379/3'
\ No newline at end of file
+broker_url = 'redis://127.0.0.1:6379/3'
+
+# 异步下单任务使用单独的orders队列,由单独的worker按照可控的并发数处理:
+# celery -A celery_tasks.main worker -Q orders -c 4
+task_routes = {
+    'place_order': {'queue': 'orders'},
+    'cancel_expired_orders': {'queue': 'orders'},
+}
+
+# 定时任务(celery -A celery_tasks.main beat)
+beat_schedule = {
+    # 每1分钟取消一次超过支付期限的订单
+    'cancel-expired-orders': {
+        'task': 'cancel_expired_orders',
+        'schedule': 60.0,
+    },
+}
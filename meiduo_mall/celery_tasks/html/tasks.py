@@ -1,108 +1,51 @@
 import os
 
-from django.conf import settings
-
-from goods.models import SKU
-from goods.utils import get_categories
+from goods.details import generate_goods_detail_html, get_detail_html_path
+from goods.models import Goods, SKU
+from goods.pages import get_category_goods_ids
 
 from celery_tasks.main import celery_app
 
 @celery_app.task(name='generate_static_sku_detail_html')
 def generate_static_sku_detail_html(sku_id):
-    """生成指定商品的静态详情页面"""
-    # 1. 获取商品详情页面所需数据
-    # 商品分类菜单
-    categories = get_categories()
-
-    # 获取当前sku的信息
-    sku = SKU.objects.get(id=sku_id)
-    sku.images = sku.skuimage_set.all()
-
-    # 面包屑导航信息中的频道
-    goods = sku.goods
-    goods.channel = goods.category1.goodschannel_set.all()[0]
-
-    # 构建当前商品的规格键
-    # sku_key = [规格1参数id， 规格2参数id， 规格3参数id, ...]
-    sku_specs = sku.skuspecification_set.order_by('spec_id')
-    sku_key = []
-    for spec in sku_specs:
-        sku_key.append(spec.option.id)
-
-    # 获取当前商品的所有SKU
-    skus = goods.sku_set.all()
-
-    # 构建不同规格参数（选项）的sku字典
-    # spec_sku_map = {
-    #     (规格1参数id, 规格2参数id, 规格3参数id, ...): sku_id,
-    #     (规格1参数id, 规格2参数id, 规格3参数id, ...): sku_id,
-    #     ...
-    # }
-    spec_sku_map = {}
-    for s in skus:
-        # 获取sku的规格参数
-        s_specs = s.skuspecification_set.order_by('spec_id')
-        # 用于形成规格参数-sku字典的键
-        key = []
-        for spec in s_specs:
-            key.append(spec.option.id)
-        # 向规格参数-sku字典添加记录
-        spec_sku_map[tuple(key)] = s.id
-
-    # 获取当前商品的规格信息
-    # specs = [
-    #    {
-    #        'name': '屏幕尺寸',
-    #        'options': [
-    #            {'value': '13.3寸', 'sku_id': xxx},
-    #            {'value': '15.4寸', 'sku_id': xxx},
-    #        ]
-    #    },
-    #    {
-    #        'name': '颜色',
-    #        'options': [
-    #            {'value': '银色', 'sku_id': xxx},
-    #            {'value': '黑色', 'sku_id': xxx}
-    #        ]
-    #    },
-    #    ...
-    # ]
-    specs = goods.goodsspecification_set.order_by('id')
-    # 若当前sku的规格信息不完整，则不再继续
-    if len(sku_key) < len(specs):
+    """生成指定商品的静态详情页面,商品已经删除时删除页面文件"""
+    goods_id = SKU.objects.filter(id=sku_id).values_list('goods_id', flat=True).first()
+    if goods_id is None:
+        try:
+            os.remove(get_detail_html_path(sku_id))
+        except FileNotFoundError:
+            pass
         return
-    for index, spec in enumerate(specs):
-        # 复制当前sku的规格键
-        key = sku_key[:]
-        # 该规格的选项
-        options = spec.specificationoption_set.all()
-        for option in options:
-            # 在规格参数sku字典中查找符合当前规格的sku
-            key[index] = option.id
-            option.sku_id = spec_sku_map.get(tuple(key))
 
-        spec.options = options
+    generate_goods_detail_html(goods_id, sku_ids=[sku_id])
 
 
+@celery_app.task(name='generate_static_goods_detail_html')
+def generate_static_goods_detail_html(goods_id):
+    """生成指定商品(SPU)所有SKU的静态详情页面(规格修改之后,同一商品其他SKU页面中的规格链接也需要更新)"""
+    try:
+        generate_goods_detail_html(goods_id)
+    except Goods.DoesNotExist:
+        # 商品已经删除,SKU的页面文件由SKU的任务删除
+        pass
 
-    # 2. 调用'detail.html'模板文件,进行模板渲染,获取渲染之后的html页面内容
-    context = {
-        'categories': categories,
-        'goods': goods,
-        'specs': specs,
-        'sku': sku
-    }
 
-    # 2.1 加载模板:指定使用模板文件,获取模板对象
-    from django.template import loader
-    temp = loader.get_template('detail.html')
+@celery_app.task(name='generate_static_category_detail_html')
+def generate_static_category_detail_html(category_id=None):
+    """按商品拆分任务,生成类别下(category_id为None时为所有)商品的静态详情页面"""
+    for goods_id in get_category_goods_ids(category_id).iterator():
+        generate_static_goods_detail_html.delay(goods_id)
 
-    # 2.2 模板渲染:获取替换之后html页面内容
-    res_html = temp.render(context)
 
-    # 3. 将渲染之后的html页面内容保存成一个静态文件
+@celery_app.task(name='generate_static_index_html')
+def generate_static_index_html():
+    """生成首页静态页面index.html"""
+    from contents.crons import generate_static_index_html
+    generate_static_index_html()
 
-    save_path = os.path.join(settings.GENERATED_STATIC_HTML_FILES_DIR, 'goods/%s.html' % sku_id)
 
-    with open(save_path, 'w') as f:
-        f.write(res_html)
\ No newline at end of file
+@celery_app.task(name='flush_static_pages')
+def flush_static_pages():
+    """窗口期结束时生成窗口期内合并的所有页面"""
+    from goods.pages import flush_pages
+    flush_pages()
@@ -12,4 +12,4 @@ celery_app = Celery('eityh')
 celery_app.config_from_object('celery_tasks.config')
 
 # 让celery worker启动是自动发现有那些任务函数
-celery_app.autodiscover_tasks(['celery_tasks.sms', 'celery_tasks.email', 'celery_tasks.html'])
\ No newline at end of file
+celery_app.autodiscover_tasks(['celery_tasks.sms', 'celery_tasks.email', 'celery_tasks.html', 'celery_tasks.orders'])
\ No newline at end of file
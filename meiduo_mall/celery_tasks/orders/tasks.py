@@ -0,0 +1,56 @@
+from rest_framework import serializers
+
+from cart.storage import RedisCart
+from orders.placement import place_order
+from orders.tickets import finish_ticket, release_submission, claim_submission, get_ticket, TICKET_PENDING
+from users.models import User, Address
+
+from celery_tasks.main import celery_app
+
+# 获取日志器
+import logging
+logger = logging.getLogger('django')
+
+
+@celery_app.task(name='place_order')
+def place_order_task(ticket_id, user_id, address_id, pay_method, items):
+    """
+    异步下单任务(orders队列)
+    items: 下单时购物车中被勾选商品的快照 [[sku_id, count], ...]
+    """
+    # 凭证已经有下单结果(任务重复投递)或者已经过期时不再下单
+    ticket = get_ticket(ticket_id)
+    if ticket is None or ticket['status'] != TICKET_PENDING:
+        return
+
+    # 任务排队期间下单任务标记过期,用户又提交了新的下单任务时,由新的任务下单
+    if not claim_submission(user_id, ticket_id):
+        finish_ticket(ticket_id, message='下单请求已过期,请查看最新的下单结果')
+        return
+
+    cart_dict = {int(sku_id): int(count) for sku_id, count in items}
+
+    try:
+        user = User.objects.get(id=user_id)
+        address = Address.objects.get(id=address_id, user=user)
+        order = place_order(user, address, pay_method, cart_dict)
+    except serializers.ValidationError as e:
+        finish_ticket(ticket_id, message=str(e.detail[0]))
+    except Exception as e:
+        logger.error('异步下单失败: [ticket_id:%s user_id:%s] %s' % (ticket_id, user_id, e))
+        finish_ticket(ticket_id, message='下单失败')
+    else:
+        # 删除购物车中已经下单的商品
+        RedisCart(user_id).delete(*cart_dict.keys())
+        finish_ticket(ticket_id, order_id=order.order_id)
+    finally:
+        # 下单任务结束(成功时购物车中已下单的商品已经删除),用户可以再次提交订单
+        release_submission(user_id, ticket_id)
+
+
+@celery_app.task(name='cancel_expired_orders')
+def cancel_expired_orders_task():
+    """定时任务: 取消超过支付期限仍未支付的订单并归还库存"""
+    from orders.deadlines import cancel_expired_orders
+
+    cancel_expired_orders()
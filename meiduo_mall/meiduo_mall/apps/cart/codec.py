@@ -0,0 +1,190 @@
+# 购物车cookie编解码
+# 编码格式(版本1):
+#   版本号(1字节) + 商品条数(varint) + 商品记录 * N + HMAC签名(8字节)
+#   每条商品记录: sku_id与上一条sku_id的差值(varint) + (count << 1 | selected)(varint)
+# 编码结果使用urlsafe base64(去掉末尾的'=')保存到cookie中
+import base64
+import hashlib
+import hmac
+import io
+import pickle
+
+from django.conf import settings
+
+from cart import constants
+
+
+# 旧版本cookie(pickle协议2及以上)的第一个字节
+LEGACY_PICKLE_PROTO = 0x80
+
+
+class CartCookieError(ValueError):
+    """购物车cookie数据无效"""
+    pass
+
+
+class CartCookieFullError(ValueError):
+    """购物车商品条数超过cookie能保存的上限"""
+    pass
+
+
+def _signature(payload):
+    """计算购物车cookie数据的签名"""
+    key = ('meiduo.cart.cookie' + settings.SECRET_KEY).encode()
+    digest = hmac.new(key, payload, hashlib.sha256).digest()
+    return digest[:constants.CART_COOKIE_SIGNATURE_LENGTH]
+
+
+def _write_varint(buf, value):
+    """将非负整数以varint格式写入buf"""
+    while value > 0x7f:
+        buf.append((value & 0x7f) | 0x80)
+        value >>= 7
+    buf.append(value)
+
+
+def _read_varint(data, pos):
+    """从data的pos位置读取一个varint,返回(value, 新的pos)"""
+    # 单字节varint(小于128)是最常见的情况,直接返回
+    if pos < len(data) and data[pos] < 0x80:
+        return data[pos], pos + 1
+
+    value = 0
+    shift = 0
+    # varint最多10个字节,防止恶意数据导致超长循环
+    for _ in range(10):
+        if pos >= len(data):
+            raise CartCookieError('数据不完整')
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+    raise CartCookieError('varint过长')
+
+
+class _LegacyUnpickler(pickle.Unpickler):
+    """只允许解析内置类型的Unpickler,用于安全读取旧版本的cookie"""
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError('不允许加载%s.%s' % (module, name))
+
+
+def _loads_legacy(raw):
+    """
+    解析旧版本pickle格式的cookie数据
+    旧版本没有商品条数上限,返回全部商品(不截断,登录时全部合并到redis),
+    超过CART_COOKIE_MAX_ITEMS条的购物车不能转换成新格式保存到cookie中
+    """
+    try:
+        data = _LegacyUnpickler(io.BytesIO(raw)).load()
+    except Exception:
+        raise CartCookieError('旧版本cookie解析失败')
+
+    if not isinstance(data, dict):
+        raise CartCookieError('旧版本cookie格式错误')
+
+    cart_dict = {}
+    for sku_id, count_selected in data.items():
+        try:
+            cart_dict[int(sku_id)] = {
+                'count': int(count_selected['count']),
+                'selected': bool(count_selected['selected'])
+            }
+        except (TypeError, KeyError, ValueError):
+            raise CartCookieError('旧版本cookie格式错误')
+
+    return cart_dict
+
+
+def _b64decode(data):
+    """urlsafe base64解码(兼容旧版本cookie使用的标准base64)"""
+    if len(data) > constants.CART_COOKIE_MAX_LENGTH:
+        raise CartCookieError('cookie过长')
+
+    try:
+        return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+    except Exception:
+        raise CartCookieError('base64解码失败')
+
+
+def dumps(cart_dict):
+    """
+    将购物车字典编码成cookie字符串
+    cart_dict: {
+        <sku_id>: {
+            'count': <count>,
+            'selected': <selected>
+        },
+        ...
+    }
+    商品条数超过上限时抛出CartCookieFullError(不静默丢弃用户的商品)
+    """
+    if len(cart_dict) > constants.CART_COOKIE_MAX_ITEMS:
+        raise CartCookieFullError('购物车商品条数超过%d' % constants.CART_COOKIE_MAX_ITEMS)
+
+    buf = bytearray([constants.CART_COOKIE_VERSION])
+
+    sku_ids = sorted(cart_dict)
+    _write_varint(buf, len(sku_ids))
+
+    # sku_id按从小到大排序,只保存与上一个sku_id的差值
+    prev_id = 0
+    for sku_id in sku_ids:
+        count_selected = cart_dict[sku_id]
+        _write_varint(buf, sku_id - prev_id)
+        _write_varint(buf, (max(int(count_selected['count']), 0) << 1) | bool(count_selected['selected']))
+        prev_id = sku_id
+
+    payload = bytes(buf)
+    return base64.urlsafe_b64encode(payload + _signature(payload)).rstrip(b'=').decode()
+
+
+def loads(data):
+    """将cookie字符串解码成购物车字典,数据无效时抛出CartCookieError"""
+    raw = _b64decode(data)
+
+    if not raw:
+        raise CartCookieError('cookie为空')
+
+    if raw[0] == LEGACY_PICKLE_PROTO:
+        # 旧版本pickle格式
+        return _loads_legacy(raw)
+
+    if raw[0] != constants.CART_COOKIE_VERSION:
+        raise CartCookieError('不支持的cookie版本')
+
+    sig_len = constants.CART_COOKIE_SIGNATURE_LENGTH
+    payload, signature = raw[:-sig_len], raw[-sig_len:]
+    if len(payload) < 2 or not hmac.compare_digest(signature, _signature(payload)):
+        raise CartCookieError('cookie签名错误')
+
+    count, pos = _read_varint(payload, 1)
+    if count > constants.CART_COOKIE_MAX_ITEMS:
+        raise CartCookieError('商品条数过多')
+
+    cart_dict = {}
+    sku_id = 0
+    for _ in range(count):
+        delta, pos = _read_varint(payload, pos)
+        value, pos = _read_varint(payload, pos)
+        sku_id += delta
+        cart_dict[sku_id] = {
+            'count': value >> 1,
+            'selected': bool(value & 1)
+        }
+
+    if pos != len(payload):
+        raise CartCookieError('cookie数据多余')
+
+    return cart_dict
+
+
+def is_legacy(data):
+    """判断cookie字符串是否为旧版本pickle格式"""
+    try:
+        raw = _b64decode(data)
+    except CartCookieError:
+        return False
+
+    return bool(raw) and raw[0] == LEGACY_PICKLE_PROTO
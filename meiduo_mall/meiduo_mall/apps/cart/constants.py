@@ -1,2 +1,45 @@
 # 购物车cookie的有效期
-CART_COOKIE_EXPIRES = 365 * 24 * 60 * 60
\ No newline at end of file
+CART_COOKIE_EXPIRES = 365 * 24 * 60 * 60
+
+# 购物车cookie编码格式版本号
+CART_COOKIE_VERSION = 1
+
+# 购物车cookie最大长度(超过此长度的cookie直接丢弃,不进行解析)
+CART_COOKIE_MAX_LENGTH = 4096
+
+# 购物车cookie中最多保存的商品条数
+CART_COOKIE_MAX_ITEMS = 100
+
+# 购物车cookie签名长度(字节)
+CART_COOKIE_SIGNATURE_LENGTH = 8
+
+
+# 未登录用户购物车token cookie的有效期(服务端存储模式)
+CART_TOKEN_COOKIE_EXPIRES = 30 * 24 * 60 * 60
+
+# 未登录用户购物车在redis中的有效期(服务端存储模式),每次访问购物车时刷新
+CART_GUEST_REDIS_EXPIRES = 30 * 24 * 60 * 60
+
+# 登录用户购物车在redis中的有效期,每次访问购物车时刷新
+CART_REDIS_EXPIRES = 90 * 24 * 60 * 60
+
+# 购物车批量操作接口一次最多包含的操作数量
+CART_BATCH_OPERATIONS_LIMIT = 100
+
+# 登录时合并购物车,合并之后购物车中最多的商品条数
+CART_MERGE_MAX_ITEMS = 100
+
+# 登录时合并购物车,单个商品的最大数量
+CART_MERGE_MAX_COUNT = 200
+
+# 购物车合并标记的有效期(同一份未登录购物车数据在此时间内重复提交只合并一次)
+CART_MERGE_MARK_EXPIRES = 60
+
+# 购物车清理任务每批处理的购物车数量
+CART_COMPACT_BATCH_SIZE = 500
+
+# 购物车redis一致性哈希环中每个节点的虚拟节点数量
+CART_REDIS_VIRTUAL_NODES = 160
+
+# 购物车redis节点迁移时每批迁移的key数量
+CART_REBALANCE_BATCH_SIZE = 200
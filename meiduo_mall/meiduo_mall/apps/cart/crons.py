@@ -0,0 +1,75 @@
+import time
+
+from django_redis import get_redis_connection
+
+from cart import constants
+from cart.router import get_cart_nodes
+from cart.storage import RedisCart, parse_cart_key
+from goods.models import SKU
+
+
+def _compact_carts(redis_conn, cart_ids):
+    """清理一批购物车,返回删除的记录数量"""
+    carts = [RedisCart(cart_id, redis_conn) for cart_id in cart_ids]
+
+    # 1.一次管道请求获取所有购物车中的商品id(两种存储格式)
+    pl = redis_conn.pipeline()
+    for cart in carts:
+        pl.hkeys(cart.keys[0])
+        pl.hkeys(cart.keys[2])
+    res = pl.execute()
+
+    cart_sku_ids = []
+    for i in range(len(carts)):
+        cart_sku_ids.append({int(sku_id) for sku_id in res[2 * i] + res[2 * i + 1]})
+
+    # 2.一次查询获取其中仍然存在并且上架销售的商品
+    all_sku_ids = set().union(*cart_sku_ids)
+    valid_sku_ids = set(SKU.objects.filter(id__in=all_sku_ids, is_launched=True).values_list('id', flat=True))
+
+    # 3.一次管道请求清理所有购物车
+    pl = redis_conn.pipeline()
+    for cart, sku_ids in zip(carts, cart_sku_ids):
+        cart.compact(sku_ids - valid_sku_ids, client=pl)
+
+    return sum(pl.execute())
+
+
+def compact_redis_carts():
+    """
+    清理redis中的购物车记录:
+    1.删除已删除或已下架商品的购物车记录
+    2.删除勾选集合中不在购物车中的商品id
+    3.给没有有效期的购物车设置有效期,长期不访问的购物车自动过期
+    """
+    print('%s: compact_redis_carts' % time.ctime())
+
+    # 依次清理每个购物车redis节点
+    for node in get_cart_nodes():
+        redis_conn = get_redis_connection(node)
+        used_memory = redis_conn.info('memory')['used_memory']
+
+        carts_count = 0
+        removed_count = 0
+
+        # 使用SCAN分批遍历购物车数据的key
+        cart_ids = set()
+        for key in redis_conn.scan_iter(match='cart_*', count=constants.CART_COMPACT_BATCH_SIZE):
+            cart_id = parse_cart_key(key)
+            if cart_id is None:
+                continue
+
+            cart_ids.add(cart_id)
+            if len(cart_ids) >= constants.CART_COMPACT_BATCH_SIZE:
+                removed_count += _compact_carts(redis_conn, cart_ids)
+                carts_count += len(cart_ids)
+                cart_ids = set()
+
+        if cart_ids:
+            removed_count += _compact_carts(redis_conn, cart_ids)
+            carts_count += len(cart_ids)
+
+        reclaimed_memory = used_memory - redis_conn.info('memory')['used_memory']
+
+        print('%s: compact_redis_carts %s done: carts=%d removed=%d reclaimed_memory=%d bytes' % (
+            time.ctime(), node, carts_count, removed_count, reclaimed_memory))
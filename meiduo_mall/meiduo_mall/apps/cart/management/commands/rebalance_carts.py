@@ -0,0 +1,155 @@
+from django.core.management.base import BaseCommand
+from django_redis import get_redis_connection
+from redis.exceptions import ResponseError
+
+from cart import constants
+from cart.router import get_cart_nodes, get_cart_node
+from cart.storage import parse_cart_key
+
+# 一个购物车的所有key,迁移时一起迁移
+CART_KEY_PREFIXES = ('cart_', 'cart_selected_', 'cart_items_', 'cart_merged_')
+
+# 合并'single'格式的购物车: 数量相加,任意一边勾选即为勾选
+# KEYS[1]: cart_items_<id>, ARGV: sku_id, value, sku_id, value, ...
+MERGE_ITEMS_SCRIPT = """
+for i = 1, #ARGV, 2 do
+    local value = tonumber(redis.call('hget', KEYS[1], ARGV[i]) or 0)
+    local other = tonumber(ARGV[i + 1])
+    local flag = math.max(value % 2, other % 2)
+    redis.call('hset', KEYS[1], ARGV[i], (math.floor(value / 2) + math.floor(other / 2)) * 2 + flag)
+end
+return 1
+"""
+
+
+class Command(BaseCommand):
+    """
+    修改settings.CART_REDIS_NODES之后,把购物车数据迁移到一致性哈希计算出的节点上
+    一个购物车的所有key(商品hash、勾选set、合并标记)一起迁移: 使用DUMP/RESTORE迁移(保留剩余有效期),
+    目标节点上已经有数据时(迁移期间用户已经在新节点上修改了购物车)把原节点的数据合并到目标节点,
+    全部完成之后删除原节点上该购物车的所有key
+    """
+    help = '按照一致性哈希迁移购物车redis数据'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', action='append', default=[],
+                            help='需要迁出数据的其他redis别名(例如已经从CART_REDIS_NODES中移除的节点)')
+        parser.add_argument('--replace', action='store_true',
+                            help='目标节点上已经存在的key使用原节点的数据覆盖,不合并')
+        parser.add_argument('--dry-run', action='store_true', help='只统计需要迁移的购物车,不迁移')
+
+    def handle(self, *args, **options):
+        sources = get_cart_nodes() + [alias for alias in options['source'] if alias not in get_cart_nodes()]
+
+        for source in sources:
+            redis_conn = get_redis_connection(source)
+            stats = {'scanned': 0, 'moved': 0, 'merged': 0}
+
+            # 需要迁移的购物车: {<目标节点>: {cart_id, ...}}
+            batch = {}
+            batch_count = 0
+            for key in redis_conn.scan_iter(match='cart_*', count=constants.CART_REBALANCE_BATCH_SIZE):
+                cart_id = parse_cart_key(key, with_marks=True)
+                if cart_id is None:
+                    continue
+
+                stats['scanned'] += 1
+                target = get_cart_node(cart_id)
+                if target == source or cart_id in batch.get(target, ()):
+                    continue
+
+                batch.setdefault(target, set()).add(cart_id)
+                batch_count += 1
+                if batch_count >= constants.CART_REBALANCE_BATCH_SIZE:
+                    self._move(redis_conn, batch, stats, options)
+                    batch = {}
+                    batch_count = 0
+
+            if batch:
+                self._move(redis_conn, batch, stats, options)
+
+            self.stdout.write('%s: scanned=%d moved=%d merged=%d' % (
+                source, stats['scanned'], stats['moved'], stats['merged']))
+
+    def _move(self, redis_conn, batch, stats, options):
+        """把一批购物车从redis_conn迁移到目标节点"""
+        if options['dry_run']:
+            stats['moved'] += sum(len(cart_ids) for cart_ids in batch.values())
+            return
+
+        for target, cart_ids in batch.items():
+            target_conn = get_redis_connection(target)
+
+            # 1.一次管道请求导出这些购物车所有key的数据和剩余有效期(毫秒)
+            keys = [(prefix, prefix + cart_id) for cart_id in cart_ids for prefix in CART_KEY_PREFIXES]
+            pl = redis_conn.pipeline()
+            for prefix, key in keys:
+                pl.dump(key)
+                pl.pttl(key)
+            res = pl.execute()
+
+            # 2.一次管道请求写入目标节点
+            restored = []
+            pl = target_conn.pipeline()
+            for i, (prefix, key) in enumerate(keys):
+                data, pttl = res[2 * i], res[2 * i + 1]
+                if data is None:
+                    # 不存在,或者导出前已经过期或被删除
+                    continue
+
+                pl.restore(key, max(pttl, 0), data, replace=options['replace'])
+                restored.append((prefix, key))
+
+            if not restored:
+                continue
+
+            conflicts = []
+            for item, result in zip(restored, pl.execute(raise_on_error=False)):
+                if isinstance(result, ResponseError):
+                    if 'BUSYKEY' not in str(result):
+                        raise result
+                    conflicts.append(item)
+
+            # 3.目标节点上已经有数据的key,把原节点的数据合并到目标节点
+            if conflicts:
+                self._merge(redis_conn, target_conn, conflicts)
+
+            # 4.购物车的所有key都已经写入目标节点,删除原节点上的key
+            redis_conn.delete(*[key for prefix, key in restored])
+            stats['moved'] += len({parse_cart_key(key, with_marks=True) for prefix, key in restored})
+            stats['merged'] += len({parse_cart_key(key, with_marks=True) for prefix, key in conflicts})
+
+    def _merge(self, redis_conn, target_conn, conflicts):
+        """
+        把原节点的数据合并到目标节点上已经存在的key:
+        商品数量相加(HINCRBY),勾选的商品取并集(SADD),合并标记保留目标节点的数据
+        """
+        conflicts = [(prefix, key) for prefix, key in conflicts if prefix != 'cart_merged_']
+
+        # 一次管道请求读取原节点的数据
+        pl = redis_conn.pipeline()
+        for prefix, key in conflicts:
+            if prefix == 'cart_selected_':
+                pl.smembers(key)
+            else:
+                pl.hgetall(key)
+        values = pl.execute()
+
+        # 一次管道请求写入目标节点
+        merge_items = target_conn.register_script(MERGE_ITEMS_SCRIPT)
+        pl = target_conn.pipeline()
+        for (prefix, key), value in zip(conflicts, values):
+            if not value:
+                continue
+
+            if prefix == 'cart_selected_':
+                pl.sadd(key, *value)
+            elif prefix == 'cart_items_':
+                args = []
+                for sku_id, item in value.items():
+                    args.extend([sku_id, item])
+                merge_items(keys=[key], args=args, client=pl)
+            else:
+                for sku_id, count in value.items():
+                    pl.hincrby(key, sku_id, int(count))
+        pl.execute()
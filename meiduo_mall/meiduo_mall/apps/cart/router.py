@@ -0,0 +1,67 @@
+import bisect
+import hashlib
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+from cart import constants
+
+
+class ConsistentHashRing(object):
+    """
+    一致性哈希环
+    nodes: 节点名称列表(CACHES中的redis别名)
+    增加或删除节点时只有少部分key需要迁移
+    """
+    def __init__(self, nodes, replicas=constants.CART_REDIS_VIRTUAL_NODES):
+        self.nodes = list(nodes)
+        self._ring = []
+
+        for node in self.nodes:
+            for i in range(replicas):
+                self._ring.append((self._hash('%s#%d' % (node, i)), node))
+
+        self._ring.sort()
+        self._hashes = [h for h, node in self._ring]
+
+    @staticmethod
+    def _hash(key):
+        return int(hashlib.md5(key.encode()).hexdigest()[:16], 16)
+
+    def get_node(self, key):
+        """获取key所在的节点"""
+        index = bisect.bisect(self._hashes, self._hash(str(key))) % len(self._hashes)
+        return self._ring[index][1]
+
+
+# 当前使用的哈希环: (<节点列表>, ConsistentHashRing)
+_ring = (None, None)
+
+
+def get_cart_nodes():
+    """获取购物车使用的redis节点列表"""
+    return list(getattr(settings, 'CART_REDIS_NODES', None) or ['cart'])
+
+
+def get_cart_ring():
+    """获取购物车的一致性哈希环,节点配置变化时重新创建"""
+    global _ring
+
+    nodes = get_cart_nodes()
+    if _ring[0] != nodes:
+        _ring = (nodes, ConsistentHashRing(nodes))
+
+    return _ring[1]
+
+
+def get_cart_node(cart_id):
+    """获取购物车所在的redis节点名称"""
+    return get_cart_ring().get_node(cart_id)
+
+
+def get_cart_redis(cart_id):
+    """
+    获取购物车所在的redis连接
+    同一个购物车的所有key(商品hash、勾选集合等)按cart_id路由到同一个节点,lua脚本可以正常执行
+    """
+    return get_redis_connection(get_cart_node(cart_id))
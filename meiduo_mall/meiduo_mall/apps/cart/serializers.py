@@ -1,6 +1,8 @@
 from rest_framework import serializers
 
+from cart import constants
 from goods.models import SKU
+from goods.stock import get_sku_stock, get_sku_stocks
 
 
 class CartSerializer(serializers.Serializer):
@@ -10,18 +12,18 @@ class CartSerializer(serializers.Serializer):
     selected = serializers.BooleanField(label='勾选状态', default=True)
 
     def validate(self, attrs):
-        # sku_id商品是否存在
+        # sku_id商品是否存在(从库存缓存中获取,缓存未命中时查询数据库)
         sku_id = attrs['sku_id']
 
-        try:
-            sku = SKU.objects.get(id=sku_id)
-        except SKU.DoesNotExist:
+        stock = get_sku_stock(sku_id)
+
+        if stock is None:
             raise serializers.ValidationError('商品不存在')
 
         # 商品库存是否足够
         count = attrs['count']
 
-        if count > sku.stock:
+        if count > stock:
             raise serializers.ValidationError("商品库存不足")
 
         return attrs
@@ -45,9 +47,7 @@ class CartDelSerializer(serializers.Serializer):
 
     def validate_sku_id(self, value):
         # 商品是否存在
-        try:
-            sku = SKU.objects.get(id=value)
-        except SKU.DoesNotExist:
+        if get_sku_stock(value) is None:
             raise serializers.ValidationError('商品不存在')
 
         return value
@@ -57,3 +57,58 @@ class CartDelSerializer(serializers.Serializer):
 class CartSelectSerializer(serializers.Serializer):
     """购物车记录全选序列化器类"""
     selected = serializers.BooleanField(label='勾选状态')
+
+
+
+class CartOperationSerializer(serializers.Serializer):
+    """购物车批量操作中单个操作的序列化器类"""
+    OP_CHOICES = ('add', 'update', 'delete', 'select')
+
+    op = serializers.ChoiceField(label='操作类型', choices=OP_CHOICES)
+    sku_id = serializers.IntegerField(label='商品编号', required=False)
+    count = serializers.IntegerField(label='商品数量', min_value=1, required=False)
+    selected = serializers.BooleanField(label='勾选状态', default=True)
+
+    def validate(self, attrs):
+        op = attrs['op']
+
+        # select操作不传sku_id表示全选/全不选,其他操作sku_id必传
+        if op != 'select' and attrs.get('sku_id') is None:
+            raise serializers.ValidationError('缺少sku_id')
+
+        if op in ('add', 'update') and attrs.get('count') is None:
+            raise serializers.ValidationError('缺少count')
+
+        return attrs
+
+
+
+class CartBatchSerializer(serializers.Serializer):
+    """购物车记录批量操作序列化器类"""
+    operations = CartOperationSerializer(label='操作列表', many=True)
+
+    def validate_operations(self, value):
+        if not value:
+            raise serializers.ValidationError('操作列表为空')
+
+        if len(value) > constants.CART_BATCH_OPERATIONS_LIMIT:
+            raise serializers.ValidationError('操作数量超过上限')
+
+        # 一次获取所有操作商品的库存(库存缓存未命中的商品通过一次查询获取)
+        sku_ids = {operation['sku_id'] for operation in value if operation.get('sku_id') is not None}
+        stocks = get_sku_stocks(sku_ids)
+
+        for operation in value:
+            sku_id = operation.get('sku_id')
+            if sku_id is None:
+                continue
+
+            # sku_id商品是否存在
+            if sku_id not in stocks:
+                raise serializers.ValidationError('商品不存在')
+
+            # 商品库存是否足够
+            if operation['op'] in ('add', 'update') and operation['count'] > stocks[sku_id]:
+                raise serializers.ValidationError('商品库存不足')
+
+        return value
@@ -0,0 +1,521 @@
+# redis购物车存储
+# 每个购物车操作都通过一个注册好的lua脚本完成(一次EVALSHA),保证操作的原子性
+# 支持两种存储格式(settings.CART_REDIS_LAYOUT):
+#   'split': hash cart_<id> 保存 sku_id->count, set cart_selected_<id> 保存勾选的sku_id
+#   'single': hash cart_items_<id> 保存 sku_id->count*2+selected
+# 切换格式之后,脚本在访问购物车时惰性地把旧格式的数据迁移到新格式
+import re
+
+from django.conf import settings
+
+from cart import constants
+from cart.router import get_cart_redis
+
+# 购物车数据的key: cart_<id>, cart_selected_<id>, cart_items_<id>, cart_merged_<id>,
+# <id>是用户id或者未登录用户的'anon_<token>'
+CART_KEY_RE = re.compile(r'^cart_(selected_|items_|merged_)?(\d+|anon_[A-Za-z0-9_-]{16,64})$')
+
+
+# 所有脚本公用的部分: 格式迁移,刷新有效期和单个商品的操作函数
+# KEYS: cart_<id>, cart_selected_<id>, cart_items_<id>
+# ARGV[1]: 存储格式, ARGV[2]: 有效期(0表示不过期)
+SCRIPT_PRELUDE = """
+local layout = ARGV[1]
+local ttl = tonumber(ARGV[2])
+
+local function migrate()
+    if layout == 'single' then
+        if redis.call('exists', KEYS[1], KEYS[2]) == 0 then
+            return
+        end
+        local items = redis.call('hgetall', KEYS[1])
+        for i = 1, #items, 2 do
+            local selected = redis.call('sismember', KEYS[2], items[i])
+            redis.call('hset', KEYS[3], items[i], tonumber(items[i + 1]) * 2 + selected)
+        end
+        redis.call('del', KEYS[1], KEYS[2])
+    else
+        if redis.call('exists', KEYS[3]) == 0 then
+            return
+        end
+        local items = redis.call('hgetall', KEYS[3])
+        for i = 1, #items, 2 do
+            local value = tonumber(items[i + 1])
+            redis.call('hset', KEYS[1], items[i], math.floor(value / 2))
+            if value % 2 == 1 then
+                redis.call('sadd', KEYS[2], items[i])
+            end
+        end
+        redis.call('del', KEYS[3])
+    end
+end
+
+local function touch()
+    if ttl <= 0 then
+        return
+    end
+    if layout == 'single' then
+        redis.call('expire', KEYS[3], ttl)
+    else
+        redis.call('expire', KEYS[1], ttl)
+        redis.call('expire', KEYS[2], ttl)
+    end
+end
+
+-- 添加商品,购物车中已有该商品时数量累加,selected为0时不改变原来的勾选状态
+local function add_item(sku_id, count, selected)
+    if layout == 'single' then
+        local value = tonumber(redis.call('hget', KEYS[3], sku_id) or 0)
+        local flag = value % 2
+        if selected == 1 then
+            flag = 1
+        end
+        redis.call('hset', KEYS[3], sku_id, (math.floor(value / 2) + count) * 2 + flag)
+    else
+        redis.call('hincrby', KEYS[1], sku_id, count)
+        if selected == 1 then
+            redis.call('sadd', KEYS[2], sku_id)
+        end
+    end
+end
+
+-- 设置商品数量和勾选状态
+local function set_item(sku_id, count, selected)
+    if layout == 'single' then
+        redis.call('hset', KEYS[3], sku_id, count * 2 + selected)
+    else
+        redis.call('hset', KEYS[1], sku_id, count)
+        if selected == 1 then
+            redis.call('sadd', KEYS[2], sku_id)
+        else
+            redis.call('srem', KEYS[2], sku_id)
+        end
+    end
+end
+
+-- 删除商品
+local function del_item(sku_id)
+    if layout == 'single' then
+        redis.call('hdel', KEYS[3], sku_id)
+    else
+        redis.call('hdel', KEYS[1], sku_id)
+        redis.call('srem', KEYS[2], sku_id)
+    end
+end
+
+-- 设置购物车中已有商品的勾选状态
+local function select_item(sku_id, selected)
+    if layout == 'single' then
+        local value = redis.call('hget', KEYS[3], sku_id)
+        if value then
+            redis.call('hset', KEYS[3], sku_id, math.floor(tonumber(value) / 2) * 2 + selected)
+        end
+    elseif redis.call('hexists', KEYS[1], sku_id) == 1 then
+        if selected == 1 then
+            redis.call('sadd', KEYS[2], sku_id)
+        else
+            redis.call('srem', KEYS[2], sku_id)
+        end
+    end
+end
+
+-- 全选/全不选
+local function select_all(selected)
+    if layout == 'single' then
+        local items = redis.call('hgetall', KEYS[3])
+        for i = 1, #items, 2 do
+            redis.call('hset', KEYS[3], items[i], math.floor(tonumber(items[i + 1]) / 2) * 2 + selected)
+        end
+    elseif selected == 1 then
+        local sku_ids = redis.call('hkeys', KEYS[1])
+        for i = 1, #sku_ids do
+            redis.call('sadd', KEYS[2], sku_ids[i])
+        end
+    else
+        redis.call('del', KEYS[2])
+    end
+end
+
+-- 获取购物车记录,返回: {sku_id, count, selected, sku_id, count, selected, ...}
+local function get_items(only_selected)
+    local result = {}
+    if layout == 'single' then
+        local items = redis.call('hgetall', KEYS[3])
+        for i = 1, #items, 2 do
+            local value = tonumber(items[i + 1])
+            local selected = value % 2
+            if selected == 1 or not only_selected then
+                table.insert(result, items[i])
+                table.insert(result, math.floor(value / 2))
+                table.insert(result, selected)
+            end
+        end
+    else
+        local items = redis.call('hgetall', KEYS[1])
+        for i = 1, #items, 2 do
+            local selected = redis.call('sismember', KEYS[2], items[i])
+            if selected == 1 or not only_selected then
+                table.insert(result, items[i])
+                table.insert(result, tonumber(items[i + 1]))
+                table.insert(result, selected)
+            end
+        end
+    end
+    return result
+end
+
+migrate()
+"""
+
+SCRIPTS = {
+    # 添加商品: ARGV[3] sku_id, ARGV[4] count, ARGV[5] selected(0/1)
+    'add': """
+add_item(ARGV[3], tonumber(ARGV[4]), tonumber(ARGV[5]))
+touch()
+""",
+
+    # 设置商品数量和勾选状态: ARGV[3:] 依次为 sku_id, count, selected(0/1)
+    'update': """
+for i = 3, #ARGV, 3 do
+    set_item(ARGV[i], tonumber(ARGV[i + 1]), tonumber(ARGV[i + 2]))
+end
+touch()
+""",
+
+    # 删除商品: ARGV[3:] sku_id
+    'delete': """
+for i = 3, #ARGV do
+    del_item(ARGV[i])
+end
+touch()
+""",
+
+    # 全选/全不选: ARGV[3] selected(0/1)
+    'select_all': """
+select_all(tonumber(ARGV[3]))
+touch()
+""",
+
+    # 获取购物车记录: ARGV[3] 为1时只返回勾选的商品
+    'get': """
+local result = get_items(ARGV[3] == '1')
+touch()
+return result
+""",
+
+    # 批量操作: ARGV[3:] 依次为 op, sku_id, count, selected(0/1)
+    # op: add/update/delete/select, select操作的sku_id为空时表示全选/全不选
+    # 返回操作之后的购物车记录
+    'batch': """
+for i = 3, #ARGV, 4 do
+    local op, sku_id, count, selected = ARGV[i], ARGV[i + 1], tonumber(ARGV[i + 2]), tonumber(ARGV[i + 3])
+    if op == 'add' then
+        add_item(sku_id, count, selected)
+    elseif op == 'update' then
+        set_item(sku_id, count, selected)
+    elseif op == 'delete' then
+        del_item(sku_id)
+    elseif op == 'select' and sku_id == '' then
+        select_all(selected)
+    elseif op == 'select' then
+        select_item(sku_id, selected)
+    end
+end
+local result = get_items(false)
+touch()
+return result
+""",
+
+    # 合并未登录用户的购物车: KEYS[4] 合并标记, KEYS[5:7] 服务端未登录购物车的3个key(只在同一个redis中时传入)
+    # ARGV[3] 合并策略(cookie/sum/max), ARGV[4] 商品条数上限, ARGV[5] 单个商品数量上限,
+    # ARGV[6] 未登录购物车数据的摘要, ARGV[7] 合并标记有效期, ARGV[8:] 依次为 sku_id, count, selected(0/1)
+    # 返回合并的商品条数,同一份数据已经合并过时返回-1
+    'merge': """
+local policy, max_items, max_count = ARGV[3], tonumber(ARGV[4]), tonumber(ARGV[5])
+
+-- 防止重复提交: 同一份未登录购物车数据只合并一次
+if ARGV[6] ~= '' then
+    if redis.call('get', KEYS[4]) == ARGV[6] then
+        return -1
+    end
+    redis.call('setex', KEYS[4], tonumber(ARGV[7]), ARGV[6])
+end
+
+-- 收集需要合并的记录
+local sku_ids, items = {}, {}
+local function collect(sku_id, count, selected)
+    if items[sku_id] == nil then
+        table.insert(sku_ids, sku_id)
+    end
+    items[sku_id] = {count, selected}
+end
+
+for i = 8, #ARGV, 3 do
+    collect(ARGV[i], tonumber(ARGV[i + 1]), tonumber(ARGV[i + 2]))
+end
+
+if #KEYS >= 7 then
+    local guest = redis.call('hgetall', KEYS[5])
+    for i = 1, #guest, 2 do
+        collect(guest[i], tonumber(guest[i + 1]), redis.call('sismember', KEYS[6], guest[i]))
+    end
+    guest = redis.call('hgetall', KEYS[7])
+    for i = 1, #guest, 2 do
+        local value = tonumber(guest[i + 1])
+        collect(guest[i], math.floor(value / 2), value % 2)
+    end
+    redis.call('del', KEYS[5], KEYS[6], KEYS[7])
+end
+
+-- 按合并策略设置登录用户购物车中的记录
+local cart_key = KEYS[1]
+if layout == 'single' then
+    cart_key = KEYS[3]
+end
+local item_count = redis.call('hlen', cart_key)
+
+local merged = 0
+for _, sku_id in ipairs(sku_ids) do
+    local count, selected = items[sku_id][1], items[sku_id][2]
+    local current = redis.call('hget', cart_key, sku_id)
+
+    if current then
+        current = tonumber(current)
+        if layout == 'single' then
+            current = math.floor(current / 2)
+        end
+    end
+
+    -- 购物车商品条数已达上限时不再添加新商品
+    if current or item_count < max_items then
+        if not current then
+            item_count = item_count + 1
+            current = 0
+        end
+
+        if policy == 'sum' then
+            count = count + current
+        elseif policy == 'max' then
+            count = math.max(count, current)
+        end
+
+        set_item(sku_id, math.min(count, max_count), selected)
+        merged = merged + 1
+    end
+end
+
+touch()
+return merged
+""",
+
+    # 清理购物车: ARGV[3:] 需要删除的sku_id(已删除或已下架的商品)
+    # 同时清除勾选集合中不在购物车hash中的商品id,并给没有有效期的购物车设置有效期(不刷新已有的有效期)
+    # 返回删除的记录数量
+    'compact': """
+local removed = 0
+for i = 3, #ARGV do
+    removed = removed + redis.call('hdel', KEYS[1], ARGV[i]) + redis.call('hdel', KEYS[3], ARGV[i])
+    redis.call('srem', KEYS[2], ARGV[i])
+end
+
+local selected = redis.call('smembers', KEYS[2])
+for i = 1, #selected do
+    if redis.call('hexists', KEYS[1], selected[i]) == 0 then
+        redis.call('srem', KEYS[2], selected[i])
+        removed = removed + 1
+    end
+end
+
+if ttl > 0 then
+    for i = 1, 3 do
+        if redis.call('ttl', KEYS[i]) == -1 then
+            redis.call('expire', KEYS[i], ttl)
+        end
+    end
+end
+return removed
+""",
+}
+
+# 已注册的脚本对象: {<name>: Script}
+_scripts = {}
+
+
+def _get_script(redis_conn, name):
+    """获取注册好的lua脚本对象,脚本对象执行时使用EVALSHA(服务器不存在脚本时自动使用EVAL加载)"""
+    script = _scripts.get(name)
+
+    if script is None:
+        script = redis_conn.register_script(SCRIPT_PRELUDE + SCRIPTS[name])
+        _scripts[name] = script
+
+    return script
+
+
+class RedisCart(object):
+    """
+    redis中的购物车记录
+    cart_id: 登录用户为用户id,未登录用户(服务端存储模式)为'anon_<token>'
+    """
+    def __init__(self, cart_id, redis_conn=None):
+        self.cart_id = cart_id
+        self.redis_conn = redis_conn or get_cart_redis(cart_id)
+        self.layout = getattr(settings, 'CART_REDIS_LAYOUT', 'split')
+
+        # 购物车的有效期,每次访问购物车时刷新
+        if str(cart_id).startswith('anon_'):
+            self.expires = constants.CART_GUEST_REDIS_EXPIRES
+        else:
+            self.expires = constants.CART_REDIS_EXPIRES
+
+    @property
+    def keys(self):
+        return [
+            'cart_%s' % self.cart_id,
+            'cart_selected_%s' % self.cart_id,
+            'cart_items_%s' % self.cart_id,
+        ]
+
+    @staticmethod
+    def _parse_items(res):
+        """将脚本返回的[sku_id, count, selected, ...]转换成购物车字典"""
+        cart_dict = {}
+        for i in range(0, len(res), 3):
+            cart_dict[int(res[i])] = {
+                'count': int(res[i + 1]),
+                'selected': bool(res[i + 2])
+            }
+
+        return cart_dict
+
+    def _call(self, name, *args, extra_keys=(), client=None):
+        """执行指定的lua脚本,client可以是redis管道对象"""
+        script = _get_script(self.redis_conn, name)
+        keys = self.keys + list(extra_keys)
+        return script(keys=keys, args=[self.layout, self.expires] + list(args), client=client or self.redis_conn)
+
+    def add(self, sku_id, count, selected):
+        """添加商品,购物车中已有该商品时数量累加"""
+        self._call('add', sku_id, count, int(selected))
+
+    def update(self, sku_id, count, selected):
+        """设置商品的数量和勾选状态"""
+        self.update_many({sku_id: {'count': count, 'selected': selected}})
+
+    def update_many(self, cart_dict):
+        """
+        设置多个商品的数量和勾选状态
+        cart_dict: {
+            <sku_id>: {
+                'count': <count>,
+                'selected': <selected>
+            },
+            ...
+        }
+        """
+        if not cart_dict:
+            return
+
+        args = []
+        for sku_id, count_selected in cart_dict.items():
+            args.extend([sku_id, count_selected['count'], int(count_selected['selected'])])
+
+        self._call('update', *args)
+
+    def merge(self, cart_dict, guest_cart=None, digest='', policy='cookie',
+              max_items=constants.CART_MERGE_MAX_ITEMS, max_count=constants.CART_MERGE_MAX_COUNT):
+        """
+        将未登录用户的购物车记录原子地合并到当前购物车中
+        cart_dict: cookie中的购物车记录
+        guest_cart: 服务端存储的未登录用户购物车(RedisCart),合并之后删除
+        digest: 未登录购物车数据的摘要,同一份数据在短时间内重复提交时只合并一次
+        policy: 'cookie' 使用未登录购物车中的数量, 'sum' 数量相加, 'max' 取较大的数量
+        返回合并的商品条数,重复提交时返回-1
+        """
+        cart_dict = dict(cart_dict)
+        extra_keys = ['cart_merged_%s' % self.cart_id]
+
+        if guest_cart is not None:
+            if guest_cart.redis_conn is self.redis_conn:
+                # 在同一个redis中,由脚本直接读取并删除
+                extra_keys += guest_cart.keys
+            else:
+                cart_dict.update(guest_cart.get())
+                guest_cart.clear()
+
+        args = [policy, max_items, max_count, digest, constants.CART_MERGE_MARK_EXPIRES]
+        for sku_id, count_selected in cart_dict.items():
+            args.extend([sku_id, count_selected['count'], int(count_selected['selected'])])
+
+        return self._call('merge', *args, extra_keys=extra_keys)
+
+    def delete(self, *sku_ids):
+        """删除商品"""
+        if sku_ids:
+            self._call('delete', *sku_ids)
+
+    def select_all(self, selected):
+        """全选或全不选"""
+        self._call('select_all', int(selected))
+
+    def batch(self, operations):
+        """
+        批量操作购物车记录,返回操作之后的购物车记录(格式同get)
+        operations: [
+            {'op': 'add'/'update'/'delete'/'select', 'sku_id': <sku_id>, 'count': <count>, 'selected': <selected>},
+            ...
+        ]
+        """
+        args = []
+        for operation in operations:
+            sku_id = operation.get('sku_id')
+            args.extend([
+                operation['op'],
+                '' if sku_id is None else sku_id,
+                operation.get('count') or 0,
+                int(operation.get('selected', True))
+            ])
+
+        return self._parse_items(self._call('batch', *args))
+
+    def get(self):
+        """
+        获取购物车记录
+        返回: {
+            <sku_id>: {
+                'count': <count>,
+                'selected': <selected>
+            },
+            ...
+        }
+        """
+        return self._parse_items(self._call('get', 0))
+
+    def get_selected(self):
+        """获取购物车中被勾选的商品id和对应数量count,返回: {<sku_id>: <count>, ...}"""
+        res = self._call('get', 1)
+
+        return {int(res[i]): int(res[i + 1]) for i in range(0, len(res), 3)}
+
+    def compact(self, invalid_sku_ids, client=None):
+        """删除购物车中无效的商品记录和孤立的勾选记录,返回删除的记录数量"""
+        return self._call('compact', *invalid_sku_ids, client=client)
+
+    def clear(self):
+        """删除整个购物车"""
+        self.redis_conn.delete(*self.keys)
+
+
+def parse_cart_key(key, with_marks=False):
+    """
+    从购物车数据的key中解析出cart_id,不是购物车数据的key(包括其他以cart_开头的key)时返回None
+    with_marks: 是否包含购物车合并标记的key(cart_merged_<id>)
+    """
+    if isinstance(key, bytes):
+        key = key.decode()
+
+    match = CART_KEY_RE.match(key)
+    if match is None or (match.group(1) == 'merged_' and not with_marks):
+        return None
+
+    return match.group(2)
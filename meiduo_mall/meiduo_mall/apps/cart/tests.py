@@ -1,3 +1,120 @@
-from django.test import TestCase
+import base64
+import pickle
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase
+from django_redis import get_redis_connection
+
+from cart import codec, constants
+from cart.crons import compact_redis_carts
+from cart.storage import parse_cart_key
+
+# 恶意pickle数据被加载时会调用_mark
+_marks = []
+
+
+def _mark():
+    _marks.append(1)
+
+
+class _Malicious(object):
+    def __reduce__(self):
+        return _mark, ()
+
+
+def _legacy_cookie(data):
+    """生成旧版本pickle格式的cookie"""
+    return base64.b64encode(pickle.dumps(data)).decode()
+
+
+class CartCookieCodecTest(SimpleTestCase):
+    """购物车cookie编解码"""
+    def setUp(self):
+        self.cart_dict = {
+            1: {'count': 2, 'selected': True},
+            5: {'count': 1, 'selected': False},
+            300: {'count': 100, 'selected': True},
+        }
+
+    def test_round_trip(self):
+        data = codec.dumps(self.cart_dict)
+        self.assertEqual(codec.loads(data), self.cart_dict)
+        self.assertFalse(codec.is_legacy(data))
+
+    def test_tampered_signature(self):
+        """数据或签名被修改时抛出CartCookieError"""
+        raw = bytearray(base64.urlsafe_b64decode(codec.dumps(self.cart_dict) + '=='))
+        for pos in (-1, 3):
+            tampered = bytearray(raw)
+            tampered[pos] ^= 0x01
+            with self.assertRaises(codec.CartCookieError):
+                codec.loads(base64.urlsafe_b64encode(bytes(tampered)).decode())
+
+    def test_legacy(self):
+        data = _legacy_cookie(self.cart_dict)
+        self.assertTrue(codec.is_legacy(data))
+        self.assertEqual(codec.loads(data), self.cart_dict)
+
+    def test_legacy_disallowed_global(self):
+        """引用任何全局对象的旧版本cookie都被拒绝,不会执行"""
+        data = _legacy_cookie({1: _Malicious()})
+        with self.assertRaises(codec.CartCookieError):
+            codec.loads(data)
+        self.assertEqual(_marks, [])
+
+    def test_legacy_not_truncated(self):
+        """旧版本cookie超过商品条数上限时返回全部商品"""
+        cart_dict = {sku_id: {'count': 1, 'selected': True}
+                     for sku_id in range(1, constants.CART_COOKIE_MAX_ITEMS + 11)}
+        self.assertEqual(codec.loads(_legacy_cookie(cart_dict)), cart_dict)
+
+    def test_full(self):
+        """商品条数达到上限时可以保存,超过上限时抛出CartCookieFullError"""
+        cart_dict = {sku_id: {'count': 1, 'selected': True}
+                     for sku_id in range(1, constants.CART_COOKIE_MAX_ITEMS + 1)}
+        self.assertEqual(codec.loads(codec.dumps(cart_dict)), cart_dict)
+
+        cart_dict[constants.CART_COOKIE_MAX_ITEMS + 1] = {'count': 1, 'selected': True}
+        with self.assertRaises(codec.CartCookieFullError):
+            codec.dumps(cart_dict)
+
+
+class CartKeyTest(SimpleTestCase):
+    """购物车数据的key"""
+    def test_parse_cart_key(self):
+        self.assertEqual(parse_cart_key(b'cart_5'), '5')
+        self.assertEqual(parse_cart_key('cart_selected_5'), '5')
+        self.assertEqual(parse_cart_key('cart_items_anon_abcdefghijklmnop_-'), 'anon_abcdefghijklmnop_-')
+        self.assertIsNone(parse_cart_key('cart_merged_5'))
+        self.assertEqual(parse_cart_key('cart_merged_5', with_marks=True), '5')
+
+        # 其他以cart_开头的key
+        for key in ('cart_', 'cart_token_5', 'cart_5_backup', 'cart_selected_', 'cart_anon_short', 'cart_rebalance'):
+            self.assertIsNone(parse_cart_key(key, with_marks=True), key)
+
+
+class CompactRedisCartsTest(TestCase):
+    """清理redis中的购物车记录"""
+    def setUp(self):
+        self.redis_conn = get_redis_connection('cart')
+        self.redis_conn.flushdb()
+
+    def tearDown(self):
+        self.redis_conn.flushdb()
+
+    # 测试使用的fakeredis不支持INFO命令
+    @mock.patch('redis.StrictRedis.info', return_value={'used_memory': 0})
+    def test_skip_other_keys(self, info):
+        """只清理购物车数据的key,跳过合并标记和其他以cart_开头的key"""
+        self.redis_conn.hset('cart_5', 1, 2)
+        self.redis_conn.set('cart_merged_5', 'digest')
+        self.redis_conn.set('cart_stats', 'other')
+        self.redis_conn.rpush('cart_5_backup', 'other')
+
+        compact_redis_carts()
+
+        # 商品1不存在,购物车记录被删除
+        self.assertFalse(self.redis_conn.exists('cart_5'))
+        self.assertEqual(self.redis_conn.get('cart_merged_5'), b'digest')
+        self.assertEqual(self.redis_conn.get('cart_stats'), b'other')
+        self.assertEqual(self.redis_conn.lrange('cart_5_backup', 0, -1), [b'other'])
@@ -5,5 +5,6 @@ from cart import views
 urlpatterns = [
     url(r'^cart/$', views.CartView.as_view()),
     url(r'^cart/selection/$', views.CartSelectAllView.as_view()),
+    url(r'^cart/batch/$', views.CartBatchView.as_view()),
 
 ]
\ No newline at end of file
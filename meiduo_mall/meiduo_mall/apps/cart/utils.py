@@ -1,61 +1,178 @@
 # 封装合并购物车记录函数
-import base64
-import pickle
+import hashlib
+import logging
+import re
+import secrets
+import time
 
-from django_redis import get_redis_connection
+from django.conf import settings
 
+from cart import codec, constants
+from cart.serializers import CartSKUSerializer
+from cart.storage import RedisCart
+from goods.cards import get_sku_card_list
 
-def merge_cookie_cart_to_redis(request, user, response):
-    """将cookie中的购物车记录合并到登录用户的redis记录中"""
+
+# 获取日志器
+logger = logging.getLogger('django')
+
+# 未登录用户购物车token的格式
+GUEST_CART_TOKEN_RE = re.compile(r'^[A-Za-z0-9_-]{16,64}$')
+
+
+def get_cookie_cart(request):
+    """获取cookie中的购物车数据,cookie不存在或数据无效时返回空字典"""
     cookie_cart = request.COOKIES.get('cart')
 
-    if cookie_cart is None:
-        # cookie购物车中无数据
-        return
+    if not cookie_cart:
+        return {}
 
-    # 解析cookie中的购物车数据
-    cookie_dict = pickle.loads(base64.b64decode(cookie_cart))
+    try:
+        return codec.loads(cookie_cart)
+    except codec.CartCookieError:
+        return {}
+
+
+def is_legacy_cookie_cart(request):
+    """判断cookie中的购物车数据是否为旧版本pickle格式"""
+    cookie_cart = request.COOKIES.get('cart')
+    return bool(cookie_cart) and codec.is_legacy(cookie_cart)
+
+
+def is_cookie_cart_full(cart_dict):
+    """cookie购物车的商品条数是否超过上限(超过上限的购物车不能保存到cookie中)"""
+    return len(cart_dict) > constants.CART_COOKIE_MAX_ITEMS
+
+
+def set_cookie_cart(response, cart_dict):
+    """设置cookie中的购物车数据,商品条数超过上限时抛出codec.CartCookieFullError"""
+    cart_data = codec.dumps(cart_dict)
+    response.set_cookie('cart', cart_data, max_age=constants.CART_COOKIE_EXPIRES)
+
+
+def apply_cart_operations(cart_dict, operations):
+    """在cookie购物车字典上执行批量操作,操作的含义与RedisCart.batch相同"""
+    for operation in operations:
+        op = operation['op']
+        sku_id = operation.get('sku_id')
+        selected = operation.get('selected', True)
+
+        if op == 'add':
+            if sku_id in cart_dict:
+                cart_dict[sku_id]['count'] += operation['count']
+                cart_dict[sku_id]['selected'] = cart_dict[sku_id]['selected'] or selected
+            else:
+                cart_dict[sku_id] = {'count': operation['count'], 'selected': selected}
+
+        elif op == 'update':
+            cart_dict[sku_id] = {'count': operation['count'], 'selected': selected}
+
+        elif op == 'delete':
+            cart_dict.pop(sku_id, None)
+
+        elif op == 'select' and sku_id is None:
+            for count_selected in cart_dict.values():
+                count_selected['selected'] = selected
+
+        elif op == 'select' and sku_id in cart_dict:
+            cart_dict[sku_id]['selected'] = selected
+
+    return cart_dict
 
-    if not cookie_dict:
-        # 字典未空,cookie购物车中无数据
-        return
 
-    # 2. 将cookie中购物车记录合并到登录用户的redis记录中
+def serialize_cart(cart_dict):
+    """根据购物车记录获取对应商品的数据并序列化"""
+    # 从SKU卡片缓存中获取商品数据
+    skus = get_sku_card_list(sorted(cart_dict))
 
-    # 存储cookie购物车记录中添加的商品id和对应数量count,此字典中的数据在进行购物车记录合并时需要设置到redis hash中
-    cart = {}
+    for sku in skus:
+        # 给sku增加count和selected,分别保存该商品在购物车中添加数量和勾选状态
+        sku['count'] = cart_dict[sku['id']]['count']
+        sku['selected'] = cart_dict[sku['id']]['selected']
 
-    # 存储cookie中购物车记录中被勾选的商品的id,此列表中商品id在进行购物车记录合并时需要添加到redis set 中
-    cart_selected_add = []
+    serializer = CartSKUSerializer(skus, many=True)
+    return serializer.data
 
-    # 存储cookie购物车记录中未被勾选商品的id,此列表中商品id在进行购物车记录合并时需要从redis set中移除
-    cart_selected_remove = []
 
-    for sku_id,count_selected in cookie_dict.items():
-        cart[sku_id] = count_selected['count']
+def guest_cart_in_redis():
+    """未登录用户的购物车是否保存在服务端redis中"""
+    return getattr(settings, 'CART_GUEST_STORAGE', 'cookie') == 'redis'
 
-        if count_selected['selected']:
-            # 勾选
-            cart_selected_add.append(sku_id)
-        else:
-            # 未勾选
-            cart_selected_remove.append(sku_id)
 
-    # 合并
-    redis_conn = get_redis_connection('cart')
-    # 将cart字典中key和value作为属性和值设置到redis对应的hash元素中
-    cart_key = 'cart_%s' % user.id
-    redis_conn.hmset(cart_key, cart)
+def get_guest_cart_token(request):
+    """获取cookie中未登录用户的购物车token,不存在或格式错误时返回None"""
+    token = request.COOKIES.get('cart_token')
 
-    # 将cart_selected_add中商品id添加到redis对应的色条元素中
-    cart_selected_key = 'cart_selected_%s' % user.id
+    if token and GUEST_CART_TOKEN_RE.match(token):
+        return token
 
-    if cart_selected_add:
-        redis_conn.sadd(cart_selected_key, *cart_selected_add)
+    return None
 
-    # 将cart_selected_remove中商品的id从redis对应的set元素中移除
-    if cart_selected_remove:
-        redis_conn.srem(cart_selected_key, *cart_selected_remove)
+
+def get_redis_cart_id(request, user, create=False):
+    """
+    获取用户购物车在redis中的标识(参考cart.storage.RedisCart)
+    1.登录用户: 用户id
+    2.未登录用户(服务端存储模式): 'anon_<token>', create为True时如果没有token则生成一个新的token
+    3.未登录用户(cookie存储模式): None
+    """
+    if user and user.is_authenticated:
+        return user.id
+
+    if not guest_cart_in_redis():
+        return None
+
+    token = get_guest_cart_token(request)
+
+    if token is None:
+        if not create:
+            return None
+        # 生成新的token,在set_guest_cart_token中设置到cookie中
+        token = secrets.token_urlsafe(16)
+
+    return 'anon_%s' % token
+
+
+def set_guest_cart_token(response, cart_id):
+    """未登录用户(服务端存储模式)的购物车,设置(刷新)token cookie"""
+    if not str(cart_id).startswith('anon_'):
+        return
+
+    token = cart_id[len('anon_'):]
+    response.set_cookie('cart_token', token, max_age=constants.CART_TOKEN_COOKIE_EXPIRES, httponly=True)
+
+
+def merge_cookie_cart_to_redis(request, user, response):
+    """将未登录用户的购物车记录(cookie或服务端redis)合并到登录用户的redis记录中"""
+    cookie_cart = request.COOKIES.get('cart')
+    token = get_guest_cart_token(request)
+
+    if cookie_cart is None and token is None:
+        # 未登录用户购物车中无数据
+        return
+
+    start = time.perf_counter()
+
+    # 1. 获取未登录用户的购物车记录
+    # 解析cookie中的购物车数据
+    cookie_dict = get_cookie_cart(request)
+
+    # 服务端存储的未登录用户购物车
+    guest_cart = RedisCart('anon_%s' % token) if token is not None else None
+
+    # 未登录购物车数据的摘要,用于防止重复提交时重复合并
+    digest = hashlib.sha1(('%s|%s' % (cookie_cart, token)).encode()).hexdigest()
+
+    # 2. 通过一次redis脚本调用将未登录用户的购物车记录合并到登录用户的redis记录中
+    policy = getattr(settings, 'CART_MERGE_POLICY', 'cookie')
+    merged = RedisCart(user.id).merge(cookie_dict, guest_cart=guest_cart, digest=digest, policy=policy)
 
     # 3. 删除cookie中购物车数据
-    response.delete_cookie('cart')
\ No newline at end of file
+    if cookie_cart is not None:
+        response.delete_cookie('cart')
+
+    if token is not None:
+        response.delete_cookie('cart_token')
+
+    logger.info('合并购物车: user_id=%s policy=%s merged=%s time=%.2fms' % (
+        user.id, policy, merged, (time.perf_counter() - start) * 1000))
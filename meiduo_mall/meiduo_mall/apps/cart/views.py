@@ -1,14 +1,67 @@
-import base64
-import pickle
-
 from django.shortcuts import render
-from django_redis import get_redis_connection
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from cart.serializers import CartSerializer, CartSKUSerializer, CartDelSerializer, CartSelectSerializer
+from cart.serializers import CartSerializer, CartDelSerializer, CartSelectSerializer, CartBatchSerializer
+from cart.storage import RedisCart
+from cart.utils import get_cookie_cart, set_cookie_cart, is_legacy_cookie_cart, get_redis_cart_id, \
+    set_guest_cart_token, serialize_cart, apply_cart_operations, is_cookie_cart_full
 from cart import constants
-from goods.models import SKU
+
+
+
+# PATCH  /cart/batch/
+class CartBatchView(APIView):
+    def perform_authentication(self, request):
+        """让当前视图跳过DRF框架默认认证过程"""
+        pass
+
+    def patch(self, request):
+        """
+        购物车记录批量操作(add/update/delete/select)
+        1.获取参数并进行校验(操作类型, sku_id商品是否存在, 商品库存是否足够, 一次查询完成校验)
+        2.执行批量操作
+            2.1如果用户已登录(或未登录用户购物车保存在服务端),通过一次redis脚本调用完成所有操作
+            2.2如果用户未登录,修改cookie中的购物车记录
+        3.返回操作之后的购物车记录
+        """
+        # 1.获取参数并进行校验
+        serializer = CartBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        # 获取校验之后的操作列表
+        operations = serializer.validated_data['operations']
+
+        try:
+            user = request.user
+        except Exception:
+            user = None
+
+        # 获取用户购物车在redis中的标识
+        cart_id = get_redis_cart_id(request, user, create=True)
+
+        # 2.执行批量操作
+        if cart_id is not None:
+            # 2.1通过一次redis脚本调用完成所有操作,并获取操作之后的购物车记录
+            cart_dict = RedisCart(cart_id).batch(operations)
+
+            # 3.返回操作之后的购物车记录
+            response = Response(serialize_cart(cart_dict))
+            set_guest_cart_token(response, cart_id)
+
+        else:
+            # 2.2修改cookie中的购物车记录
+            cart_dict = apply_cart_operations(get_cookie_cart(request), operations)
+            if is_cookie_cart_full(cart_dict):
+                return Response({'message': '购物车商品条数不能超过%d' % constants.CART_COOKIE_MAX_ITEMS},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+            # 3.返回操作之后的购物车记录
+            response = Response(serialize_cart(cart_dict))
+            set_cookie_cart(response, cart_dict)
+
+        return response
+
 
 
 
@@ -23,7 +76,7 @@ class CartSelectAllView(APIView):
         购物车记录全选和取消全选
         1.获取参数selected并进行校验(selected必传)
         2.设置用户购物车记录勾选状态
-            2.1如果用户已登录,设置redis中用户购物车记录勾选状态
+            2.1如果用户已登录(或未登录用户购物车保存在服务端),设置redis中用户购物车记录勾选状态
             2.2如果用户未登录,设置cookie中用户购物车记录勾选状态
         3.返回应答,设置成功
         """
@@ -39,51 +92,40 @@ class CartSelectAllView(APIView):
         except Exception:
             user = None
 
-        # 2.设置用户购物车记录勾选状态
-        if user and user.is_authenticated:
-
-            # 2.1如果用户已登录,设置redis中用户购物车记录勾选状态
-            redis_conn = get_redis_connection('cart')
-
-            # 从redis hash中获取用户购物车中所有商品的id
-            cart_key = 'cart_%s' % user.id
-            sku_ids = redis_conn.hkeys(cart_key)
+        # 获取用户购物车在redis中的标识
+        cart_id = get_redis_cart_id(request, user)
 
-            cart_selected_key = 'cart_selected_%s' % user.id
+        # 2.设置用户购物车记录勾选状态
+        if cart_id is not None:
 
-            if selected:
-                # 全选:将用户购物车所有商品的id添加到redis set中
-                redis_conn.sadd(cart_selected_key, *sku_ids)
+            # 2.1如果用户已登录(或未登录用户购物车保存在服务端),设置redis中用户购物车记录勾选状态
+            RedisCart(cart_id).select_all(selected)
 
-            else:
-                # 全不选:将用户购物车所有商品的id从redis set中移除
-                redis_conn.srem(cart_selected_key, *sku_ids)
+            response = Response({'message':'OK'})
+            set_guest_cart_token(response, cart_id)
 
-            return Response({'message':'OK'})
+            return response
 
 
         else:
             # 2.2如果用户未登录,设置cookie中用户购物车记录勾选状态
             # 获取cookie的购物车记录
-            cookie_cart = request.COOKIES.get('cart')
-
-            if cookie_cart:
-                # 解析cookie中的购物车数据
-                cart_dict = pickle.loads(base64.b64decode(cookie_cart))
-
-            else:
-                cart_dict = {}
+            cart_dict = get_cookie_cart(request)
 
             # 设置cookie购物车记录勾选状态
             for sku_id, count_selected in cart_dict.items():
                 cart_dict[sku_id]['selected'] = selected
 
+            # 商品条数超过上限的旧版本cookie不能重新保存
+            if is_cookie_cart_full(cart_dict):
+                return Response({'message': '购物车商品条数不能超过%d' % constants.CART_COOKIE_MAX_ITEMS},
+                                status=status.HTTP_400_BAD_REQUEST)
+
 
             # 3.返回应答,设置成功
             response = Response({'message':'OK'})
             # 设置cookie中的购物车数据
-            cart_data = base64.b64encode(pickle.dumps(cart_dict)).decode()
-            response.set_cookie('cart', cart_data, max_age=constants.CART_COOKIE_EXPIRES)
+            set_cookie_cart(response, cart_dict)
 
             return response
 
@@ -105,7 +147,7 @@ class CartView(APIView):
         购物车记录删除
         1. 获取商品sku_id并进行校验(sku_id必传,sku_id对应商品是否存在)
         2.删除用户的购物车记录
-            2.1如果用户已登录,删除redis中对应的购物车记录
+            2.1如果用户已登录(或未登录用户购物车保存在服务端),删除redis中对应的购物车记录
             2.2如果用户未登录,删除cookie中对应的购物车记录
         3.返回应答,购物车记录删除成功
         """
@@ -121,22 +163,19 @@ class CartView(APIView):
         except Exception:
             user = None
 
-        # 2.删除用户的购物车记录
-        if user and user.is_authenticated:
+        # 获取用户购物车在redis中的标识
+        cart_id = get_redis_cart_id(request, user)
 
-            # 2.1如果用户已登录,删除redis中对应的购物车记录
-            # 获取redis链接
-            redis_conn = get_redis_connection('cart')
+        # 2.删除用户的购物车记录
+        if cart_id is not None:
 
-            # 从redis hash中删除对应商品的id和数量count
-            cart_key = 'cart_%s' % user.id
-            redis_conn.hdel(cart_key, sku_id)
+            # 2.1如果用户已登录(或未登录用户购物车保存在服务端),删除redis中对应的购物车记录
+            RedisCart(cart_id).delete(sku_id)
 
-            # 从redis set中删除对应商品的id
-            cart_selected_key = 'cart_selected_%s' % user.id
-            redis_conn.srem(cart_selected_key, sku_id)
+            response = Response(status=status.HTTP_204_NO_CONTENT)
+            set_guest_cart_token(response, cart_id)
 
-            return Response(status=status.HTTP_204_NO_CONTENT)
+            return response
 
 
 
@@ -145,20 +184,16 @@ class CartView(APIView):
             response = Response(status=status.HTTP_204_NO_CONTENT)
 
             # 获取cookie中的购物车记录
-            cookie_cart = request.COOKIES.get('cart')
-
-            if cookie_cart is None:
-                # 购物车无数据
-                return response
-
-            # 解析cookie中购物车数据
-            cart_dict = pickle.loads(base64.b64decode(cookie_cart))
+            cart_dict = get_cookie_cart(request)
 
             if sku_id in cart_dict:
                 del cart_dict[sku_id]
+                # 商品条数超过上限的旧版本cookie不能重新保存
+                if is_cookie_cart_full(cart_dict):
+                    return Response({'message': '购物车商品条数不能超过%d' % constants.CART_COOKIE_MAX_ITEMS},
+                                    status=status.HTTP_400_BAD_REQUEST)
                 # 重新设置cookie购物车数据
-                cart_data = base64.b64encode(pickle.dumps(cart_dict)).decode()
-                response.set_cookie('cart', cart_data, max_age=constants.CART_COOKIE_EXPIRES)
+                set_cookie_cart(response, cart_dict)
 
 
             # 3.返回应答,购物车记录删除成功
@@ -173,7 +208,7 @@ class CartView(APIView):
         购物车记录修改:
         1.获取参数并进行校验(参数完整性,sku_id商品是否存在,商品的库存)
         2.修改用户的购物车记录
-            2.1如果用户以登录,修改redis中对应的购物车记录:
+            2.1如果用户以登录(或未登录用户购物车保存在服务端),修改redis中对应的购物车记录:
             2.2如果用户未登录,修改cookie中对应的购物车记录
         3.返回应答,购物车记录修改成功
         """
@@ -194,37 +229,25 @@ class CartView(APIView):
             user = None
 
 
-        # 2.修改用户的购物车记录
-        if user and user.is_authenticated:
-            # 2.1如果用户以登录,修改redis中对应的购物车记录
-            # 获取redis链接
-            redis_conn = get_redis_connection('cart')
-
-            # 修改redis hash中商品id对应数量count
-            cart_key = 'cart_%s' % user.id
-            redis_conn.hset(cart_key, sku_id, count)
+        # 获取用户购物车在redis中的标识
+        cart_id = get_redis_cart_id(request, user)
 
-            # 修改redis set中勾选的商品id
-            cart_selected_key = 'cart_selected_%s' % user.id
+        # 2.修改用户的购物车记录
+        if cart_id is not None:
+            # 2.1如果用户以登录(或未登录用户购物车保存在服务端),修改redis中对应的购物车记录
+            # 修改商品的数量count和勾选状态
+            RedisCart(cart_id).update(sku_id, count, selected)
 
-            if selected:
-                # 勾选
-                redis_conn.sadd(cart_selected_key, sku_id)
-            else:
-                # 取消勾选
-                redis_conn.srem(cart_selected_key, sku_id)
+            response = Response(serializer.validated_data)
+            set_guest_cart_token(response, cart_id)
 
-            return Response(serializer.validated_data)
+            return response
 
         else:
         # 2.2如果用户未登录,修改cookie中对应的购物车记录
             response = Response(serializer.validated_data)
             # 获取cookie中的购物车数据
-            cookie_cart = request.COOKIES.get('cart')
-            if cookie_cart is None:
-                # 购物车中无数据
-                return response
-            cart_dict = pickle.loads((base64.b64decode(cookie_cart)))
+            cart_dict = get_cookie_cart(request)
             if not cart_dict:
                 # 字典为空,购物车无数据
                 return response
@@ -234,11 +257,13 @@ class CartView(APIView):
                 'count':count,
                 'selected':selected
             }
+            if is_cookie_cart_full(cart_dict):
+                return Response({'message': '购物车商品条数不能超过%d' % constants.CART_COOKIE_MAX_ITEMS},
+                                status=status.HTTP_400_BAD_REQUEST)
 
             #  3.返回应答,购物车记录修改成功
             # 设置cookie中购物车数据
-            cart_data = base64.b64encode(pickle.dumps(cart_dict)).decode()
-            response.set_cookie('cart', cart_data, max_age=constants.CART_COOKIE_EXPIRES)
+            set_cookie_cart(response, cart_dict)
 
             return response
 
@@ -248,7 +273,7 @@ class CartView(APIView):
         """
         购物车记录获取
         1.获取用户的购物车记录
-            1.1如果用户以登录,从redis中获取用户的购物车记录
+            1.1如果用户以登录(或未登录用户购物车保存在服务端),从redis中获取用户的购物车记录
             1.2rug用户未登录,从cookie中获取用户的购物车记录
         2.根据用户购物车中商品id获取对应商品的数据
         3.将购物车商品的数据序列化并返回
@@ -258,26 +283,13 @@ class CartView(APIView):
         except Exception:
             user = None
 
-        # 1.获取用户的购物车记录
-        if user and user.is_authenticated:
-            #1.1如果用户以登录,从redis中获取用户的购物车记录
-            #获取redis链接
-            redis_conn = get_redis_connection('cart')
-
-            # 从redis 哈市中获取用户购物车中添加的商品id和对应的数量count
-            cart_key = 'cart_%s' % user.id
-
-            # {
-            #     b'<sku_id>':b'<count>',
-            #     ...
-            # }
-            cart_redis = redis_conn.hgetall(cart_key)
-
-            # 从redis set中获取用户购物车中勾选的商品id
-            cart_selected_key = 'cart_selected_%s' % user.id
-
-            cart_selected_redis = redis_conn.smembers(cart_selected_key)
+        # 获取用户购物车在redis中的标识
+        cart_id = get_redis_cart_id(request, user)
 
+        # 1.获取用户的购物车记录
+        if cart_id is not None:
+            #1.1如果用户以登录(或未登录用户购物车保存在服务端),从redis中获取用户的购物车记录
+            # 获取用户购物车中添加的商品id,对应的数量count和勾选状态
             # {
             #     '<sku_id>':{
             #         'count':'<count>',
@@ -285,41 +297,25 @@ class CartView(APIView):
             #     },
             #     ...
             # }
-            cart_dict = {}
-            for sku_id,count in cart_redis.items():
-                cart_dict[int(sku_id)] = {
-                    'count':int(count),
-                    'selected':sku_id in cart_selected_redis
-                }
+            cart_dict = RedisCart(cart_id).get()
 
 
         else:
             #1.2rug用户未登录,从cookie中获取用户的购物车记录
             # 获取cookie中的购物车数据
-            cookie_cart = request.COOKIES.get('cart')
-
-            if cookie_cart:
-                # 解析cookie中购物车数据
-                cart_dict = pickle.loads(base64.b64decode(cookie_cart))
-            else:
-                cart_dict = {}
+            # 解析cookie中购物车数据
+            cart_dict = get_cookie_cart(request)
 
 
         # 2.根据用户购物车中商品id获取对应商品的数据
-        sku_ids = cart_dict.keys()
-
-        skus = SKU.objects.filter(id__in=sku_ids)
-
-        for sku in skus:
-            # 给sku对象增加属
-            # 性count和selected,分别保存该商品在购物车中添加数量和勾选状态
-            sku.count = cart_dict[sku.id]['count']
-            sku.selected = cart_dict[sku.id]['selected']
-
         # 3.将购物车商品的数据序列化并返回
-        serializer = CartSKUSerializer(skus, many=True)
+        response = Response(serialize_cart(cart_dict))
+
+        if cart_id is None and is_legacy_cookie_cart(request) and not is_cookie_cart_full(cart_dict):
+            # 旧版本pickle格式的cookie,转换成新格式重新设置(商品条数超过上限时保留旧版本cookie,登录时合并)
+            set_cookie_cart(response, cart_dict)
 
-        return Response(serializer.data)
+        return response
 
 
     # POST
@@ -328,7 +324,7 @@ class CartView(APIView):
         购物车记录添加
         1.获取参数并进行校验(参数完整性, sku_id商品是否存在,商品库存是否足够)
         2.保存用户的购物车记录
-            2.1如果用户已登录,在redis中保存用户的购物车记录
+            2.1如果用户已登录(或未登录用户购物车保存在服务端),在redis中保存用户的购物车记录
             2.2如果用户未登录,在cookie中保存用户的购物车记录
         3.返回应答,购物车记录添加成功
         """
@@ -348,46 +344,33 @@ class CartView(APIView):
         except Exception:
             user = None
 
-        # 2.保存用户的购物车记录
-        if user and user.is_authenticated:
-            # 2.1如果用户已登录,在redis中保存用户的购物车记录
-
-            # 获取redis链接
-            redis_conn = get_redis_connection('cart')
-
-            # hash:在redis hash中存储用户购物车添加的商品id和数量count
-            cart_key = 'cart_%s' % user.id
+        # 获取用户购物车在redis中的标识(未登录用户购物车保存在服务端时,没有token会生成新的token)
+        cart_id = get_redis_cart_id(request, user, create=True)
 
+        # 2.保存用户的购物车记录
+        if cart_id is not None:
+            # 2.1如果用户已登录(或未登录用户购物车保存在服务端),在redis中保存用户的购物车记录
             # 如果购物车已经添加过该商品,数量需要进行累加,如果未添加,直接添加一个新元素
-            redis_conn.hincrby(cart_key, sku_id, count)
-
-            # set:在redis set中存储用户购物车勾选商品的id
-            cart_selected_key = 'cart_selected_%s' % user.id
+            RedisCart(cart_id).add(sku_id, count, selected)
 
-            if selected:
-                redis_conn.sadd(cart_selected_key, sku_id)
+            response = Response(serializer.validated_data, status=status.HTTP_201_CREATED)
+            set_guest_cart_token(response, cart_id)
 
-            return Response(serializer.validated_data, status=status.HTTP_201_CREATED)
+            return response
 
 
         else:
             # 2.2如果用户未登录,在cookie中保存用户的购物车记录
             # 获取cookie的购物车数据
-            cookie_cart = request.COOKIES.get('cart')
-
-            if cookie_cart:
-                # 解析cookie中购物车数据
-                # {
-                #     '<sku_id>':{
-                #         'count':'<count>',
-                #         'selected':'<selected>'
-                #     },
-                #     ...
-                # }
-                cart_dict = pickle.loads(base64.b64decode(cookie_cart))
-
-            else:
-                cart_dict = {}
+            # 解析cookie中购物车数据
+            # {
+            #     '<sku_id>':{
+            #         'count':'<count>',
+            #         'selected':'<selected>'
+            #     },
+            #     ...
+            # }
+            cart_dict = get_cookie_cart(request)
 
 
             # 如果购物车已经添加过该商品,数量需要进行累加,如果未添加,直接添加一个新元素
@@ -399,12 +382,15 @@ class CartView(APIView):
                 'selected':selected
             }
 
+            # cookie购物车商品条数已达上限时不能添加新商品
+            if is_cookie_cart_full(cart_dict):
+                return Response({'message': '购物车商品条数不能超过%d' % constants.CART_COOKIE_MAX_ITEMS},
+                                status=status.HTTP_400_BAD_REQUEST)
 
             # 3.返回应答,购物车记录添加成功
             response = Response(serializer.validated_data, status=status.HTTP_201_CREATED)
 
             # 设置cookie中购物车数据
-            cart_data = base64.b64encode(pickle.dumps((cart_dict))).decode()
-            response.set_cookie('cart', cart_data, max_age=constants.CART_COOKIE_EXPIRES)
+            set_cookie_cart(response, cart_dict)
 
             return response
@@ -1,9 +1,8 @@
 import os
 import time
-from collections import OrderedDict
 
 from contents.models import ContentCategory
-from goods.models import GoodsChannel
+from goods.utils import get_categories
 from django.conf import settings
 
 def generate_static_index_html():
@@ -21,28 +20,7 @@ def generate_static_index_html():
     #
     #     }
     # }
-    categories = OrderedDict()
-    channels = GoodsChannel.objects.order_by('group_id', 'sequence')
-    for channel in channels:
-        group_id = channel.group_id  # 当前组
-
-        if group_id not in categories:
-            categories[group_id] = {'channels': [], 'sub_cats': []}
-
-        cat1 = channel.category  # 当前频道的类别
-
-        # 追加当前频道
-        categories[group_id]['channels'].append({
-            'id': cat1.id,
-            'name': cat1.name,
-            'url': channel.url
-        })
-        # 构建当前类别的子类别
-        for cat2 in cat1.goodscategory_set.all():
-            cat2.sub_cats = []
-            for cat3 in cat2.goodscategory_set.all():
-                cat2.sub_cats.append(cat3)
-            categories[group_id]['sub_cats'].append(cat2)
+    categories = get_categories()
 
     # 广告内容
     contents = {}
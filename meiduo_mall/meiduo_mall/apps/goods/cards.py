@@ -0,0 +1,145 @@
+# SKU卡片数据缓存
+# 购物车、订单结算和浏览记录只需要SKU的id/name/price/default_image_url/comments,
+# 按 进程内LRU缓存 -> redis hash(sku_card_<sku_id>) -> 数据库 的顺序读取
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from django_redis import get_redis_connection
+
+from goods import constants
+from goods.models import SKU
+
+
+# SKU卡片包含的字段
+CARD_FIELDS = ('id', 'name', 'price', 'default_image_url', 'comments')
+
+
+class LRUCache(object):
+    """带有效期的进程内LRU缓存"""
+    def __init__(self, max_size, expires):
+        self.max_size = max_size
+        self.expires = expires
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+
+            value, expire_at = item
+            if expire_at < time.monotonic():
+                del self._data[key]
+                return None
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_local_cards = LRUCache(constants.SKU_CARD_LOCAL_CACHE_SIZE, constants.SKU_CARD_LOCAL_CACHE_EXPIRES)
+
+
+def _card_key(sku_id):
+    return 'sku_card_%s' % sku_id
+
+
+def _load_card(data):
+    """将redis hash中的数据转换成SKU卡片字典"""
+    data = {k.decode(): v.decode() for k, v in data.items()}
+    return {
+        'id': int(data['id']),
+        'name': data['name'],
+        'price': data['price'],
+        'default_image_url': data.get('default_image_url'),
+        'comments': int(data['comments']),
+    }
+
+
+def get_sku_cards(sku_ids):
+    """
+    获取多个SKU的卡片数据,不存在的SKU不会出现在结果中
+    返回: {
+        <sku_id>: {'id':, 'name':, 'price':, 'default_image_url':, 'comments':},
+        ...
+    }
+    """
+    cards = {}
+
+    # 1.进程内缓存
+    misses = []
+    for sku_id in {int(sku_id) for sku_id in sku_ids}:
+        card = _local_cards.get(sku_id)
+        if card is None:
+            misses.append(sku_id)
+        else:
+            cards[sku_id] = card
+
+    if not misses:
+        return cards
+
+    # 2.redis缓存: 一次管道请求获取所有未命中的卡片
+    redis_conn = get_redis_connection('goods')
+    pl = redis_conn.pipeline()
+    for sku_id in misses:
+        pl.hgetall(_card_key(sku_id))
+
+    db_misses = []
+    for sku_id, data in zip(misses, pl.execute()):
+        if data:
+            card = _load_card(data)
+            cards[sku_id] = card
+            _local_cards.set(sku_id, card)
+        else:
+            db_misses.append(sku_id)
+
+    if not db_misses:
+        return cards
+
+    # 3.数据库: 一次查询获取剩余的卡片,并写入redis
+    pl = redis_conn.pipeline()
+    for card in SKU.objects.filter(id__in=db_misses).values(*CARD_FIELDS):
+        card['price'] = str(card['price'])
+        cards[card['id']] = card
+        _local_cards.set(card['id'], card)
+
+        # redis hash中不能保存None
+        pl.hmset(_card_key(card['id']), {k: v for k, v in card.items() if v is not None})
+        pl.expire(_card_key(card['id']), constants.SKU_CARD_REDIS_EXPIRES)
+    pl.execute()
+
+    return cards
+
+
+def get_sku_card_list(sku_ids):
+    """按sku_ids的顺序返回SKU卡片列表,跳过不存在的SKU(返回卡片的副本,调用方可以在卡片中增加字段)"""
+    cards = get_sku_cards(sku_ids)
+    return [dict(cards[int(sku_id)]) for sku_id in sku_ids if int(sku_id) in cards]
+
+
+def clear_sku_cards(*sku_ids):
+    """清除SKU卡片缓存"""
+    if not sku_ids:
+        return
+
+    for sku_id in sku_ids:
+        _local_cards.delete(int(sku_id))
+
+    redis_conn = get_redis_connection('goods')
+    redis_conn.delete(*[_card_key(sku_id) for sku_id in sku_ids])
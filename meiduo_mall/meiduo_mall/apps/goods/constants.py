@@ -0,0 +1,20 @@
+# SKU卡片数据在redis中的有效期
+SKU_CARD_REDIS_EXPIRES = 24 * 60 * 60
+
+# SKU卡片数据进程内缓存的最大条数
+SKU_CARD_LOCAL_CACHE_SIZE = 2000
+
+# SKU卡片数据进程内缓存的有效期(信号只能清除当前进程的缓存,其他进程依靠较短的有效期保证数据及时更新)
+SKU_CARD_LOCAL_CACHE_EXPIRES = 10
+
+# SKU库存缓存在redis中的有效期
+SKU_STOCK_REDIS_EXPIRES = 5 * 60
+
+# 不存在的SKU在redis中的缓存有效期
+SKU_STOCK_MISSING_REDIS_EXPIRES = 60
+
+# 进程内缓存的商品分类菜单检查redis中版本号的间隔(秒)
+CATEGORIES_VERSION_CHECK_INTERVAL = 5
+
+# 合并静态页面生成请求的默认窗口期(秒),窗口期内对同一个页面的多次修改只生成一次页面
+STATIC_PAGES_DEBOUNCE_WINDOW = 5
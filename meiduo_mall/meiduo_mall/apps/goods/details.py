@@ -0,0 +1,164 @@
+# 商品静态详情页面
+# 按照商品(SPU)一次加载所有SKU、规格、选项和SKU具体规格,在内存中构建 规格选项 -> SKU 的对应关系,
+# 同一个商品的所有SKU详情页面共用这份数据,生成一个商品的所有详情页面只需要固定次数的查询;
+# 渲染结果和已有文件内容相同时不重写文件
+import hashlib
+import os
+
+from django.conf import settings
+from django.template import loader
+
+from goods.models import Goods, GoodsChannel, GoodsSpecification, SpecificationOption, SKU, SKUSpecification
+from goods.utils import get_categories
+
+
+class GoodsSpecMatrix(object):
+    """商品的规格矩阵: 商品所有SKU的规格键以及 规格键 -> sku_id 的字典"""
+    def __init__(self, goods):
+        self.goods = goods
+
+        # 1.商品的规格及选项: [{'name':, 'options': [{'id':, 'value':}, ...]}, ...]
+        self.specs = [{'id': spec['id'], 'name': spec['name'], 'options': []}
+                      for spec in GoodsSpecification.objects.filter(goods=goods).order_by('id').values('id', 'name')]
+        spec_index = {spec['id']: spec for spec in self.specs}
+        options = SpecificationOption.objects.filter(spec__goods=goods).order_by('id').values('id', 'spec_id', 'value')
+        for option in options:
+            spec_index[option['spec_id']]['options'].append({'id': option['id'], 'value': option['value']})
+
+        # 2.每个SKU的规格键
+        # sku_keys = {
+        #     sku_id: [规格1参数id, 规格2参数id, 规格3参数id, ...],
+        #     ...
+        # }
+        self.sku_keys = {}
+        sku_specs = SKUSpecification.objects.filter(sku__goods=goods).order_by('sku_id', 'spec_id').values_list(
+            'sku_id', 'option_id')
+        for sku_id, option_id in sku_specs:
+            self.sku_keys.setdefault(sku_id, []).append(option_id)
+
+        # 3.构建不同规格参数（选项）的sku字典
+        # spec_sku_map = {
+        #     (规格1参数id, 规格2参数id, 规格3参数id, ...): sku_id,
+        #     ...
+        # }
+        self.spec_sku_map = {tuple(key): sku_id for sku_id, key in self.sku_keys.items()}
+
+    def get_specs(self, sku_id):
+        """
+        获取指定SKU详情页面的规格信息,SKU的规格信息不完整时返回None
+        返回: [
+            {
+                'name': '屏幕尺寸',
+                'options': [
+                    {'value': '13.3寸', 'sku_id': xxx},
+                    {'value': '15.4寸', 'sku_id': xxx},
+                ]
+            },
+            ...
+        ]
+        """
+        sku_key = self.sku_keys.get(sku_id, [])
+        if len(sku_key) < len(self.specs):
+            return None
+
+        specs = []
+        for index, spec in enumerate(self.specs):
+            # 复制当前sku的规格键
+            key = sku_key[:]
+            options = []
+            for option in spec['options']:
+                # 在规格参数sku字典中查找符合当前规格的sku
+                key[index] = option['id']
+                options.append({
+                    'id': option['id'],
+                    'value': option['value'],
+                    'sku_id': self.spec_sku_map.get(tuple(key))
+                })
+            specs.append({'id': spec['id'], 'name': spec['name'], 'options': options})
+
+        return specs
+
+
+def get_detail_html_path(sku_id):
+    """SKU静态详情页面的保存路径"""
+    return os.path.join(settings.GENERATED_STATIC_HTML_FILES_DIR, 'goods/%s.html' % sku_id)
+
+
+def render_sku_detail_html(matrix, sku, categories):
+    """使用商品的规格矩阵渲染SKU详情页面,SKU的规格信息不完整时返回None"""
+    specs = matrix.get_specs(sku.id)
+    if specs is None:
+        return None
+
+    context = {
+        'categories': categories,
+        'goods': matrix.goods,
+        'specs': specs,
+        'sku': sku
+    }
+
+    temp = loader.get_template('detail.html')
+    return temp.render(context)
+
+
+def _file_digest(path):
+    """已有静态文件内容的md5,文件不存在时返回None"""
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.md5(f.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+def save_html(path, html, force=False):
+    """保存静态页面,内容没有变化时不重写文件,返回是否写入了文件"""
+    data = html.encode()
+    if not force and _file_digest(path) == hashlib.md5(data).hexdigest():
+        return False
+
+    with open(path, 'wb') as f:
+        f.write(data)
+    return True
+
+
+def generate_goods_detail_html(goods_id, sku_ids=None, force=False):
+    """
+    生成商品所有SKU(或者sku_ids指定的SKU)的静态详情页面
+    返回: {
+        'written': [<sku_id>, ...],  # 写入了文件的SKU
+        'skipped': [<sku_id>, ...],  # 内容没有变化的SKU
+        'incomplete': [<sku_id>, ...]  # 规格信息不完整,没有生成页面的SKU
+    }
+    """
+    # 1. 获取商品详情页面所需数据
+    # 商品分类菜单
+    categories = get_categories()
+
+    goods = Goods.objects.select_related('category1', 'category2', 'category3').get(id=goods_id)
+
+    # 面包屑导航信息中的频道
+    goods.channel = GoodsChannel.objects.filter(category_id=goods.category1_id).order_by('id').first()
+
+    # 商品的规格矩阵
+    matrix = GoodsSpecMatrix(goods)
+
+    # 商品的SKU及图片
+    skus = SKU.objects.filter(goods_id=goods_id).prefetch_related('skuimage_set')
+    if sku_ids is not None:
+        skus = skus.filter(id__in=sku_ids)
+
+    # 2. 渲染并保存每个SKU的详情页面
+    result = {'written': [], 'skipped': [], 'incomplete': []}
+    for sku in skus:
+        sku.goods = goods
+        sku.images = sku.skuimage_set.all()
+
+        res_html = render_sku_detail_html(matrix, sku, categories)
+        if res_html is None:
+            result['incomplete'].append(sku.id)
+        elif save_html(get_detail_html_path(sku.id), res_html, force):
+            result['written'].append(sku.id)
+        else:
+            result['skipped'].append(sku.id)
+
+    return result
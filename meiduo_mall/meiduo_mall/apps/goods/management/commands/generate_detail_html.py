@@ -0,0 +1,87 @@
+import itertools
+import logging
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from goods.details import generate_goods_detail_html
+from goods.models import SKU
+
+logger = logging.getLogger('django')
+
+
+def _init_process():
+    """子进程不能使用父进程中打开的数据库连接"""
+    connections.close_all()
+
+
+def _generate(args):
+    """在子进程中生成一个商品的详情页面,每个子进程只构建一次分类菜单(goods.utils的进程内缓存)"""
+    goods_id, sku_ids, force = args
+    try:
+        return goods_id, generate_goods_detail_html(goods_id, sku_ids, force), None
+    except Exception as e:
+        logger.exception('生成商品%s的静态详情页面失败' % goods_id)
+        return goods_id, None, '%s: %s' % (e.__class__.__name__, e)
+
+
+class Command(BaseCommand):
+    """
+    并行生成所有商品的静态详情页面
+    按照商品(SPU)分组读取SKU,同一商品的SKU在同一个子进程中使用相同的规格数据渲染;
+    页面内容没有变化时不重写文件
+    """
+    help = '并行生成所有商品的静态详情页面'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count(), help='子进程数量')
+        parser.add_argument('--goods', type=int, nargs='*', help='只生成指定商品(SPU)的详情页面')
+        parser.add_argument('--force', action='store_true', help='内容没有变化时也重写文件')
+
+    def iter_goods(self, goods_ids, force):
+        """按商品分组逐批读取sku_id,不一次加载所有SKU"""
+        skus = SKU.objects.order_by('goods_id', 'id').values_list('goods_id', 'id')
+        if goods_ids:
+            skus = skus.filter(goods_id__in=goods_ids)
+
+        for goods_id, rows in itertools.groupby(skus.iterator(), key=lambda row: row[0]):
+            yield goods_id, [sku_id for _, sku_id in rows], force
+
+    def handle(self, *args, **options):
+        stats = {'goods': 0, 'written': 0, 'skipped': 0, 'incomplete': 0, 'failed': 0}
+        failures = []
+
+        # fork子进程之前关闭数据库连接
+        connections.close_all()
+
+        start = time.time()
+        pool = multiprocessing.Pool(options['processes'], initializer=_init_process)
+        try:
+            jobs = self.iter_goods(options['goods'], options['force'])
+            for goods_id, result, error in pool.imap_unordered(_generate, jobs):
+                stats['goods'] += 1
+                if error is not None:
+                    stats['failed'] += 1
+                    failures.append((goods_id, error))
+                else:
+                    for key in ('written', 'skipped', 'incomplete'):
+                        stats[key] += len(result[key])
+
+                if stats['goods'] % 100 == 0:
+                    self.stdout.write(self.format_stats(stats, time.time() - start))
+        finally:
+            pool.close()
+            pool.join()
+
+        for goods_id, error in failures:
+            self.stderr.write('商品%s生成失败: %s' % (goods_id, error))
+
+        self.stdout.write('完成: %s' % self.format_stats(stats, time.time() - start))
+
+    def format_stats(self, stats, duration):
+        pages = stats['written'] + stats['skipped']
+        return 'goods=%d pages=%d written=%d skipped=%d incomplete=%d failed=%d (%.1fs, %.1f pages/s)' % (
+            stats['goods'], pages, stats['written'], stats['skipped'], stats['incomplete'], stats['failed'],
+            duration, pages / duration if duration else 0)
@@ -0,0 +1,217 @@
+# 静态页面的依赖关系
+# 每种模型数据修改之后,只重新生成依赖这份数据的静态页面:
+#   ('sku', sku_id)            一个SKU的详情页面
+#   ('goods', goods_id)        一个商品(SPU)所有SKU的详情页面(规格选项的链接依赖同一商品的所有SKU)
+#   ('category', category_id)  一/二/三级类别是该类别的所有商品的详情页面(面包屑导航)
+#   ('all', None)              所有详情页面(分类菜单出现在每个详情页面中)
+#   ('index', None)            首页index.html
+# 需要重新生成的页面先放入redis集合(static_pages_pending),窗口期结束时由延迟执行的flush任务统一生成,
+# 窗口期内对同一个页面的多次修改只生成一次页面
+from django.conf import settings
+from django.db.models import Q
+from django_redis import get_redis_connection
+
+from contents.models import Content, ContentCategory
+from goods import constants
+from goods.models import GoodsCategory, GoodsChannel, Brand, Goods, GoodsSpecification, SpecificationOption, SKU, \
+    SKUImage, SKUSpecification
+
+INDEX_PAGE = ('index', None)
+ALL_DETAIL_PAGES = ('all', None)
+
+PENDING_PAGES_KEY = 'static_pages_pending'
+FLUSH_SCHEDULED_KEY = 'static_pages_flush_scheduled'
+
+
+def _sku_pages(instance, deleted):
+    """SKU的名称、价格等只出现在自己的详情页面中;删除SKU会改变同一商品其他SKU页面的规格链接"""
+    pages = {('sku', instance.id)}
+    if deleted:
+        pages.add(('goods', instance.goods_id))
+    return pages
+
+
+def _sku_image_pages(instance, deleted):
+    return {('sku', instance.sku_id)}
+
+
+def _sku_specification_pages(instance, deleted):
+    """SKU的规格决定同一商品所有SKU页面的规格链接"""
+    # 级联删除SKU时SKU可能已经被删除,由SKU自己的删除处理
+    goods_id = SKU.objects.filter(id=instance.sku_id).values_list('goods_id', flat=True).first()
+    return {('goods', goods_id)} if goods_id else set()
+
+
+def _goods_specification_pages(instance, deleted):
+    return {('goods', instance.goods_id)}
+
+
+def _specification_option_pages(instance, deleted):
+    goods_id = GoodsSpecification.objects.filter(id=instance.spec_id).values_list('goods_id', flat=True).first()
+    return {('goods', goods_id)} if goods_id else set()
+
+
+def _goods_pages(instance, deleted):
+    return {('goods', instance.id)}
+
+
+def _brand_pages(instance, deleted):
+    """品牌信息没有出现在静态页面中"""
+    return set()
+
+
+def _in_category_menu(category):
+    """类别是否出现在分类菜单中: 类别本身、父类别或者祖父类别是某个频道的类别"""
+    category_ids = [category.id]
+    if category.parent_id:
+        category_ids.append(category.parent_id)
+        grandparent_id = GoodsCategory.objects.filter(id=category.parent_id).values_list('parent_id', flat=True).first()
+        if grandparent_id:
+            category_ids.append(grandparent_id)
+
+    return GoodsChannel.objects.filter(category_id__in=category_ids).exists()
+
+
+def _category_pages(instance, deleted):
+    """分类菜单中的类别出现在所有页面中,其他类别只出现在该类别商品的面包屑导航中"""
+    if _in_category_menu(instance):
+        return {INDEX_PAGE, ALL_DETAIL_PAGES}
+    return {('category', instance.id)}
+
+
+def _channel_pages(instance, deleted):
+    return {INDEX_PAGE, ALL_DETAIL_PAGES}
+
+
+def _content_pages(instance, deleted):
+    """广告只出现在首页中"""
+    return {INDEX_PAGE}
+
+
+# 模型 -> 计算受影响页面的函数
+DEPENDENCIES = {
+    SKU: _sku_pages,
+    SKUImage: _sku_image_pages,
+    SKUSpecification: _sku_specification_pages,
+    GoodsSpecification: _goods_specification_pages,
+    SpecificationOption: _specification_option_pages,
+    Goods: _goods_pages,
+    Brand: _brand_pages,
+    GoodsCategory: _category_pages,
+    GoodsChannel: _channel_pages,
+    ContentCategory: _content_pages,
+    Content: _content_pages,
+}
+
+
+def get_affected_pages(sender, instance, deleted=False):
+    """返回模型数据修改或删除之后需要重新生成的页面"""
+    return DEPENDENCIES[sender](instance, deleted)
+
+
+def get_debounce_window():
+    """合并页面生成请求的窗口期(秒)"""
+    return getattr(settings, 'STATIC_PAGES_DEBOUNCE_WINDOW', constants.STATIC_PAGES_DEBOUNCE_WINDOW)
+
+
+def _dump_page(page):
+    kind, obj_id = page
+    return kind if obj_id is None else '%s:%s' % (kind, obj_id)
+
+
+def _load_page(member):
+    kind, _, obj_id = member.decode().partition(':')
+    return kind, int(obj_id) if obj_id else None
+
+
+def regenerate_pages(pages):
+    """
+    把需要重新生成的页面放入待生成集合,
+    当前窗口期还没有安排flush任务时,安排一个在窗口期结束时执行的flush任务
+    """
+    window = get_debounce_window()
+    if window <= 0:
+        dispatch_pages(pages)
+        return
+
+    redis_conn = get_redis_connection('goods')
+    pl = redis_conn.pipeline()
+    pl.sadd(PENDING_PAGES_KEY, *[_dump_page(page) for page in pages])
+    # flush任务丢失时,标记在两个窗口期之后过期,之后的请求会重新安排flush任务
+    pl.set(FLUSH_SCHEDULED_KEY, 1, ex=window * 2, nx=True)
+    _, scheduled = pl.execute()
+
+    if scheduled:
+        from celery_tasks.html.tasks import flush_static_pages
+        flush_static_pages.apply_async(countdown=window)
+
+
+def flush_pages():
+    """取出待生成集合中的所有页面并发出生成任务,返回发出的页面"""
+    redis_conn = get_redis_connection('goods')
+
+    # 先删除标记再取出集合: 取出之后加入的页面会安排新的flush任务
+    redis_conn.delete(FLUSH_SCHEDULED_KEY)
+
+    pl = redis_conn.pipeline()
+    pl.smembers(PENDING_PAGES_KEY)
+    pl.delete(PENDING_PAGES_KEY)
+    members, _ = pl.execute()
+
+    pages = {_load_page(member) for member in members}
+    dispatch_pages(pages)
+    return pages
+
+
+def _in_categories(category_ids, prefix=''):
+    """商品(或者SKU所属的商品,prefix='goods__')的一/二/三级类别在category_ids中的查询条件"""
+    return (Q(**{prefix + 'category1_id__in': category_ids}) | Q(**{prefix + 'category2_id__in': category_ids}) |
+            Q(**{prefix + 'category3_id__in': category_ids}))
+
+
+def dispatch_pages(pages):
+    """发出生成页面的任务消息,已经包含在'所有详情页面'、类别页面或者商品页面中的页面不再单独生成"""
+    from celery_tasks.html.tasks import generate_static_index_html, generate_static_category_detail_html, \
+        generate_static_goods_detail_html, generate_static_sku_detail_html
+
+    if ALL_DETAIL_PAGES in pages:
+        pages = {page for page in pages if page[0] not in ('sku', 'goods', 'category')}
+
+    category_ids = [obj_id for kind, obj_id in pages if kind == 'category']
+    goods_ids = [obj_id for kind, obj_id in pages if kind == 'goods']
+    if category_ids and goods_ids:
+        # 所属类别的所有商品页面会全部重新生成的商品
+        covered = Goods.objects.filter(_in_categories(category_ids), id__in=goods_ids).values_list('id', flat=True)
+        pages = pages - {('goods', goods_id) for goods_id in covered}
+
+    sku_ids = [obj_id for kind, obj_id in pages if kind == 'sku']
+    if sku_ids and (goods_ids or category_ids):
+        # 所属商品或者类别的页面会全部重新生成的SKU(已经删除的SKU不在结果中,仍然单独处理以删除页面文件)
+        condition = Q(goods_id__in=goods_ids)
+        if category_ids:
+            condition |= _in_categories(category_ids, 'goods__')
+        covered = SKU.objects.filter(condition, id__in=sku_ids).values_list('id', flat=True)
+        pages = pages - {('sku', sku_id) for sku_id in covered}
+
+    # 依赖分类菜单的页面延迟到各进程重新检查分类菜单版本号之后再生成,避免使用进程内缓存的旧菜单
+    countdown = constants.CATEGORIES_VERSION_CHECK_INTERVAL
+
+    for kind, obj_id in pages:
+        if kind == 'index':
+            generate_static_index_html.apply_async(countdown=countdown)
+        elif kind == 'all':
+            generate_static_category_detail_html.apply_async(countdown=countdown)
+        elif kind == 'category':
+            generate_static_category_detail_html.delay(obj_id)
+        elif kind == 'goods':
+            generate_static_goods_detail_html.delay(obj_id)
+        elif kind == 'sku':
+            generate_static_sku_detail_html.delay(obj_id)
+
+
+def get_category_goods_ids(category_id=None):
+    """类别(一/二/三级)下所有商品的id,category_id为None时返回所有商品的id"""
+    goods = Goods.objects.order_by('id')
+    if category_id is not None:
+        goods = goods.filter(_in_categories([category_id]))
+    return goods.values_list('id', flat=True)
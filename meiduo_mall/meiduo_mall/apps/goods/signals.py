@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from goods.cards import clear_sku_cards
+from goods.models import SKU, GoodsCategory, GoodsChannel
+from goods.pages import DEPENDENCIES, get_affected_pages, regenerate_pages
+from goods.stock import set_sku_stock, clear_sku_stock
+from goods.utils import bump_categories_version
+
+
+@receiver([post_save, post_delete], sender=SKU)
+def clear_sku_cache(sender, instance, **kwargs):
+    """SKU数据修改或删除之后,清除对应的缓存数据"""
+    sku_id = instance.id
+    # 在事务提交之后再清除,避免其他请求在事务提交之前把旧数据重新写入缓存
+    transaction.on_commit(lambda: clear_sku_cards(sku_id))
+
+
+@receiver(post_save, sender=SKU)
+def update_sku_stock_cache(sender, instance, **kwargs):
+    """SKU数据保存之后(如admin中修改库存),更新库存缓存"""
+    sku_id = instance.id
+    stock = instance.stock
+    transaction.on_commit(lambda: set_sku_stock(sku_id, stock))
+
+
+@receiver(post_delete, sender=SKU)
+def clear_sku_stock_cache(sender, instance, **kwargs):
+    """SKU删除之后,清除库存缓存"""
+    sku_id = instance.id
+    transaction.on_commit(lambda: clear_sku_stock(sku_id))
+
+
+@receiver([post_save, post_delete], sender=GoodsCategory)
+@receiver([post_save, post_delete], sender=GoodsChannel)
+def reload_categories(sender, instance, **kwargs):
+    """商品分类或频道修改或删除之后,增加分类菜单版本号,各进程重新构建分类菜单"""
+    transaction.on_commit(bump_categories_version)
+
+
+def regenerate_static_pages(sender, instance, signal, **kwargs):
+    """数据修改或删除之后,在事务提交之后重新生成依赖这份数据的静态页面"""
+    if not getattr(settings, 'STATIC_PAGES_REGENERATE', True):
+        return
+
+    pages = get_affected_pages(sender, instance, deleted=signal is post_delete)
+    if pages:
+        transaction.on_commit(lambda: regenerate_pages(pages))
+
+
+for model in DEPENDENCIES:
+    post_save.connect(regenerate_static_pages, sender=model, dispatch_uid='regenerate_static_pages_%s' % model.__name__)
+    post_delete.connect(regenerate_static_pages, sender=model, dispatch_uid='regenerate_static_pages_%s' % model.__name__)
@@ -0,0 +1,64 @@
+# SKU库存缓存
+# 购物车添加/修改时只需要判断商品是否存在以及库存是否足够,从redis(sku_stock_<sku_id>)中读取,
+# 缓存未命中时查询数据库; 不存在的SKU缓存为-1
+from django_redis import get_redis_connection
+
+from goods import constants
+from goods.models import SKU
+
+
+def _stock_key(sku_id):
+    return 'sku_stock_%s' % sku_id
+
+
+def get_sku_stocks(sku_ids):
+    """获取多个SKU的库存,返回: {<sku_id>: <stock>, ...},不存在的SKU不会出现在结果中"""
+    sku_ids = list({int(sku_id) for sku_id in sku_ids})
+    if not sku_ids:
+        return {}
+
+    redis_conn = get_redis_connection('goods')
+    values = redis_conn.mget([_stock_key(sku_id) for sku_id in sku_ids])
+
+    stocks = {}
+    misses = []
+    for sku_id, value in zip(sku_ids, values):
+        if value is None:
+            misses.append(sku_id)
+        elif int(value) >= 0:
+            stocks[sku_id] = int(value)
+
+    if not misses:
+        return stocks
+
+    # 缓存未命中,一次查询数据库获取库存并写入缓存
+    db_stocks = dict(SKU.objects.filter(id__in=misses).values_list('id', 'stock'))
+
+    pl = redis_conn.pipeline()
+    for sku_id in misses:
+        if sku_id in db_stocks:
+            pl.setex(_stock_key(sku_id), constants.SKU_STOCK_REDIS_EXPIRES, db_stocks[sku_id])
+        else:
+            pl.setex(_stock_key(sku_id), constants.SKU_STOCK_MISSING_REDIS_EXPIRES, -1)
+    pl.execute()
+
+    stocks.update(db_stocks)
+    return stocks
+
+
+def get_sku_stock(sku_id):
+    """获取SKU的库存,SKU不存在时返回None"""
+    return get_sku_stocks([sku_id]).get(int(sku_id))
+
+
+def set_sku_stock(sku_id, stock):
+    """设置SKU的库存缓存"""
+    redis_conn = get_redis_connection('goods')
+    redis_conn.setex(_stock_key(sku_id), constants.SKU_STOCK_REDIS_EXPIRES, stock)
+
+
+def clear_sku_stock(*sku_ids):
+    """清除SKU的库存缓存"""
+    if sku_ids:
+        redis_conn = get_redis_connection('goods')
+        redis_conn.delete(*[_stock_key(sku_id) for sku_id in sku_ids])
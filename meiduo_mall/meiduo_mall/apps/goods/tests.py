@@ -1,3 +1,98 @@
-from django.test import TestCase
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django_redis import get_redis_connection
+
+from celery_tasks.html import tasks
+from goods.cards import _local_cards, get_sku_card_list
+from goods.models import GoodsCategory, Brand, Goods, SKU
+from goods.pages import PENDING_PAGES_KEY, FLUSH_SCHEDULED_KEY, dispatch_pages, flush_pages
+
+
+class SKUCardListTest(SimpleTestCase):
+    """SKU卡片列表"""
+    def setUp(self):
+        self.card = {'id': 1, 'name': 'sku', 'price': '10.00', 'default_image_url': None, 'comments': 0}
+        _local_cards.set(1, self.card)
+
+    def tearDown(self):
+        _local_cards.delete(1)
+
+    def test_returned_cards_are_copies(self):
+        """调用方修改返回的卡片不会修改进程内缓存"""
+        card = get_sku_card_list([1])[0]
+        card['count'] = 2
+        card['selected'] = True
+
+        self.assertEqual(_local_cards.get(1), {'id': 1, 'name': 'sku', 'price': '10.00',
+                                               'default_image_url': None, 'comments': 0})
+        self.assertNotIn('count', get_sku_card_list([1])[0])
+
+
+def create_goods(name, category3=None):
+    """创建测试商品(SPU)和它的一个SKU,返回SKU"""
+    if category3 is None:
+        category1 = GoodsCategory.objects.create(name='一级')
+        category2 = GoodsCategory.objects.create(name='二级', parent=category1)
+        category3 = GoodsCategory.objects.create(name='三级', parent=category2)
+    brand = Brand.objects.create(name='品牌', logo='brand.jpg', first_letter='P')
+    goods = Goods.objects.create(name=name, brand=brand, category1=category3.parent.parent,
+                                 category2=category3.parent, category3=category3)
+    return SKU.objects.create(name=name, caption='', goods=goods, category=category3, price=Decimal('10.00'),
+                              cost_price=Decimal('8.00'), market_price=Decimal('12.00'), stock=10,
+                              default_image_url='sku.jpg')
+
+
+@mock.patch.object(tasks.generate_static_sku_detail_html, 'delay')
+@mock.patch.object(tasks.generate_static_goods_detail_html, 'delay')
+@mock.patch.object(tasks.generate_static_category_detail_html, 'delay')
+class DispatchPagesTest(TestCase):
+    """发出生成静态页面的任务"""
+    def setUp(self):
+        self.sku = create_goods('商品')
+        self.other_sku = create_goods('其他商品')
+
+    def test_category_covers_goods_and_sku(self, category_delay, goods_delay, sku_delay):
+        """类别页面会重新生成的商品和SKU不再单独生成"""
+        category_id = self.sku.goods.category3_id
+        dispatch_pages({('category', category_id), ('goods', self.sku.goods_id), ('sku', self.sku.id),
+                        ('goods', self.other_sku.goods_id), ('sku', self.other_sku.id)})
+
+        category_delay.assert_called_once_with(category_id)
+        goods_delay.assert_called_once_with(self.other_sku.goods_id)
+        sku_delay.assert_not_called()
+
+    def test_sku_without_covering_pages(self, category_delay, goods_delay, sku_delay):
+        """没有所属商品或者类别页面时单独生成SKU页面"""
+        dispatch_pages({('sku', self.sku.id), ('goods', self.other_sku.goods_id)})
+
+        sku_delay.assert_called_once_with(self.sku.id)
+        goods_delay.assert_called_once_with(self.other_sku.goods_id)
+
+
+@override_settings(STATIC_PAGES_REGENERATE=True, STATIC_PAGES_DEBOUNCE_WINDOW=5)
+class RegenerateStaticPagesTest(TransactionTestCase):
+    """窗口期内的多次修改只安排一次flush任务,只生成一次页面(TransactionTestCase: 事务提交之后的回调会执行)"""
+    def setUp(self):
+        with override_settings(STATIC_PAGES_REGENERATE=False):
+            self.sku = create_goods('商品')
+
+        self.redis_conn = get_redis_connection('goods')
+        self.redis_conn.delete(PENDING_PAGES_KEY, FLUSH_SCHEDULED_KEY)
+
+    def tearDown(self):
+        self.redis_conn.delete(PENDING_PAGES_KEY, FLUSH_SCHEDULED_KEY)
+
+    @mock.patch.object(tasks.generate_static_sku_detail_html, 'delay')
+    @mock.patch.object(tasks.flush_static_pages, 'apply_async')
+    def test_debounce(self, flush_apply_async, sku_delay):
+        for i in range(14):
+            self.sku.price = Decimal('%d.00' % (10 + i))
+            self.sku.save()
+
+        flush_apply_async.assert_called_once_with(countdown=5)
+
+        # 窗口期结束时执行的flush任务
+        self.assertEqual(flush_pages(), {('sku', self.sku.id)})
+        sku_delay.assert_called_once_with(self.sku.id)
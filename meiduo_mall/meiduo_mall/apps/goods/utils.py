@@ -1,32 +1,102 @@
+# 商品分类菜单
+# 两次查询(GoodsChannel和GoodsCategory)加载所有数据,在内存中构建分组的分类树,
+# 分类树缓存在进程内,分类或频道修改时(goods.signals)增加redis中的版本号,各进程定期检查版本号并重新构建
+import threading
+import time
 from collections import OrderedDict
 
-from goods.models import GoodsChannel
+from django_redis import get_redis_connection
 
+from goods import constants
+from goods.models import GoodsCategory, GoodsChannel
 
-def get_categories():
-    """返回商品分类的数据"""
+CATEGORIES_VERSION_KEY = 'categories_version'
+
+
+def build_categories():
+    """
+    查询数据库构建商品分类菜单
+    返回: OrderedDict({
+        <group_id>: {
+            'channels': [{'id':, 'name':, 'url':}, ...],
+            'sub_cats': [{'id':, 'name':, 'sub_cats': [{'id':, 'name':}, ...]}, ...]
+        },
+        ...
+    })
+    """
+    # 1.所有类别按照父类别分组: {<parent_id>: [{'id':, 'name':}, ...]}
+    children = {}
+    for cat in GoodsCategory.objects.order_by('id').values('id', 'name', 'parent_id'):
+        children.setdefault(cat['parent_id'], []).append({'id': cat['id'], 'name': cat['name']})
+
+    # 2.按照组号和组内顺序遍历频道
     categories = OrderedDict()
-    channels = GoodsChannel.objects.order_by('group_id', 'sequence')
+    channels = GoodsChannel.objects.order_by('group_id', 'sequence').values(
+        'group_id', 'url', 'category_id', 'category__name')
     for channel in channels:
-        group_id = channel.group_id  # 当前组
+        group_id = channel['group_id']  # 当前组
 
         if group_id not in categories:
             categories[group_id] = {'channels': [], 'sub_cats': []}
 
-        cat1 = channel.category  # 当前频道的类别
+        cat1_id = channel['category_id']  # 当前频道的类别
 
         # 追加当前频道
         categories[group_id]['channels'].append({
-            'id': cat1.id,
-            'name': cat1.name,
-            'url': channel.url
+            'id': cat1_id,
+            'name': channel['category__name'],
+            'url': channel['url']
         })
         # 构建当前类别的子类别
-        for cat2 in cat1.goodscategory_set.all():
-            cat2.sub_cats = []
-            for cat3 in cat2.goodscategory_set.all():
-                cat2.sub_cats.append(cat3)
-            categories[group_id]['sub_cats'].append(cat2)
-
+        for cat2 in children.get(cat1_id, []):
+            categories[group_id]['sub_cats'].append({
+                'id': cat2['id'],
+                'name': cat2['name'],
+                'sub_cats': children.get(cat2['id'], [])
+            })
 
     return categories
+
+
+class CategoryTree(object):
+    """进程内缓存的商品分类菜单"""
+    def __init__(self):
+        self.version = None
+        self.categories = None
+        self._checked = 0
+        self._lock = threading.Lock()
+
+    def _get_version(self):
+        redis_conn = get_redis_connection('goods')
+        version = redis_conn.get(CATEGORIES_VERSION_KEY)
+        return version.decode() if version is not None else '0'
+
+    def get(self):
+        """超过检查间隔时检查版本号,版本号变化时重新构建分类菜单"""
+        now = time.time()
+        if self.categories is not None and now - self._checked < constants.CATEGORIES_VERSION_CHECK_INTERVAL:
+            return self.categories
+
+        with self._lock:
+            if self.categories is None or now - self._checked >= constants.CATEGORIES_VERSION_CHECK_INTERVAL:
+                version = self._get_version()
+                if version != self.version or self.categories is None:
+                    self.categories = build_categories()
+                    self.version = version
+                self._checked = now
+
+        return self.categories
+
+
+category_tree = CategoryTree()
+
+
+def get_categories():
+    """返回商品分类的数据(返回进程内缓存的对象,调用方不要修改)"""
+    return category_tree.get()
+
+
+def bump_categories_version():
+    """商品分类或频道修改之后增加版本号,各进程重新构建分类菜单"""
+    redis_conn = get_redis_connection('goods')
+    redis_conn.incr(CATEGORIES_VERSION_KEY)
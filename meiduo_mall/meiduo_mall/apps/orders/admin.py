@@ -1,3 +1,13 @@
 from django.contrib import admin
 
+from orders import models
+
 # Register your models here.
+
+
+class FreightRuleAdmin(admin.ModelAdmin):
+    """运费规则Admin管理类"""
+    list_display = ('id', 'area', 'base_freight', 'extra_freight', 'free_amount', 'is_enabled')
+
+
+admin.site.register(models.FreightRule, FreightRuleAdmin)
@@ -0,0 +1,128 @@
+# 订单归档: 已完成或已取消并且超过归档期限(settings.ORDER_ARCHIVE_DAYS)的订单
+# 从tb_order_info/tb_order_goods移动到tb_order_info_archive/tb_order_goods_archive,
+# 热表中只保留近期和未结束的订单
+# 订单id的前14位是下单时间(年月日时分秒),读取订单时根据订单id的时间决定先查询归档表还是热表;
+# 归档命令可以使用比ORDER_ARCHIVE_DAYS更短的期限(--days),已归档订单的最晚期限记录在redis中,
+# 订单列表根据这个期限判断是否需要合并归档表
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from orders.models import OrderInfo, OrderGoods, ArchivedOrderInfo, ArchivedOrderGoods
+
+# 可以归档的订单状态
+ARCHIVABLE_STATUS = [OrderInfo.ORDER_STATUS_ENUM['FINISHED'], OrderInfo.ORDER_STATUS_ENUM['CANCELED']]
+
+# 已经归档的订单的最晚归档期限(时间戳)
+ARCHIVED_CUTOFF_KEY = 'order_archived_cutoff'
+
+
+def get_archive_days():
+    return getattr(settings, 'ORDER_ARCHIVE_DAYS', 180)
+
+
+def get_archive_cutoff(days=None):
+    """归档期限: 下单时间早于该时间的订单可以归档"""
+    return timezone.now() - timedelta(days=get_archive_days() if days is None else days)
+
+
+def get_archived_cutoff():
+    """
+    已经归档的订单的最晚归档期限: 归档表中的订单都早于该时间
+    没有记录时(例如redis数据丢失)返回当前时间,调用方总是查询归档表
+    """
+    redis_conn = get_redis_connection('orders')
+    timestamp = redis_conn.get(ARCHIVED_CUTOFF_KEY)
+    if timestamp is None:
+        return timezone.now()
+    return datetime.fromtimestamp(float(timestamp), timezone.utc)
+
+
+def save_archived_cutoff(cutoff):
+    """在移动订单之前记录归档期限,只保留最晚的期限"""
+    redis_conn = get_redis_connection('orders')
+    timestamp = redis_conn.get(ARCHIVED_CUTOFF_KEY)
+    if timestamp is None or cutoff.timestamp() > float(timestamp):
+        redis_conn.set(ARCHIVED_CUTOFF_KEY, cutoff.timestamp())
+
+
+def get_order_id_time(order_id):
+    """从订单id中解析出下单时间(本地时间),解析失败时返回None"""
+    try:
+        return timezone.make_aware(datetime.strptime(order_id[:14], '%Y%m%d%H%M%S'))
+    except (ValueError, TypeError):
+        return None
+
+
+def may_be_archived(order_id):
+    """根据订单id中的下单时间判断订单是否可能已经归档(只决定查询的顺序)"""
+    order_time = get_order_id_time(order_id)
+    return order_time is not None and order_time < get_archive_cutoff()
+
+
+def get_order(order_id, **filters):
+    """
+    根据订单id获取订单(OrderInfo或ArchivedOrderInfo),订单不存在时返回None
+    订单id的时间早于归档期限时先查询归档表,否则先查询热表;
+    一个表中没有时再查询另一个表(归档命令可以使用更短的期限归档)
+    """
+    models = [OrderInfo, ArchivedOrderInfo]
+    if may_be_archived(order_id):
+        models.reverse()
+
+    for model in models:
+        order = model.objects.filter(order_id=order_id, **filters).first()
+        if order is not None:
+            return order
+
+    return None
+
+
+def archive_orders(cutoff, batch_size, dry_run=False):
+    """
+    归档下单时间早于cutoff的已完成和已取消订单
+    每批订单在一个事务中完成复制和删除,中途退出后重新执行会从剩下的订单继续
+    生成器,每处理一批返回(本批订单数量, 本批订单商品数量)
+    """
+    # 订单id以下单时间开头,用主键范围缩小扫描的范围
+    id_prefix = timezone.localtime(cutoff).strftime('%Y%m%d%H%M%S')
+    queryset = OrderInfo.objects.filter(
+        order_id__lt=id_prefix, create_time__lt=cutoff, status__in=ARCHIVABLE_STATUS).order_by('order_id')
+
+    # 先记录归档期限再移动订单,订单列表不会漏掉已经移动到归档表的订单
+    if not dry_run:
+        save_archived_cutoff(cutoff)
+
+    last_order_id = ''
+    while True:
+        order_ids = list(queryset.filter(order_id__gt=last_order_id).values_list('order_id', flat=True)[:batch_size])
+        if not order_ids:
+            break
+        last_order_id = order_ids[-1]
+
+        if dry_run:
+            yield len(order_ids), OrderGoods.objects.filter(order_id__in=order_ids).count()
+            continue
+
+        with transaction.atomic():
+            # 1.锁定本批订单(重新判断状态)
+            orders = list(OrderInfo.objects.select_for_update().filter(
+                order_id__in=order_ids, status__in=ARCHIVABLE_STATUS).values())
+            order_ids = [order['order_id'] for order in orders]
+            goods = list(OrderGoods.objects.filter(order_id__in=order_ids).values())
+
+            # 2.复制到归档表(上一次执行已经复制过的订单不再复制)
+            archived_ids = set(ArchivedOrderInfo.objects.filter(order_id__in=order_ids).values_list('order_id', flat=True))
+            ArchivedOrderInfo.objects.bulk_create(
+                [ArchivedOrderInfo(**order) for order in orders if order['order_id'] not in archived_ids])
+            ArchivedOrderGoods.objects.bulk_create(
+                [ArchivedOrderGoods(**item) for item in goods if item['order_id'] not in archived_ids])
+
+            # 3.从热表中删除
+            OrderGoods.objects.filter(order_id__in=order_ids).delete()
+            OrderInfo.objects.filter(order_id__in=order_ids).delete()
+
+        yield len(orders), len(goods)
@@ -0,0 +1,46 @@
+# 库存预留的有效期(秒),超过有效期仍未提交的订单由对账任务释放预留的库存
+STOCK_RESERVATION_EXPIRES = 60
+
+# 库存对账任务每批处理的数量
+STOCK_RECONCILE_BATCH_SIZE = 500
+
+# 异步下单凭证在redis中的有效期(秒)
+ORDER_TICKET_EXPIRES = 24 * 60 * 60
+
+# 用户正在处理的异步下单任务标记的有效期(秒),worker异常退出没有释放标记时,该时间之后可以重新下单;
+# 任务开始执行时重新设置有效期,排队期间标记过期并且用户已经重新下单时,排队的任务不再下单
+ORDER_SUBMISSION_EXPIRES = 5 * 60
+
+# 订单id中同一毫秒内的序号上限(3位)
+ORDER_ID_SEQUENCE_LIMIT = 1000
+
+# 订单id中每个节点上的进程编号上限(2位)
+ORDER_ID_PROCESS_LIMIT = 100
+
+# 下单幂等键(Idempotency-Key)及其对应应答的有效期(秒)
+ORDER_IDEMPOTENCY_EXPIRES = 24 * 60 * 60
+
+# 幂等键处理中状态的有效期(秒),处理请求的进程异常退出时该时间之后可以重新提交
+ORDER_IDEMPOTENCY_LOCK_EXPIRES = 60
+
+# 重复请求等待第一个请求处理完成的最长时间和轮询间隔(秒)
+ORDER_IDEMPOTENCY_WAIT = 10
+ORDER_IDEMPOTENCY_WAIT_INTERVAL = 0.1
+
+# 在线支付的订单未支付的自动取消时间(秒)
+ORDER_UNPAID_EXPIRES = 30 * 60
+
+# 自动取消订单任务每批处理的订单数量
+ORDER_CANCEL_BATCH_SIZE = 200
+
+# 订单归档每批处理的订单数量
+ORDER_ARCHIVE_BATCH_SIZE = 500
+
+# 没有匹配的运费规则时使用的运费
+DEFAULT_FREIGHT = '10.00'
+
+# 运费规则版本号的检查间隔(秒),版本号变化时重新加载规则
+FREIGHT_RULES_CHECK_INTERVAL = 5
+
+# 订单结算结果在redis中的缓存时间(秒)
+SETTLEMENT_CACHE_EXPIRES = 60
@@ -0,0 +1,40 @@
+import time
+
+from goods.models import SKU
+from orders.models import OrderInfo
+from orders.reservation import stock_reservation_enabled, get_expired_reservations, release_stock, \
+    get_reserved_sku_ids, sync_stock
+
+
+def reconcile_stock_reservations():
+    """
+    库存预留对账:
+    1.释放过期的库存预留: 订单已经保存的只删除预留记录,订单不存在(事务失败)的归还库存
+    2.用数据库中的库存校正redis中的可用库存
+    """
+    if not stock_reservation_enabled():
+        return
+
+    print('%s: reconcile_stock_reservations' % time.ctime())
+
+    # 1.释放过期的库存预留
+    released = 0
+    while True:
+        order_ids = get_expired_reservations()
+        if not order_ids:
+            break
+
+        saved_order_ids = set(OrderInfo.objects.filter(order_id__in=order_ids).values_list('order_id', flat=True))
+        for order_id in order_ids:
+            release_stock(order_id, restore=order_id not in saved_order_ids)
+        released += len(order_ids)
+
+    # 2.校正可用库存
+    synced = 0
+    for sku_ids in get_reserved_sku_ids():
+        stocks = dict.fromkeys(sku_ids, 0)
+        stocks.update(SKU.objects.filter(id__in=sku_ids).values_list('id', 'stock'))
+        sync_stock(stocks)
+        synced += len(sku_ids)
+
+    print('%s: reconcile_stock_reservations done: released=%d synced=%d' % (time.ctime(), released, synced))
@@ -0,0 +1,101 @@
+# 未支付订单的自动取消
+# 在线支付的订单保存之后把支付期限记录在redis zset order_pay_deadlines 中(订单id -> 期限时间戳),
+# celery定时任务(cancel_expired_orders)分批取出已经超过期限的订单,把仍未支付的订单修改为已取消,
+# 每批订单使用一条UPDATE语句归还商品库存和销量
+import logging
+import time
+
+from django.db import transaction
+from django.db.models import Sum
+from django_redis import get_redis_connection
+
+from goods.stock import clear_sku_stock
+from orders import constants
+from orders.models import OrderInfo, OrderGoods
+
+logger = logging.getLogger('django')
+
+DEADLINES_KEY = 'order_pay_deadlines'
+
+
+def add_pay_deadline(order_id, expires=constants.ORDER_UNPAID_EXPIRES):
+    """记录订单的支付期限"""
+    redis_conn = get_redis_connection('orders')
+    redis_conn.zadd(DEADLINES_KEY, {order_id: time.time() + expires})
+
+
+def get_deadline_metrics():
+    """
+    自动取消订单的监控指标:
+    backlog: 等待支付的订单数量, overdue: 已经超过期限还没有处理的订单数量,
+    lag: 最早超过期限的订单已经超时的秒数(没有超时的订单时为0)
+    """
+    redis_conn = get_redis_connection('orders')
+    now = time.time()
+
+    pl = redis_conn.pipeline()
+    pl.zcard(DEADLINES_KEY)
+    pl.zcount(DEADLINES_KEY, 0, now)
+    pl.zrange(DEADLINES_KEY, 0, 0, withscores=True)
+    backlog, overdue, oldest = pl.execute()
+
+    lag = now - oldest[0][1] if oldest and oldest[0][1] <= now else 0
+
+    return {
+        'backlog': backlog,
+        'overdue': overdue,
+        'lag': round(lag, 3),
+    }
+
+
+def cancel_orders(order_ids):
+    """
+    取消仍未支付的订单并归还库存,返回取消的订单数量
+    锁定订单记录之后再判断订单状态,订单同时被支付或者被其他任务取消时不会重复归还库存
+    """
+    from orders.placement import restore_stock
+
+    with transaction.atomic():
+        # 1.锁定仍未支付的订单
+        cancel_ids = list(OrderInfo.objects.select_for_update().filter(
+            order_id__in=order_ids, status=OrderInfo.ORDER_STATUS_ENUM['UNPAID']
+        ).values_list('order_id', flat=True))
+
+        if not cancel_ids:
+            return 0
+
+        # 2.修改订单状态为已取消
+        OrderInfo.objects.filter(order_id__in=cancel_ids).update(status=OrderInfo.ORDER_STATUS_ENUM['CANCELED'])
+
+        # 3.按商品汇总订单中的数量,一条UPDATE语句归还库存和销量
+        counts = dict(OrderGoods.objects.filter(order_id__in=cancel_ids).values('sku_id').annotate(
+            total=Sum('count')).values_list('sku_id', 'total'))
+        restore_stock(counts)
+
+        # 事务提交之后清除商品的库存缓存
+        transaction.on_commit(lambda: clear_sku_stock(*counts.keys()))
+
+    return len(cancel_ids)
+
+
+def cancel_expired_orders(batch_size=constants.ORDER_CANCEL_BATCH_SIZE):
+    """分批取消超过支付期限的订单,返回取消的订单数量"""
+    redis_conn = get_redis_connection('orders')
+
+    canceled = 0
+    while True:
+        order_ids = [order_id.decode() for order_id in
+                     redis_conn.zrangebyscore(DEADLINES_KEY, 0, time.time(), start=0, num=batch_size)]
+        if not order_ids:
+            break
+
+        canceled += cancel_orders(order_ids)
+
+        # 事务提交之后再从zset中删除,任务中途退出时下一次执行会重新处理
+        redis_conn.zrem(DEADLINES_KEY, *order_ids)
+
+    metrics = get_deadline_metrics()
+    logger.info('自动取消未支付订单: canceled=%d backlog=%d overdue=%d lag=%.3fs' % (
+        canceled, metrics['backlog'], metrics['overdue'], metrics['lag']))
+
+    return canceled
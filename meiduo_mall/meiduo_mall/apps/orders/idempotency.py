@@ -0,0 +1,90 @@
+# 下单接口的幂等键(请求头Idempotency-Key)
+# 第一个请求在redis中记录处理中状态(SET NX),处理成功之后保存应答;
+# 相同幂等键的重复请求等待第一个请求处理完成之后返回相同的应答,不会重复下单和减少库存;
+# 第一个请求失败时删除记录,客户端可以使用相同的幂等键重试
+# 记录保存在redis order_idempotency_<user_id>_<key> 中: {'token'/'fingerprint'/'status'/'data'}
+import hashlib
+import json
+import re
+import time
+import uuid
+
+from django_redis import get_redis_connection
+from rest_framework import status
+from rest_framework.response import Response
+
+from orders import constants
+
+IDEMPOTENCY_KEY_PATTERN = re.compile(r'^[A-Za-z0-9_\-]{1,64}$')
+
+# 只删除自己创建的处理中记录
+RELEASE_SCRIPT = """
+local value = redis.call('get', KEYS[1])
+if value and cjson.decode(value)['token'] == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def _idempotency_key(user_id, key):
+    return 'order_idempotency_%s_%s' % (user_id, key)
+
+
+def get_request_fingerprint(request):
+    """请求体的摘要,同一个幂等键不能用于不同的请求"""
+    return hashlib.sha1(json.dumps(request.data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def idempotent_response(user_id, key, fingerprint, handler):
+    """
+    按照幂等键执行handler(返回Response)
+    1.记录处理中状态成功时执行handler,成功(2xx)的应答保存在redis中,失败时删除记录
+    2.已有处理完成的记录时直接返回保存的应答
+    3.已有处理中的记录时等待处理完成,超时返回409
+    """
+    redis_conn = get_redis_connection('orders')
+    redis_key = _idempotency_key(user_id, key)
+    token = uuid.uuid4().hex
+
+    deadline = time.time() + constants.ORDER_IDEMPOTENCY_WAIT
+    while True:
+        pending = json.dumps({'token': token, 'fingerprint': fingerprint})
+        if redis_conn.set(redis_key, pending, ex=constants.ORDER_IDEMPOTENCY_LOCK_EXPIRES, nx=True):
+            break
+
+        value = redis_conn.get(redis_key)
+        if value is None:
+            # 第一个请求刚刚失败并删除了记录,重新尝试(记录反复被创建和删除时同样在等待时间之后返回409)
+            if time.time() >= deadline:
+                return Response({'message': '订单正在处理中,请稍后重试'}, status=status.HTTP_409_CONFLICT)
+            continue
+
+        record = json.loads(value.decode())
+        if record['fingerprint'] != fingerprint:
+            return Response({'message': 'Idempotency-Key已经用于其他请求'}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+        if 'status' in record:
+            # 返回第一个请求的应答
+            response = Response(record['data'], status=record['status'])
+            response['Idempotent-Replayed'] = 'true'
+            return response
+
+        if time.time() >= deadline:
+            return Response({'message': '订单正在处理中,请稍后重试'}, status=status.HTTP_409_CONFLICT)
+
+        time.sleep(constants.ORDER_IDEMPOTENCY_WAIT_INTERVAL)
+
+    try:
+        response = handler()
+    except Exception:
+        redis_conn.eval(RELEASE_SCRIPT, 1, redis_key, token)
+        raise
+
+    if status.is_success(response.status_code):
+        record = {'token': token, 'fingerprint': fingerprint, 'status': response.status_code, 'data': response.data}
+        redis_conn.setex(redis_key, constants.ORDER_IDEMPOTENCY_EXPIRES, json.dumps(record))
+    else:
+        redis_conn.eval(RELEASE_SCRIPT, 1, redis_key, token)
+
+    return response
@@ -0,0 +1,104 @@
+# 订单id生成(settings.ORDER_ID_GENERATOR)
+# 默认的订单id共24位: 年月日时分秒(14位) + 毫秒(3位) + 节点编号(2位) + 进程编号(2位) + 毫秒内序号(3位)
+# 节点编号来自settings.ORDER_ID_NODE或环境变量MEIDUO_ORDER_ID_NODE,
+# 进程编号在进程第一次生成订单id时通过文件锁从本机的编号中申请(同一节点上的多个gunicorn worker使用不同的编号),
+# 同一进程中生成的订单id单调递增,不需要访问数据库
+import fcntl
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from orders import constants
+
+
+class TimestampUserOrderIdGenerator(object):
+    """原来的订单id: 年月日时分秒+用户id(同一用户在同一秒内下单会重复)"""
+    def generate(self, user):
+        return datetime.now().strftime('%Y%m%d%H%M%S') + '%010d' % user.id
+
+
+class SnowflakeOrderIdGenerator(object):
+    """毫秒时间戳 + 节点编号 + 进程编号 + 序号的订单id"""
+    def __init__(self, node=None, lock_dir=None):
+        if node is None:
+            node = getattr(settings, 'ORDER_ID_NODE', None)
+        if node is None:
+            node = os.environ.get('MEIDUO_ORDER_ID_NODE', 0)
+
+        self.node = int(node)
+        if not 0 <= self.node < 100:
+            raise ValueError('订单id节点编号必须在0-99之间')
+
+        self.lock_dir = lock_dir or getattr(settings, 'ORDER_ID_LOCK_DIR', None) or tempfile.gettempdir()
+
+        self._lock = threading.Lock()
+        self._pid = None
+        self._lock_file = None
+        self._process = None
+        self._last_ms = 0
+        self._sequence = 0
+
+    def _claim_process(self):
+        """通过文件锁申请本节点上未被其他进程使用的进程编号,进程退出后文件锁自动释放"""
+        for process in range(constants.ORDER_ID_PROCESS_LIMIT):
+            path = os.path.join(self.lock_dir, 'meiduo_order_id_%02d_%02d.lock' % (self.node, process))
+            lock_file = open(path, 'a')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                continue
+
+            self._lock_file = lock_file
+            self._process = process
+            return
+
+        raise RuntimeError('没有可用的订单id进程编号')
+
+    def _next(self):
+        """返回(毫秒时间戳, 序号),时钟回拨或同一毫秒内序号用完时沿用/推进上一次的时间戳,保证单调递增"""
+        now_ms = int(time.time() * 1000)
+
+        if now_ms > self._last_ms:
+            self._last_ms = now_ms
+            self._sequence = 0
+        else:
+            self._sequence += 1
+            if self._sequence >= constants.ORDER_ID_SEQUENCE_LIMIT:
+                self._last_ms += 1
+                self._sequence = 0
+
+        return self._last_ms, self._sequence
+
+    def generate(self, user):
+        with self._lock:
+            # fork出的子进程(gunicorn worker)需要重新申请进程编号
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._claim_process()
+                self._last_ms = 0
+                self._sequence = 0
+
+            ms, sequence = self._next()
+
+        return '%s%03d%02d%02d%03d' % (
+            datetime.fromtimestamp(ms // 1000).strftime('%Y%m%d%H%M%S'), ms % 1000, self.node, self._process, sequence)
+
+
+# 当前使用的订单id生成器
+_generator = None
+
+
+def generate_order_id(user):
+    """使用settings.ORDER_ID_GENERATOR指定的生成器生成订单id"""
+    global _generator
+
+    if _generator is None:
+        _generator = import_string(getattr(settings, 'ORDER_ID_GENERATOR', 'orders.ids.SnowflakeOrderIdGenerator'))()
+
+    return _generator.generate(user)
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders import constants
+from orders.archive import archive_orders, get_archive_cutoff, get_archive_days
+
+
+class Command(BaseCommand):
+    """
+    把已完成或已取消并且超过归档期限的订单移动到归档表
+    分批在独立的事务中处理,可以随时中断,重新执行时从剩下的订单继续
+    """
+    help = '归档已完成或已取消的历史订单'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='归档下单时间在多少天之前的订单,默认settings.ORDER_ARCHIVE_DAYS')
+        parser.add_argument('--batch-size', type=int, default=constants.ORDER_ARCHIVE_BATCH_SIZE,
+                            help='每批处理的订单数量')
+        parser.add_argument('--sleep', type=float, default=0, help='每批之间暂停的秒数,减轻对数据库的压力')
+        parser.add_argument('--dry-run', action='store_true', help='只统计需要归档的订单,不归档')
+
+    def handle(self, *args, **options):
+        days = get_archive_days() if options['days'] is None else options['days']
+        cutoff = get_archive_cutoff(days)
+        self.stdout.write('归档%s之前的订单' % cutoff.strftime('%Y-%m-%d %H:%M:%S'))
+
+        orders_count = 0
+        goods_count = 0
+        start = time.time()
+        for orders, goods in archive_orders(cutoff, options['batch_size'], options['dry_run']):
+            orders_count += orders
+            goods_count += goods
+            self.stdout.write('orders=%d goods=%d (%.1fs)' % (orders_count, goods_count, time.time() - start))
+
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write('完成: orders=%d goods=%d' % (orders_count, goods_count))
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.11 on 2026-10-18 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('areas', '0001_initial'),
+        ('orders', '0003_archived_orders'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FreightRule',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('create_time', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('update_time', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('base_freight', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='基础运费')),
+                ('extra_freight', models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='每件商品增加的运费')),
+                ('free_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='包邮金额')),
+                ('is_enabled', models.BooleanField(default=True, verbose_name='是否启用')),
+                ('area', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='areas.Area', verbose_name='地区(为空时是默认规则)')),
+            ],
+            options={
+                'verbose_name_plural': '运费规则',
+                'verbose_name': '运费规则',
+                'db_table': 'tb_freight_rule',
+            },
+        ),
+    ]
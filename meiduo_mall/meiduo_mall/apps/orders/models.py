@@ -2,6 +2,7 @@ from django.db import models
 from meiduo_mall.utils.models import BaseModel
 from users.models import User, Address
 from goods.models import SKU
+from areas.models import Area
 
 # Create your models here.
 
@@ -25,7 +26,8 @@ class OrderInfo(BaseModel):
         "UNSEND": 2,
         "UNRECEIVED": 3,
         "UNCOMMENT": 4,
-        "FINISHED": 5
+        "FINISHED": 5,
+        "CANCELED": 6
     }
 
     ORDER_STATUS_CHOICES = (
@@ -50,6 +52,10 @@ class OrderInfo(BaseModel):
         db_table = "tb_order_info"
         verbose_name = '订单基本信息'
         verbose_name_plural = verbose_name
+        indexes = [
+            # 用户订单列表按照下单时间分页查询
+            models.Index(fields=['user', 'create_time'], name='tb_order_info_user_ctime_idx'),
+        ]
 
 
 class OrderGoods(BaseModel):
@@ -76,4 +82,72 @@ class OrderGoods(BaseModel):
     class Meta:
         db_table = "tb_order_goods"
         verbose_name = '订单商品'
-        verbose_name_plural = verbose_name
\ No newline at end of file
+        verbose_name_plural = verbose_name
+
+
+class ArchivedOrderInfo(models.Model):
+    """
+    归档的订单信息(已完成或已取消,超过归档期限的订单),字段同OrderInfo
+    创建/更新时间保存归档前的值,关联字段不使用数据库外键约束
+    """
+    create_time = models.DateTimeField(verbose_name="创建时间")
+    update_time = models.DateTimeField(verbose_name="更新时间")
+    order_id = models.CharField(max_length=64, primary_key=True, verbose_name="订单号")
+    user = models.ForeignKey(User, related_name='+', on_delete=models.DO_NOTHING, db_constraint=False, verbose_name="下单用户")
+    address = models.ForeignKey(Address, related_name='+', on_delete=models.DO_NOTHING, db_constraint=False, verbose_name="收获地址")
+    total_count = models.IntegerField(default=1, verbose_name="商品总数")
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="商品总金额")
+    freight = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="运费")
+    pay_method = models.SmallIntegerField(choices=OrderInfo.PAY_METHOD_CHOICES, default=1, verbose_name="支付方式")
+    status = models.SmallIntegerField(choices=OrderInfo.ORDER_STATUS_CHOICES, default=1, verbose_name="订单状态")
+
+    class Meta:
+        db_table = "tb_order_info_archive"
+        verbose_name = '归档订单基本信息'
+        verbose_name_plural = verbose_name
+        indexes = [
+            models.Index(fields=['user', 'create_time'], name='tb_order_arch_user_ctime_idx'),
+        ]
+
+
+class ArchivedOrderGoods(models.Model):
+    """
+    归档的订单商品,字段同OrderGoods
+    """
+    create_time = models.DateTimeField(verbose_name="创建时间")
+    update_time = models.DateTimeField(verbose_name="更新时间")
+    order = models.ForeignKey(ArchivedOrderInfo, related_name='skus', on_delete=models.CASCADE, verbose_name="订单")
+    sku = models.ForeignKey(SKU, related_name='+', on_delete=models.DO_NOTHING, db_constraint=False, verbose_name="订单商品")
+    count = models.IntegerField(default=1, verbose_name="数量")
+    price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="单价")
+    comment = models.TextField(default="", verbose_name="评价信息")
+    score = models.SmallIntegerField(choices=OrderGoods.SCORE_CHOICES, default=5, verbose_name='满意度评分')
+    is_anonymous = models.BooleanField(default=False, verbose_name='是否匿名评价')
+    is_commented = models.BooleanField(default=False, verbose_name='是否评价了')
+
+    class Meta:
+        db_table = "tb_order_goods_archive"
+        verbose_name = '归档订单商品'
+        verbose_name_plural = verbose_name
+
+
+class FreightRule(BaseModel):
+    """
+    运费规则
+    按照收货地址的 区县 -> 市 -> 省 -> 默认规则(area为空) 的顺序匹配
+    运费 = 基础运费 + (商品总数 - 1) * 每件商品增加的运费, 商品总金额达到包邮金额时免运费
+    """
+    area = models.OneToOneField(Area, null=True, blank=True, related_name='+', on_delete=models.CASCADE,
+                                verbose_name='地区(为空时是默认规则)')
+    base_freight = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='基础运费')
+    extra_freight = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name='每件商品增加的运费')
+    free_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, verbose_name='包邮金额')
+    is_enabled = models.BooleanField(default=True, verbose_name='是否启用')
+
+    class Meta:
+        db_table = "tb_freight_rule"
+        verbose_name = '运费规则'
+        verbose_name_plural = verbose_name
+
+    def __str__(self):
+        return '%s: %s' % (self.area.name if self.area else '默认', self.base_freight)
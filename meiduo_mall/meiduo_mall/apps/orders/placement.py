@@ -0,0 +1,175 @@
+# 订单创建
+# 一次查询获取所有商品,一条带条件的UPDATE语句(stock >= count)减少所有商品的库存并增加销量,
+# 一次批量插入订单商品,订单基本信息在计算好总数量和总金额之后一次插入
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Case, When, F, Q, IntegerField
+from rest_framework import serializers
+
+from goods.models import SKU
+from goods.stock import clear_sku_stock
+from orders.deadlines import add_pay_deadline
+from orders.ids import generate_order_id
+from orders.models import OrderInfo, OrderGoods
+from orders.pricing import calculate_freight
+from orders.reservation import stock_reservation_enabled, reserve_stock, release_stock, confirm_stock
+
+
+def deduct_stock(cart_dict):
+    """
+    使用一条UPDATE语句减少商品库存,增加销量
+    库存的判断和修改在同一条语句中完成(stock >= count),不需要乐观锁重试
+    cart_dict: {<sku_id>: <count>, ...}
+    返回库存足够并修改成功的商品数量
+    """
+    if not cart_dict:
+        return 0
+
+    condition = reduce(or_, [Q(id=sku_id, stock__gte=count) for sku_id, count in cart_dict.items()])
+
+    return SKU.objects.filter(condition).update(
+        stock=Case(
+            *[When(id=sku_id, then=F('stock') - count) for sku_id, count in cart_dict.items()],
+            default=F('stock'), output_field=IntegerField()
+        ),
+        sales=Case(
+            *[When(id=sku_id, then=F('sales') + count) for sku_id, count in cart_dict.items()],
+            default=F('sales'), output_field=IntegerField()
+        )
+    )
+
+
+def restore_stock(cart_dict):
+    """
+    使用一条UPDATE语句归还商品库存,减少销量(取消订单时)
+    cart_dict: {<sku_id>: <count>, ...}
+    """
+    if not cart_dict:
+        return 0
+
+    return SKU.objects.filter(id__in=list(cart_dict.keys())).update(
+        stock=Case(
+            *[When(id=sku_id, then=F('stock') + count) for sku_id, count in cart_dict.items()],
+            default=F('stock'), output_field=IntegerField()
+        ),
+        sales=Case(
+            *[When(id=sku_id, then=F('sales') - count) for sku_id, count in cart_dict.items()],
+            default=F('sales'), output_field=IntegerField()
+        )
+    )
+
+
+def place_order(user, address, pay_method, cart_dict):
+    """
+    创建订单
+    cart_dict: 下单的商品和数量 {<sku_id>: <count>, ...}
+    没有商品、库存不足或下单失败时回滚并抛出serializers.ValidationError
+    返回订单对象
+    """
+    # 没有勾选商品时不创建订单(否则会生成只有运费的空订单)
+    if not cart_dict:
+        raise serializers.ValidationError('购物车中没有勾选的商品')
+
+    # 订单id: 年月日时分秒毫秒+节点编号+进程编号+序号
+    order_id = generate_order_id(user)
+
+    # 支付状态
+    if pay_method == OrderInfo.PAY_METHODS_ENUM['CASH']:  # 货到付款
+        status = OrderInfo.ORDER_STATUS_ENUM['UNSEND']  # 待发货
+    else:  # 在线支付
+        status = OrderInfo.ORDER_STATUS_ENUM['UNPAID']  # 待支付
+
+    # 开启库存预留时,先在redis中预留所有商品的库存,预留成功之后才进入数据库事务
+    reserved = stock_reservation_enabled()
+    if reserved:
+        res = reserve_stock(order_id, cart_dict)
+        if res is None:
+            raise serializers.ValidationError('下单失败')
+        elif not res:
+            raise serializers.ValidationError('商品库存不足')
+
+    try:
+        order = _save_order(order_id, user, address, pay_method, status, cart_dict)
+    except Exception:
+        # 订单保存失败,归还预留的库存
+        if reserved:
+            release_stock(order_id)
+        raise
+
+    if reserved:
+        # 事务提交之后确认库存预留
+        transaction.on_commit(lambda: confirm_stock(order_id))
+
+    if status == OrderInfo.ORDER_STATUS_ENUM['UNPAID']:
+        # 事务提交之后记录订单的支付期限,超时未支付的订单自动取消
+        transaction.on_commit(lambda: add_pay_deadline(order_id))
+
+    return order
+
+
+def _save_order(order_id, user, address, pay_method, status, cart_dict):
+    """在一个事务中减少商品库存并保存订单基本信息和订单商品"""
+    with transaction.atomic():
+
+        # 设置一个事务的保存点
+        sid = transaction.savepoint()
+
+        try:
+            # 1.一次查询获取所有商品
+            skus = SKU.objects.in_bulk(list(cart_dict.keys()))
+            if len(skus) != len(cart_dict):
+                raise SKU.DoesNotExist
+
+            # 商品库存判断
+            for sku_id, count in cart_dict.items():
+                if count > skus[sku_id].stock:
+                    # 回滚事务到sid保存点
+                    transaction.savepoint_rollback(sid)
+                    raise serializers.ValidationError('商品库存不足')
+
+            # 2.减少商品库存,增加销量(其他订单已经抢先减少库存时,修改的条数小于商品数量)
+            if deduct_stock(cart_dict) != len(cart_dict):
+                transaction.savepoint_rollback(sid)
+                raise serializers.ValidationError('商品库存不足')
+
+            # 事务提交之后清除商品的库存缓存(修改之后的库存由下一次读取时从数据库加载)
+            transaction.on_commit(lambda: clear_sku_stock(*cart_dict.keys()))
+
+            # 3.计算订单商品的总数量和实付款,向订单基本信息表中添加一条记录
+            total_count = sum(cart_dict.values())
+            total_amount = sum((skus[sku_id].price * count for sku_id, count in cart_dict.items()), Decimal(0))
+
+            # 运费(和结算页面使用相同的运费规则)
+            freight = calculate_freight(address, total_count, total_amount)
+
+            order = OrderInfo.objects.create(
+                order_id=order_id,
+                user=user,
+                address=address,
+                total_count=total_count,
+                total_amount=total_amount + freight,
+                freight=freight,
+                pay_method=pay_method,
+                status=status
+            )
+
+            # 4.批量向订单商品表添加记录
+            OrderGoods.objects.bulk_create([
+                OrderGoods(order=order, sku=skus[sku_id], count=count, price=skus[sku_id].price)
+                for sku_id, count in cart_dict.items()
+            ])
+
+        except serializers.ValidationError:
+            # 继续向外抛出捕获的异常
+            raise
+
+        except Exception:
+            # 回滚事务到sid保存点
+            transaction.savepoint_rollback(sid)
+
+            raise serializers.ValidationError('下单失败')
+
+    return order
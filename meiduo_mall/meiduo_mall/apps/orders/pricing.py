@@ -0,0 +1,139 @@
+# 订单结算和运费计算
+# 运费规则(FreightRule)预先加载为内存中的查询表 {<area_id>/None: (基础运费, 每件增加的运费, 包邮金额)},
+# 规则修改时(orders.signals)增加redis中的版本号,各进程定期检查版本号并重新加载;
+# 结算结果按照(购物车勾选商品摘要, 收货地址, 规则版本号)缓存在redis中,结算页面和下单使用相同的运费计算
+import hashlib
+import json
+import threading
+import time
+from decimal import Decimal
+
+from django_redis import get_redis_connection
+
+from goods.cards import get_sku_card_list
+from orders import constants
+from orders.models import FreightRule
+
+RULES_VERSION_KEY = 'freight_rules_version'
+
+
+class FreightRuleTable(object):
+    """内存中的运费规则查询表"""
+    def __init__(self):
+        self.version = None
+        self.rules = {}
+        self._checked = 0
+        self._lock = threading.Lock()
+
+    def _get_version(self):
+        redis_conn = get_redis_connection('orders')
+        version = redis_conn.get(RULES_VERSION_KEY)
+        return version.decode() if version is not None else '0'
+
+    def load(self):
+        """从数据库加载所有启用的规则"""
+        rules = {}
+        for rule in FreightRule.objects.filter(is_enabled=True).order_by('-id'):
+            rules[rule.area_id] = (rule.base_freight, rule.extra_freight, rule.free_amount)
+        return rules
+
+    def refresh(self):
+        """超过检查间隔时检查规则版本号,版本号变化时重新加载规则"""
+        now = time.time()
+        if now - self._checked < constants.FREIGHT_RULES_CHECK_INTERVAL:
+            return
+
+        with self._lock:
+            if now - self._checked < constants.FREIGHT_RULES_CHECK_INTERVAL:
+                return
+
+            version = self._get_version()
+            if version != self.version:
+                self.rules = self.load()
+                self.version = version
+            self._checked = now
+
+    def lookup(self, address):
+        """
+        按照 区县 -> 市 -> 省 -> 默认规则 的顺序查找规则,没有规则时返回None
+        address为None(没有收货地址)时使用默认规则
+        """
+        self.refresh()
+
+        rules = self.rules
+        area_ids = (address.district_id, address.city_id, address.province_id) if address is not None else ()
+        for area_id in area_ids + (None,):
+            if area_id in rules:
+                return rules[area_id]
+
+        return None
+
+
+freight_rules = FreightRuleTable()
+
+
+def bump_freight_rules_version():
+    """运费规则修改之后增加版本号,各进程重新加载规则"""
+    redis_conn = get_redis_connection('orders')
+    redis_conn.incr(RULES_VERSION_KEY)
+
+
+def calculate_freight(address, total_count, total_amount):
+    """根据收货地址、商品总数和商品总金额计算运费(没有收货地址时使用默认规则)"""
+    rule = freight_rules.lookup(address)
+    if rule is None:
+        return Decimal(constants.DEFAULT_FREIGHT)
+
+    base_freight, extra_freight, free_amount = rule
+    if free_amount is not None and total_amount >= free_amount:
+        return Decimal('0.00')
+
+    return base_freight + extra_freight * max(total_count - 1, 0)
+
+
+def _settlement_key(user_id, cart_dict, address):
+    """结算结果的缓存key: 勾选商品和数量的摘要 + 收货地址 + 运费规则版本号"""
+    items = ','.join('%s:%s' % (sku_id, cart_dict[sku_id]) for sku_id in sorted(cart_dict))
+    digest = hashlib.sha1(items.encode()).hexdigest()
+    freight_rules.refresh()
+    return 'settlement_%s_%s_%s_%s' % (user_id, digest, address.id if address else 0, freight_rules.version)
+
+
+def get_settlement(user, cart_dict, address=None):
+    """
+    获取结算结果(缓存SETTLEMENT_CACHE_EXPIRES秒)
+    cart_dict: 勾选的商品和数量 {<sku_id>: <count>, ...}
+    返回: {
+        'skus': [{'id', 'name', 'price', 'default_image_url', 'count'}, ...],
+        'total_count': <商品总数>, 'total_amount': <商品总金额>, 'freight': <运费>
+    }
+    """
+    redis_conn = get_redis_connection('orders')
+    key = _settlement_key(user.id, cart_dict, address)
+
+    data = redis_conn.get(key)
+    if data is not None:
+        settlement = json.loads(data.decode())
+    else:
+        # 根据商品id获取对应的商品数据(SKU卡片缓存)
+        skus = get_sku_card_list(sorted(cart_dict))
+
+        total_count = 0
+        total_amount = Decimal(0)
+        for sku in skus:
+            # 给sku增加count,保存该商品所要结算的数量
+            sku['count'] = cart_dict[sku['id']]
+            total_count += sku['count']
+            total_amount += Decimal(sku['price']) * sku['count']
+
+        settlement = {
+            'skus': skus,
+            'total_count': total_count,
+            'total_amount': str(total_amount),
+            'freight': str(calculate_freight(address, total_count, total_amount)),
+        }
+        redis_conn.setex(key, constants.SETTLEMENT_CACHE_EXPIRES, json.dumps(settlement))
+
+    settlement['total_amount'] = Decimal(settlement['total_amount'])
+    settlement['freight'] = Decimal(settlement['freight'])
+    return settlement
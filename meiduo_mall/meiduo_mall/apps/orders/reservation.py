@@ -0,0 +1,187 @@
+# redis库存预留(settings.ORDER_STOCK_RESERVATION)
+# 抢购时大量下单请求集中修改同一行SKU记录,先在redis中用一个lua脚本原子地预留订单中所有商品的库存,
+# 只有预留成功的订单才进入数据库事务
+#   sku_available_<sku_id>: 可以预留的库存, sku_reserved_<sku_id>: 已经预留但还没有确认的数量
+#   stock_reservations: zset, 订单id -> 预留的过期时间
+#   stock_reservation_<order_id>: hash, sku_id -> 预留的数量
+# 订单事务提交之后确认预留,事务失败时归还库存,对账任务(orders.crons)释放过期的预留并用数据库中的库存校正可用库存
+# 注意: 脚本中会拼接商品的key,inventory别名必须是单个redis实例
+import time
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+from goods.models import SKU
+from orders import constants
+
+RESERVATIONS_KEY = 'stock_reservations'
+
+SCRIPTS = {
+    # 预留库存: ARGV[1] 订单id, ARGV[2] 过期时间, ARGV[3:] sku_id, count 成对
+    # 返回: {1} 成功, {0, sku_id} 库存不足, {-1, sku_id...} 可用库存还没有加载, {-2} 订单已经预留过
+    'reserve': """
+if redis.call('exists', KEYS[2]) == 1 then
+    return {-2}
+end
+
+local missing = {}
+for i = 3, #ARGV, 2 do
+    local available = redis.call('get', 'sku_available_' .. ARGV[i])
+    if not available then
+        table.insert(missing, ARGV[i])
+    elseif tonumber(available) < tonumber(ARGV[i + 1]) then
+        return {0, ARGV[i]}
+    end
+end
+
+if #missing > 0 then
+    table.insert(missing, 1, -1)
+    return missing
+end
+
+for i = 3, #ARGV, 2 do
+    redis.call('decrby', 'sku_available_' .. ARGV[i], ARGV[i + 1])
+    redis.call('incrby', 'sku_reserved_' .. ARGV[i], ARGV[i + 1])
+    redis.call('hset', KEYS[2], ARGV[i], ARGV[i + 1])
+end
+redis.call('zadd', KEYS[1], ARGV[2], ARGV[1])
+return {1}
+""",
+
+    # 结束预留: ARGV[1] 订单id, ARGV[2] '1' 归还库存(订单失败) / '0' 订单已提交
+    # 返回预留的商品数量,预留不存在时返回0
+    'release': """
+local items = redis.call('hgetall', KEYS[2])
+for i = 1, #items, 2 do
+    local available = 'sku_available_' .. items[i]
+    if ARGV[2] == '1' and redis.call('exists', available) == 1 then
+        redis.call('incrby', available, items[i + 1])
+    end
+    redis.call('decrby', 'sku_reserved_' .. items[i], items[i + 1])
+end
+
+redis.call('del', KEYS[2])
+redis.call('zrem', KEYS[1], ARGV[1])
+return #items / 2
+""",
+
+    # 用数据库中的库存设置可用库存(减去已经预留的数量)
+    # ARGV[1] '1' 覆盖已有的可用库存 / '0' 只设置还没有加载的商品, ARGV[2:] sku_id, stock 成对
+    'sync': """
+for i = 2, #ARGV, 2 do
+    local available = 'sku_available_' .. ARGV[i]
+    if ARGV[1] == '1' or redis.call('exists', available) == 0 then
+        local reserved = tonumber(redis.call('get', 'sku_reserved_' .. ARGV[i]) or 0)
+        redis.call('set', available, tonumber(ARGV[i + 1]) - reserved)
+    end
+end
+return 1
+""",
+}
+
+# 已注册的脚本对象: {<name>: Script}
+_scripts = {}
+
+
+def stock_reservation_enabled():
+    """是否开启了库存预留"""
+    return getattr(settings, 'ORDER_STOCK_RESERVATION', False)
+
+
+def _get_redis():
+    return get_redis_connection('inventory')
+
+
+def _call(name, keys, args):
+    """执行指定的lua脚本"""
+    redis_conn = _get_redis()
+
+    script = _scripts.get(name)
+    if script is None:
+        script = redis_conn.register_script(SCRIPTS[name])
+        _scripts[name] = script
+
+    return script(keys=keys, args=args, client=redis_conn)
+
+
+def _reservation_key(order_id):
+    return 'stock_reservation_%s' % order_id
+
+
+def sync_stock(stocks, force=True):
+    """
+    用数据库中的库存设置可用库存
+    stocks: {<sku_id>: <数据库中的库存>, ...}
+    force: False时只设置还没有加载的商品
+    """
+    if not stocks:
+        return
+
+    args = [int(force)]
+    for sku_id, stock in stocks.items():
+        args.extend([sku_id, stock])
+
+    _call('sync', [], args)
+
+
+def reserve_stock(order_id, cart_dict):
+    """
+    原子地预留订单中所有商品的库存
+    cart_dict: {<sku_id>: <count>, ...}
+    返回: True 预留成功, False 库存不足, None 订单已经预留过
+    """
+    if not cart_dict:
+        return True
+
+    args = [order_id, int(time.time()) + constants.STOCK_RESERVATION_EXPIRES]
+    for sku_id, count in cart_dict.items():
+        args.extend([sku_id, count])
+
+    keys = [RESERVATIONS_KEY, _reservation_key(order_id)]
+    res = _call('reserve', keys, args)
+
+    if res[0] == -1:
+        # 第一次预留的商品,从数据库加载库存(已经删除的商品库存为0)之后重新预留
+        missing = [int(sku_id) for sku_id in res[1:]]
+        stocks = dict.fromkeys(missing, 0)
+        stocks.update(SKU.objects.filter(id__in=missing).values_list('id', 'stock'))
+        sync_stock(stocks, force=False)
+
+        res = _call('reserve', keys, args)
+
+    if res[0] == -2:
+        return None
+
+    return res[0] == 1
+
+
+def release_stock(order_id, restore=True):
+    """
+    结束订单的库存预留
+    restore: True 订单失败,归还预留的库存; False 订单已经提交,只删除预留记录
+    """
+    return _call('release', [RESERVATIONS_KEY, _reservation_key(order_id)], [order_id, int(restore)])
+
+
+def confirm_stock(order_id):
+    """订单事务提交之后确认库存预留"""
+    return release_stock(order_id, restore=False)
+
+
+def get_expired_reservations(limit=constants.STOCK_RECONCILE_BATCH_SIZE):
+    """获取已经过期的库存预留的订单id"""
+    order_ids = _get_redis().zrangebyscore(RESERVATIONS_KEY, 0, int(time.time()), start=0, num=limit)
+    return [order_id.decode() for order_id in order_ids]
+
+
+def get_reserved_sku_ids():
+    """分批获取已经加载了可用库存的商品id"""
+    sku_ids = []
+    for key in _get_redis().scan_iter(match='sku_available_*', count=constants.STOCK_RECONCILE_BATCH_SIZE):
+        sku_ids.append(int(key.decode()[len('sku_available_'):]))
+        if len(sku_ids) >= constants.STOCK_RECONCILE_BATCH_SIZE:
+            yield sku_ids
+            sku_ids = []
+
+    if sku_ids:
+        yield sku_ids
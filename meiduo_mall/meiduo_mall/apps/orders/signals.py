@@ -0,0 +1,12 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from orders.models import FreightRule
+from orders.pricing import bump_freight_rules_version
+
+
+@receiver([post_save, post_delete], sender=FreightRule)
+def reload_freight_rules(sender, instance, **kwargs):
+    """运费规则修改或删除之后,增加规则版本号,各进程重新加载运费规则"""
+    transaction.on_commit(bump_freight_rules_version)
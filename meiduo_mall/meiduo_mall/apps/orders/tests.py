@@ -1,3 +1,294 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from django_redis import get_redis_connection
+from rest_framework import serializers
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from areas.models import Area
+from celery_tasks.orders.tasks import place_order_task
+from goods.models import GoodsCategory, Brand, Goods, SKU
+from orders import constants
+from orders.archive import ARCHIVED_CUTOFF_KEY, archive_orders, get_archive_cutoff, get_order
+from orders.deadlines import DEADLINES_KEY, add_pay_deadline, cancel_expired_orders
+from orders.ids import SnowflakeOrderIdGenerator
+from orders.models import OrderInfo, OrderGoods, ArchivedOrderInfo, FreightRule
+from orders.placement import place_order
+from orders.pricing import calculate_freight, freight_rules
+from orders.tickets import TICKET_FAILED, create_ticket, finish_ticket, get_ticket, reserve_submission, \
+    claim_submission
+from orders.views import OrderPagination
+from users.models import User, Address
+
+
+class PlaceOrderTest(SimpleTestCase):
+    """创建订单"""
+    def test_empty_cart(self):
+        """没有勾选商品时在访问数据库之前抛出ValidationError,不创建订单"""
+        with self.assertRaises(serializers.ValidationError) as cm:
+            place_order(None, None, OrderInfo.PAY_METHODS_ENUM['CASH'], {})
+
+        self.assertEqual(cm.exception.detail, ['购物车中没有勾选的商品'])
+
+
+def create_sku(stock, sales):
+    """创建测试商品类别、商品和SKU"""
+    category1 = GoodsCategory.objects.create(name='一级')
+    category2 = GoodsCategory.objects.create(name='二级', parent=category1)
+    category3 = GoodsCategory.objects.create(name='三级', parent=category2)
+    brand = Brand.objects.create(name='品牌', logo='brand.jpg', first_letter='P')
+    goods = Goods.objects.create(name='商品', brand=brand, category1=category1, category2=category2,
+                                 category3=category3)
+    return SKU.objects.create(name='SKU', caption='', goods=goods, category=category3, price=Decimal('100.00'),
+                              cost_price=Decimal('80.00'), market_price=Decimal('120.00'), stock=stock,
+                              sales=sales, default_image_url='sku.jpg')
+
+
+def create_address(username):
+    """创建测试用户和收货地址"""
+    province = Area.objects.create(name='测试省')
+    city = Area.objects.create(name='测试市', parent=province)
+    district = Area.objects.create(name='测试区', parent=city)
+
+    user = User.objects.create(username=username, mobile='13800000000')
+    return Address.objects.create(user=user, title='测试地址', receiver='测试', province=province, city=city,
+                                  district=district, place='测试路1号', mobile='13800000000')
+
+
+def create_order(order_id, address, sku, count, status=OrderInfo.ORDER_STATUS_ENUM['UNPAID']):
+    """创建一个商品的订单"""
+    order = OrderInfo.objects.create(order_id=order_id, user=address.user, address=address, total_count=count,
+                                     total_amount=sku.price * count, freight=Decimal('10.00'),
+                                     pay_method=OrderInfo.PAY_METHODS_ENUM['ALIPAY'], status=status)
+    OrderGoods.objects.create(order=order, sku=sku, count=count, price=sku.price)
+    return order
+
+
+class CancelExpiredOrdersTest(TestCase):
+    """自动取消超过支付期限的订单"""
+    def setUp(self):
+        self.redis_conn = get_redis_connection('orders')
+        self.redis_conn.delete(DEADLINES_KEY)
+        self.sku = create_sku(stock=8, sales=2)
+        self.address = create_address('deadline')
+
+    def tearDown(self):
+        self.redis_conn.delete(DEADLINES_KEY)
+
+    def test_cancel_expired_order(self):
+        """超过期限的未支付订单被取消并归还库存和销量,期限从zset中删除"""
+        create_order('20180101000000000000001', self.address, self.sku, 2)
+        add_pay_deadline('20180101000000000000001', expires=-1)
+
+        self.assertEqual(cancel_expired_orders(), 1)
+
+        self.assertEqual(OrderInfo.objects.get(order_id='20180101000000000000001').status,
+                         OrderInfo.ORDER_STATUS_ENUM['CANCELED'])
+        self.sku.refresh_from_db()
+        self.assertEqual((self.sku.stock, self.sku.sales), (10, 0))
+        self.assertEqual(self.redis_conn.zcard(DEADLINES_KEY), 0)
+
+    def test_keep_pending_and_paid_orders(self):
+        """没有超过期限的订单保留在zset中,已经支付的订单不被取消"""
+        create_order('20180101000000000000002', self.address, self.sku, 1)
+        add_pay_deadline('20180101000000000000002')
+        create_order('20180101000000000000003', self.address, self.sku, 1,
+                     status=OrderInfo.ORDER_STATUS_ENUM['UNSEND'])
+        add_pay_deadline('20180101000000000000003', expires=-1)
+
+        self.assertEqual(cancel_expired_orders(), 0)
+
+        self.assertEqual(self.redis_conn.zrange(DEADLINES_KEY, 0, -1), [b'20180101000000000000002'])
+        self.sku.refresh_from_db()
+        self.assertEqual((self.sku.stock, self.sku.sales), (8, 2))
+
+
+class ArchiveOrdersTest(TestCase):
+    """使用比ORDER_ARCHIVE_DAYS更短的期限归档的订单"""
+    def setUp(self):
+        self.redis_conn = get_redis_connection('orders')
+        self.redis_conn.delete(ARCHIVED_CUTOFF_KEY)
+        self.sku = create_sku(stock=10, sales=0)
+        self.address = create_address('archive')
+
+        # 两个未支付的订单(不归档)之后下单的一个已完成订单,按照期限0天归档
+        order_time = timezone.localtime() - timedelta(seconds=2)
+        self.order_ids = ['%s%010d' % (order_time.strftime('%Y%m%d%H%M%S'), i) for i in range(3)]
+        create_order(self.order_ids[0], self.address, self.sku, 1)
+        create_order(self.order_ids[1], self.address, self.sku, 1)
+        create_order(self.order_ids[2], self.address, self.sku, 1, status=OrderInfo.ORDER_STATUS_ENUM['FINISHED'])
+
+        self.assertEqual(list(archive_orders(get_archive_cutoff(0), 100)), [(1, 1)])
+
+    def tearDown(self):
+        self.redis_conn.delete(ARCHIVED_CUTOFF_KEY)
+
+    def test_get_order(self):
+        """订单id的时间晚于ORDER_ARCHIVE_DAYS的归档订单在热表中查询不到时查询归档表"""
+        self.assertIsInstance(get_order(self.order_ids[2]), ArchivedOrderInfo)
+        self.assertIsInstance(get_order(self.order_ids[0]), OrderInfo)
+        self.assertIsNone(get_order(self.order_ids[2], user_id=0))
+
+    def test_list_orders(self):
+        """分页遍历订单列表时合并晚于ORDER_ARCHIVE_DAYS的归档订单"""
+        client = APIClient()
+        client.force_authenticate(self.address.user)
+
+        order_ids = []
+        url = '/orders/?page_size=1'
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            order_ids.extend(order['order_id'] for order in response.data['results'])
+            url = response.data['next']
+
+        self.assertEqual(order_ids, self.order_ids[::-1])
+
+
+class SubmissionTest(SimpleTestCase):
+    """异步下单任务的用户标记"""
+    def setUp(self):
+        self.redis_conn = get_redis_connection('orders')
+        self.redis_conn.delete('order_submission_1', 'order_ticket_a', 'order_ticket_b')
+
+    def tearDown(self):
+        self.redis_conn.delete('order_submission_1', 'order_ticket_a', 'order_ticket_b')
+
+    def test_claim_submission(self):
+        """标记是自己的或者已经过期时可以确认,已经属于新的下单任务时不能确认"""
+        self.assertIsNone(reserve_submission(1, 'a'))
+        self.assertEqual(reserve_submission(1, 'b'), 'a')
+        self.assertTrue(claim_submission(1, 'a'))
+
+        self.redis_conn.delete('order_submission_1')
+        self.assertTrue(claim_submission(1, 'a'))
+
+        self.redis_conn.delete('order_submission_1')
+        self.assertIsNone(reserve_submission(1, 'b'))
+        self.assertFalse(claim_submission(1, 'a'))
+        self.assertEqual(self.redis_conn.get('order_submission_1'), b'b')
+
+    @mock.patch('celery_tasks.orders.tasks.place_order')
+    def test_task_skips_finished_ticket(self, place_order_mock):
+        """凭证已经有下单结果时(任务重复投递)不再下单"""
+        create_ticket(1, 'a')
+        finish_ticket('a', order_id='20180101000000000000001')
+
+        place_order_task(ticket_id='a', user_id=1, address_id=1, pay_method=2, items=[[1, 1]])
+
+        place_order_mock.assert_not_called()
+        self.assertEqual(get_ticket('a')['order_id'], '20180101000000000000001')
+
+    @mock.patch('celery_tasks.orders.tasks.place_order')
+    def test_task_skips_expired_submission(self, place_order_mock):
+        """排队期间标记过期,用户重新提交了下单任务时,排队的任务不再下单"""
+        create_ticket(1, 'a')
+        create_ticket(1, 'b')
+        self.assertIsNone(reserve_submission(1, 'b'))
+
+        place_order_task(ticket_id='a', user_id=1, address_id=1, pay_method=2, items=[[1, 1]])
+
+        place_order_mock.assert_not_called()
+        self.assertEqual(get_ticket('a')['status'], TICKET_FAILED)
+        self.assertEqual(self.redis_conn.get('order_submission_1'), b'b')
+
+
+class CalculateFreightTest(TestCase):
+    """运费计算"""
+    def setUp(self):
+        FreightRule.objects.create(area=None, base_freight=Decimal('8.00'), extra_freight=Decimal('2.00'),
+                                   free_amount=Decimal('99.00'))
+        # 重新加载运费规则
+        freight_rules.version = None
+        freight_rules._checked = 0
+
+    def tearDown(self):
+        freight_rules.version = None
+        freight_rules._checked = 0
+
+    def test_default_rule_without_address(self):
+        """没有收货地址时使用默认规则(包括包邮金额)"""
+        self.assertEqual(calculate_freight(None, 3, Decimal('50.00')), Decimal('12.00'))
+        self.assertEqual(calculate_freight(None, 3, Decimal('99.00')), Decimal('0.00'))
+
+
+class SnowflakeOrderIdGeneratorTest(SimpleTestCase):
+    """订单id生成"""
+    def setUp(self):
+        self.lock_dir = tempfile.mkdtemp()
+        self.generator = SnowflakeOrderIdGenerator(node=7, lock_dir=self.lock_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.lock_dir)
+
+    def test_same_millisecond(self):
+        """同一毫秒内超过序号上限时订单id仍然是24位、唯一并且单调递增"""
+        count = constants.ORDER_ID_SEQUENCE_LIMIT * 2 + 10
+        with mock.patch('orders.ids.time.time', return_value=1514736000.123):
+            order_ids = [self.generator.generate(None) for _ in range(count)]
+
+        self.assertTrue(all(len(order_id) == 24 for order_id in order_ids))
+        self.assertEqual(len(set(order_ids)), count)
+        self.assertEqual(order_ids, sorted(order_ids))
+        self.assertEqual(order_ids[0][17:19], '07')
+
+    def test_clock_backwards(self):
+        """时钟回拨时沿用上一次的时间戳"""
+        with mock.patch('orders.ids.time.time', return_value=1514736000.123):
+            first = self.generator.generate(None)
+        with mock.patch('orders.ids.time.time', return_value=1514735999.5):
+            second = self.generator.generate(None)
+
+        self.assertLess(first, second)
+
+
+class OrderPaginationTest(TestCase):
+    """订单列表的keyset分页"""
+    def setUp(self):
+        self.sku = create_sku(stock=10, sales=0)
+        self.address = create_address('pagination')
+        self.order_ids = ['20180101000000%010d' % i for i in range(8)]
+        for order_id in self.order_ids:
+            create_order(order_id, self.address, self.sku, 1)
+
+        # 大部分订单的下单时间相同,只能按照订单id区分先后
+        self.create_time = timezone.now().replace(microsecond=123456)
+        OrderInfo.objects.filter(order_id__in=self.order_ids[1:7]).update(create_time=self.create_time)
+        OrderInfo.objects.filter(order_id=self.order_ids[0]).update(create_time=self.create_time - timedelta(days=1))
+        OrderInfo.objects.filter(order_id=self.order_ids[7]).update(create_time=self.create_time + timedelta(days=1))
+
+    def test_cursor_round_trip(self):
+        """游标解码之后得到记录的排序字段的值"""
+        paginator = OrderPagination()
+        order = OrderInfo.objects.get(order_id=self.order_ids[3])
+        cursor = paginator.encode_cursor(order)
+
+        request = Request(APIRequestFactory().get('/orders/', {'cursor': cursor}))
+        self.assertEqual(paginator.decode_cursor(request, OrderInfo), [self.create_time, self.order_ids[3]])
+
+        request = Request(APIRequestFactory().get('/orders/', {'cursor': cursor[:-2]}))
+        with self.assertRaises(NotFound):
+            paginator.decode_cursor(request, OrderInfo)
+
+    def test_pages(self):
+        """下单时间相同的订单跨页时不重复、不遗漏"""
+        client = APIClient()
+        client.force_authenticate(self.address.user)
+
+        order_ids = []
+        url = '/orders/?page_size=3'
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 3)
+            order_ids.extend(order['order_id'] for order in response.data['results'])
+            url = response.data['next']
+
+        self.assertEqual(order_ids, self.order_ids[::-1])
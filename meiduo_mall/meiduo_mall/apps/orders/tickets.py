@@ -0,0 +1,146 @@
+# 异步下单凭证(settings.ORDER_ASYNC_PLACEMENT)
+# 下单接口校验参数并保存购物车快照之后,把下单任务放入celery的orders队列,立即返回凭证id,
+# 客户端通过 GET /orders/tickets/<ticket_id>/ 查询下单结果
+# 凭证保存在redis hash order_ticket_<ticket_id> 中: user_id, status(pending/created/failed), order_id, message
+# 每个用户同一时间只有一个正在处理的下单任务: order_submission_<user_id> 保存该任务的凭证id(SET NX),
+# 下单任务结束(购物车中已下单的商品删除)之后释放,重复点击或重试的请求返回正在处理的凭证;
+# 标记在任务排队期间可能过期,任务开始执行时确认仍然持有标记,标记已经属于之后提交的任务时不再下单
+import uuid
+
+from django_redis import get_redis_connection
+
+from orders import constants
+
+TICKET_PENDING = 'pending'
+TICKET_CREATED = 'created'
+TICKET_FAILED = 'failed'
+
+# 只删除自己持有的下单任务标记
+RELEASE_SUBMISSION_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# 下单任务开始执行时确认持有用户的下单任务标记: 标记是自己的或者已经过期时重新设置有效期并返回1,
+# 标记属于其他凭证时返回0
+CLAIM_SUBMISSION_SCRIPT = """
+local current = redis.call('get', KEYS[1])
+if current and current ~= ARGV[1] then
+    return 0
+end
+redis.call('set', KEYS[1], ARGV[1], 'EX', ARGV[2])
+return 1
+"""
+
+
+def _ticket_key(ticket_id):
+    return 'order_ticket_%s' % ticket_id
+
+
+def _submission_key(user_id):
+    return 'order_submission_%s' % user_id
+
+
+def create_ticket(user_id, ticket_id=None):
+    """创建下单凭证,返回凭证id"""
+    ticket_id = ticket_id or uuid.uuid4().hex
+
+    redis_conn = get_redis_connection('orders')
+    pl = redis_conn.pipeline()
+    pl.hmset(_ticket_key(ticket_id), {'user_id': user_id, 'status': TICKET_PENDING})
+    pl.expire(_ticket_key(ticket_id), constants.ORDER_TICKET_EXPIRES)
+    pl.execute()
+
+    return ticket_id
+
+
+def finish_ticket(ticket_id, order_id=None, message=None):
+    """记录下单结果: 有order_id时下单成功,否则下单失败"""
+    if order_id is not None:
+        mapping = {'status': TICKET_CREATED, 'order_id': order_id}
+    else:
+        mapping = {'status': TICKET_FAILED, 'message': message or '下单失败'}
+
+    redis_conn = get_redis_connection('orders')
+    pl = redis_conn.pipeline()
+    pl.hmset(_ticket_key(ticket_id), mapping)
+    pl.expire(_ticket_key(ticket_id), constants.ORDER_TICKET_EXPIRES)
+    pl.execute()
+
+
+def get_ticket(ticket_id):
+    """获取下单凭证,凭证不存在或已过期时返回None"""
+    redis_conn = get_redis_connection('orders')
+    ticket = redis_conn.hgetall(_ticket_key(ticket_id))
+    if not ticket:
+        return None
+
+    return {key.decode(): value.decode() for key, value in ticket.items()}
+
+
+def reserve_submission(user_id, ticket_id):
+    """
+    标记用户正在处理的下单任务
+    标记成功时返回None,用户已有正在处理的下单任务时返回该任务的凭证id
+    """
+    redis_conn = get_redis_connection('orders')
+    key = _submission_key(user_id)
+    for i in range(2):
+        if redis_conn.set(key, ticket_id, ex=constants.ORDER_SUBMISSION_EXPIRES, nx=True):
+            return None
+
+        current = redis_conn.get(key)
+        # 标记恰好过期时重新尝试一次
+        if current is not None:
+            return current.decode()
+
+    return None
+
+
+def claim_submission(user_id, ticket_id):
+    """
+    下单任务开始执行时确认仍然持有用户的下单任务标记(标记在排队期间过期时重新标记)
+    用户在标记过期之后已经提交了新的下单任务时返回False,该任务不再下单
+    """
+    redis_conn = get_redis_connection('orders')
+    return bool(redis_conn.eval(CLAIM_SUBMISSION_SCRIPT, 1, _submission_key(user_id), ticket_id,
+                                constants.ORDER_SUBMISSION_EXPIRES))
+
+
+def release_submission(user_id, ticket_id):
+    """下单任务结束之后删除标记(只删除该凭证的标记)"""
+    redis_conn = get_redis_connection('orders')
+    redis_conn.eval(RELEASE_SUBMISSION_SCRIPT, 1, _submission_key(user_id), ticket_id)
+
+
+def submit_order(user, address, pay_method):
+    """
+    异步下单: 保存购物车中被勾选商品的快照,创建凭证并把下单任务放入orders队列
+    购物车为空时返回None,否则返回凭证id;
+    用户已有正在处理的下单任务时不再读取购物车,直接返回该任务的凭证id,避免同一份购物车快照生成两个订单
+    """
+    from cart.storage import RedisCart
+    from celery_tasks.orders.tasks import place_order_task
+
+    ticket_id = uuid.uuid4().hex
+    current = reserve_submission(user.id, ticket_id)
+    if current is not None:
+        return current
+
+    try:
+        cart_dict = RedisCart(user.id).get_selected()
+        if not cart_dict:
+            release_submission(user.id, ticket_id)
+            return None
+
+        create_ticket(user.id, ticket_id)
+
+        # 任务参数使用json序列化,购物车快照以[[sku_id, count], ...]的形式传递(任务路由到orders队列)
+        place_order_task.delay(ticket_id, user.id, address.id, pay_method, list(cart_dict.items()))
+    except Exception:
+        release_submission(user.id, ticket_id)
+        raise
+
+    return ticket_id
@@ -4,4 +4,7 @@ from orders import views
 urlpatterns = [
     url(r'^orders/settlement/$', views.OrderSettlementView.as_view()),
     url(r'^orders/$', views.OrderView.as_view()),
+    url(r'^orders/deadlines/metrics/$', views.OrderDeadlineMetricsView.as_view()),
+    url(r'^orders/(?P<order_id>\d+)/$', views.OrderDetailView.as_view()),
+    url(r'^orders/tickets/(?P<ticket_id>[0-9a-f]{32})/$', views.OrderTicketView.as_view()),
 ]
\ No newline at end of file
@@ -1,24 +1,76 @@
-from decimal import Decimal
+from django.conf import settings
 from django.shortcuts import render
-from django_redis import get_redis_connection
 from rest_framework import status
 from rest_framework.generics import GenericAPIView
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from goods.models import SKU
-from orders.serializers import OrderSKUSerializer, OrderSerializer
+from meiduo_mall.utils.pagination import KeysetPagination
+from cart.storage import RedisCart
+from orders.archive import get_archived_cutoff, get_order
+from orders.deadlines import get_deadline_metrics
+from orders.idempotency import IDEMPOTENCY_KEY_PATTERN, idempotent_response, get_request_fingerprint
+from orders.models import OrderInfo, ArchivedOrderInfo
+from orders.pricing import get_settlement
+from orders.serializers import OrderSKUSerializer, OrderSerializer, OrderListSerializer
+from orders.tickets import submit_order, get_ticket, TICKET_PENDING, TICKET_CREATED, TICKET_FAILED
+from users.models import Address
+
+
+class OrderPagination(KeysetPagination):
+    """用户订单列表分页类: 按照(下单时间, 订单id)倒序,使用索引(user_id, create_time)"""
+    ordering = ('-create_time', '-order_id')
 
 
 # POST  /orders/
+# GET   /orders/?cursor=<游标>&page_size=<页容量>
 class OrderView(GenericAPIView):
     permission_classes = [IsAuthenticated]
 
     serializer_class = OrderSerializer
 
+    pagination_class = OrderPagination
+
+    def get(self, request):
+        """
+        获取登录用户的订单列表:
+        1.查询登录用户的订单,预先一次查询出所有订单商品和对应的商品(每页固定3次查询)
+        2.按照游标分页,需要时合并归档表中的订单
+        3.序列化返回
+        """
+        # 1.查询登录用户的订单
+        queryset = OrderInfo.objects.filter(user=request.user).prefetch_related('skus__sku')
+
+        # 2.按照游标分页
+        page = self.paginate_queryset(queryset)
+
+        # 归档的订单都早于已归档订单的归档期限,热表中查询到的记录(包括多查询的一条)都晚于该期限时不需要查询归档表
+        paginator = self.paginator
+        if not paginator.has_next or paginator.rows[-1].create_time < get_archived_cutoff():
+            archived = ArchivedOrderInfo.objects.filter(user=request.user).prefetch_related('skus__sku')
+            page = paginator.extend_queryset(archived)
+
+        # 3.序列化返回
+        serializer = OrderListSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
     def post(self, request):
         """
         订单数据保存
+        请求头中有Idempotency-Key时,相同幂等键的重复请求返回第一次请求的应答,不会重复下单
+        """
+        key = request.META.get('HTTP_IDEMPOTENCY_KEY')
+        if key is None:
+            return self.create_order(request)
+
+        if not IDEMPOTENCY_KEY_PATTERN.match(key):
+            return Response({'message': 'Idempotency-Key格式错误'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return idempotent_response(request.user.id, key, get_request_fingerprint(request),
+                                   lambda: self.create_order(request))
+
+    def create_order(self, request):
+        """
          1.获取参数并进行校验(参数完整性,address是否存在,pay_method是否合法)
          2.保存订单的数据
          3.返回应答, 订单创建成功
@@ -27,6 +79,15 @@ class OrderView(GenericAPIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
+        # 异步下单: 保存购物车快照并把下单任务放入队列,返回凭证id,客户端轮询下单结果
+        if getattr(settings, 'ORDER_ASYNC_PLACEMENT', False):
+            ticket_id = submit_order(request.user, serializer.validated_data['address'],
+                                     serializer.validated_data['pay_method'])
+            if ticket_id is None:
+                return Response({'message': '购物车中没有勾选的商品'}, status=status.HTTP_400_BAD_REQUEST)
+
+            return Response({'ticket_id': ticket_id, 'status': TICKET_PENDING}, status=status.HTTP_202_ACCEPTED)
+
         #  2.保存订单的数据
         serializer.save()
 
@@ -35,54 +96,105 @@ class OrderView(GenericAPIView):
 
 
 
-# GET  /orders/settlement/
+# GET /orders/(?P<order_id>\d+)/
+class OrderDetailView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, order_id):
+        """
+        获取登录用户的订单详情:
+        1.根据订单id获取订单(订单id中的下单时间早于归档期限时先查询归档表)
+        2.序列化返回
+        """
+        # 1.根据订单id获取订单
+        order = get_order(order_id, user=request.user)
+
+        if order is None:
+            return Response({'message': '订单不存在'}, status=status.HTTP_404_NOT_FOUND)
+
+        # 2.序列化返回
+        serializer = OrderListSerializer(order)
+        return Response(serializer.data)
+
+
+# GET /orders/tickets/(?P<ticket_id>[0-9a-f]{32})/
+class OrderTicketView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, ticket_id):
+        """
+        查询异步下单的结果:
+        1.获取下单凭证,凭证不存在或者不属于登录用户时返回404
+        2.返回下单状态: pending(处理中), created(下单成功,返回order_id), failed(下单失败,返回message)
+        """
+        # 1.获取下单凭证
+        ticket = get_ticket(ticket_id)
+
+        if ticket is None or ticket.get('user_id') != str(request.user.id):
+            return Response({'message': '下单凭证不存在'}, status=status.HTTP_404_NOT_FOUND)
+
+        # 2.返回下单状态
+        res_data = {
+            'ticket_id': ticket_id,
+            'status': ticket['status']
+        }
+
+        if ticket['status'] == TICKET_CREATED:
+            res_data['order_id'] = ticket['order_id']
+        elif ticket['status'] == TICKET_FAILED:
+            res_data['message'] = ticket.get('message')
+
+        return Response(res_data)
+
+
+# GET /orders/deadlines/metrics/
+class OrderDeadlineMetricsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        """未支付订单自动取消的监控指标: 等待支付的订单数量、超时未处理的订单数量和处理延迟(秒)"""
+        return Response(get_deadline_metrics())
+
+
+# GET  /orders/settlement/?address_id=<收货地址id>
 class OrderSettlementView(APIView):
     permission_classes = [IsAuthenticated]
     def get(self, request):
         """
         获取登录用户结算商品的数据:
         1.从登录用户的redis购物车记录中获取用户购物车中被勾选的商品id和对应数量count
-        2.根据商品id获取对应的商品数据并组织运费
+        2.获取收货地址(参数中的地址或者用户的默认地址),计算结算结果(商品数据和运费,结果有缓存)
         3.将数据序列化并返回
         """
         # 获取登录用户
         user = request.user
 
         # 1.从登录用户的redis购物车记录中获取用户购物车中被勾选的商品id和对应数量count
-        # 获取redis链接
-        redis_conn = get_redis_connection('cart')
-
-        # 从redis set中获取用户购物车中被勾选的商品的id
-        cart_selected_key = 'cart_selected_%s' % user.id
-
-        sku_ids = redis_conn.smembers(cart_selected_key)
-
-        # 从redis hash中获取用户购物车中添加的所有商品的id和对应数量count
-        cart_key = 'cart_%s' % user.id
-        cart_redis = redis_conn.hgetall(cart_key)
-
-        # 组织数据
-        cart_dict = {}
-        for sku_id,count in cart_redis.items():
-            cart_dict[int(sku_id)] = int(count)
-
+        # {
+        #     <sku_id>: <count>,
+        #     ...
+        # }
+        cart_dict = RedisCart(user.id).get_selected()
 
-        # 2.根据商品id获取对应的商品数据并组织运费
-        skus = SKU.objects.filter(id__in=sku_ids)
+        # 2.获取收货地址,计算结算结果
+        address_id = request.query_params.get('address_id') or user.default_address_id
+        try:
+            address_id = int(address_id) if address_id else None
+        except ValueError:
+            return Response({'message': '收货地址参数错误'}, status=status.HTTP_400_BAD_REQUEST)
 
-        for sku in skus:
-            # 给sku对象增加属性count,保存该商品所要结算的数量
-            sku.count = cart_dict[sku.id]
+        address = None
+        if address_id:
+            address = Address.objects.filter(id=address_id, user=user, is_deleted=False).first()
 
-        serializer = OrderSKUSerializer(skus, many=True)
+        settlement = get_settlement(user, cart_dict, address)
 
-        # 组织运费:10
-        freight = Decimal(10.0)
+        serializer = OrderSKUSerializer(settlement['skus'], many=True)
 
         # 3.将数据序列化并返回
         res_data = {
-            'freight':freight,
-            'skus':serializer.data
+            'freight': settlement['freight'],
+            'skus': serializer.data
         }
 
-        return Response(res_data)
\ No newline at end of file
+        return Response(res_data)
@@ -12,7 +12,7 @@ from rest_framework_jwt.settings import api_settings
 from rest_framework_jwt.views import ObtainJSONWebToken, jwt_response_payload_handler
 
 from cart.utils import merge_cookie_cart_to_redis
-from goods.models import SKU
+from goods.cards import get_sku_card_list
 from goods.serializers import SKUSerializer
 from users import constants
 from users.serializers import UserSerializer, UserDetailSerializer, EmailSerializer, AddressSerializer, \
@@ -93,11 +93,8 @@ class BrowseHistoryView(CreateAPIView):
         #  1.从redis中获取登录用户浏览的商品sku_id
         sku_ids = redis_conn.lrange(history_key, 0, -1)
 
-        #  2.根据商品sku_id获取对应商品数据
-        skus = []
-        for sku_id in sku_ids:
-            sku = SKU.objects.get(id=sku_id)
-            skus.append(sku)
+        #  2.根据商品sku_id获取对应商品数据(SKU卡片缓存,保持浏览记录的顺序)
+        skus = get_sku_card_list(sku_ids)
 
         #  3.将商品的数据序列化并返回
         serializer = SKUSerializer(skus, many=True)
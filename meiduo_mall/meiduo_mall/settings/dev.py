@@ -13,6 +13,8 @@ import datetime
 import os
 import sys
 
+from corsheaders.defaults import default_headers
+
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -189,6 +191,30 @@ CACHES = {
             "CLIENT_CLASS": "django_redis.client.DefaultClient",
         }
     },
+    # 存储商品缓存数据(SKU卡片等)
+    "goods": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": "redis://127.0.0.1:6379/6",
+        "OPTIONS": {
+            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+        }
+    },
+    # 存储下单时的商品库存预留
+    "inventory": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": "redis://127.0.0.1:6379/7",
+        "OPTIONS": {
+            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+        }
+    },
+    # 存储订单相关的临时数据(异步下单凭证等)
+    "orders": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": "redis://127.0.0.1:6379/8",
+        "OPTIONS": {
+            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+        }
+    },
 }
 
 # from redis import StrictRedis
@@ -273,6 +299,8 @@ CORS_ORIGIN_WHITELIST = (
     'www.meiduo.site:8080',
 )
 CORS_ALLOW_CREDENTIALS = True  # 允许携带cookie
+# 允许跨域请求携带的请求头(下单接口的幂等键)
+CORS_ALLOW_HEADERS = default_headers + ('idempotency-key',)
 
 
 # JWT扩展设置
@@ -344,7 +372,11 @@ GENERATED_STATIC_HTML_FILES_DIR = os.path.join(os.path.dirname(os.path.dirname(B
 # 定时任务配置
 CRONJOBS = [
     # 每1分钟执行一次生成主页静态文件
-    ('*/1 * * * *', 'contents.crons.generate_static_index_html', '>>' + os.path.dirname(BASE_DIR) + '/logs/crontab.log')
+    ('*/1 * * * *', 'contents.crons.generate_static_index_html', '>>' + os.path.dirname(BASE_DIR) + '/logs/crontab.log'),
+    # 每天凌晨4点清理redis中的购物车记录
+    ('0 4 * * *', 'cart.crons.compact_redis_carts', '>>' + os.path.dirname(BASE_DIR) + '/logs/crontab.log'),
+    # 每1分钟执行一次库存预留对账
+    ('*/1 * * * *', 'orders.crons.reconcile_stock_reservations', '>>' + os.path.dirname(BASE_DIR) + '/logs/crontab.log'),
 ]
 
 
@@ -366,4 +398,43 @@ HAYSTACK_CONNECTIONS = {
 }
 
 # 当添加、修改、删除数据时，自动生成索引
-HAYSTACK_SIGNAL_PROCESSOR = 'haystack.signals.RealtimeSignalProcessor'
\ No newline at end of file
+HAYSTACK_SIGNAL_PROCESSOR = 'haystack.signals.RealtimeSignalProcessor'
+
+# 未登录用户购物车存储方式
+# 'cookie': 购物车数据全部保存在cookie中
+# 'redis': 购物车数据保存在redis中,cookie中只保存一个随机token
+CART_GUEST_STORAGE = 'cookie'
+
+# 购物车在redis中的存储格式
+# 'split': hash cart_<id>(商品数量) + set cart_selected_<id>(勾选商品)
+# 'single': hash cart_items_<id>(商品数量*2+勾选状态),切换之后旧格式数据在访问时自动迁移
+CART_REDIS_LAYOUT = 'split'
+
+# 登录时合并未登录用户购物车的策略
+# 'cookie': 使用未登录购物车中的数量, 'sum': 数量相加, 'max': 取较大的数量
+CART_MERGE_POLICY = 'cookie'
+
+# 购物车使用的redis节点(CACHES中的别名),按购物车id一致性哈希分布到各个节点
+# 增加或删除节点之后执行 python manage.py rebalance_carts 迁移数据
+CART_REDIS_NODES = ['cart']
+
+# 下单时是否先在redis中预留商品库存(抢购等高并发场景下开启)
+ORDER_STOCK_RESERVATION = False
+
+# 是否异步下单: 下单接口只保存购物车快照并把下单任务放入celery的orders队列,返回凭证id,
+# 客户端通过 GET /orders/tickets/<ticket_id>/ 查询下单结果
+ORDER_ASYNC_PLACEMENT = False
+
+# 订单id生成器,默认: 年月日时分秒毫秒(17位) + 节点编号(2位) + 进程编号(2位) + 序号(3位)
+ORDER_ID_GENERATOR = 'orders.ids.SnowflakeOrderIdGenerator'
+# 订单id中的节点编号(0-99),多台服务器部署时每台服务器配置不同的编号,也可以使用环境变量MEIDUO_ORDER_ID_NODE
+ORDER_ID_NODE = None
+
+# 已完成或已取消的订单超过多少天之后归档(python manage.py archive_orders)
+ORDER_ARCHIVE_DAYS = 180
+
+# 商品、分类和广告数据修改之后是否自动重新生成依赖的静态页面(goods.pages)
+STATIC_PAGES_REGENERATE = True
+
+# 合并静态页面生成请求的窗口期(秒),为0时每次修改立即发出生成任务
+STATIC_PAGES_DEBOUNCE_WINDOW = 5
@@ -1,4 +1,12 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from collections import OrderedDict
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination, BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 class StandardResultPagination(PageNumberPagination):
     """自定义分页类"""
@@ -7,4 +15,111 @@ class StandardResultPagination(PageNumberPagination):
     # 获取分页数据时,传递页容量参数名称
     page_size_query_param = 'page_size'
     # 最大页容量
-    max_page_size = 20
\ No newline at end of file
+    max_page_size = 20
+
+
+class KeysetPagination(BasePagination):
+    """
+    keyset(游标)分页类: 按照ordering中的字段排序,根据上一页最后一条记录的字段值查询下一页,
+    不使用OFFSET,翻到多后面的页查询代价都相同
+    ordering中的字段需要同为倒序或者同为正序,最后一个字段需要唯一(例如主键)
+    """
+    # 排序字段
+    ordering = ('-create_time', '-pk')
+    # 分页默认页容量
+    page_size = 10
+    # 获取分页数据时,传递页容量参数名称
+    page_size_query_param = 'page_size'
+    # 最大页容量
+    max_page_size = 50
+    # 获取分页数据时,传递游标参数名称
+    cursor_query_param = 'cursor'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+
+        return min(max(page_size, 1), self.max_page_size)
+
+    def decode_cursor(self, request, model):
+        """解析游标,返回排序字段的值列表,没有游标时返回None"""
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+
+        try:
+            values = json.loads(urlsafe_b64decode(cursor.encode() + b'=' * (-len(cursor) % 4)).decode())
+            fields = [model._meta.pk if name.lstrip('-') == 'pk' else model._meta.get_field(name.lstrip('-'))
+                      for name in self.ordering]
+            if len(values) != len(fields):
+                raise ValueError
+            return [field.to_python(value) for field, value in zip(fields, values)]
+        except Exception:
+            raise NotFound('无效的游标')
+
+    def encode_cursor(self, instance):
+        """把一条记录的排序字段的值编码为游标"""
+        values = []
+        for name in self.ordering:
+            value = getattr(instance, name.lstrip('-'))
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+
+        return urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+    def _fetch(self, queryset):
+        """查询排在游标之后的page_size+1条记录(多查询一条记录判断是否还有下一页)"""
+        queryset = queryset.order_by(*self.ordering)
+
+        # 排在游标之后的记录: (a, b) < (va, vb) 即 a < va or (a = va and b < vb)
+        values = self.decode_cursor(self.request, queryset.model)
+        if values is not None:
+            lookup = 'lt' if self.ordering[0].startswith('-') else 'gt'
+            condition = None
+            for i in reversed(range(len(self.ordering))):
+                name = self.ordering[i].lstrip('-')
+                q = Q(**{'%s__%s' % (name, lookup): values[i]})
+                if condition is not None:
+                    q |= Q(**{name: values[i]}) & condition
+                condition = q
+            queryset = queryset.filter(condition)
+
+        return list(queryset[:self.page_size_value + 1])
+
+    def _set_rows(self, rows):
+        self.rows = rows
+        self.has_next = len(rows) > self.page_size_value
+        self.page = rows[:self.page_size_value]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size_value = self.get_page_size(request)
+
+        self._set_rows(self._fetch(queryset))
+        return self.page
+
+    def extend_queryset(self, queryset):
+        """
+        在paginate_queryset之后合并另一个查询集(例如归档表)中排在游标之后的记录,
+        两个查询集的记录按照排序字段合并之后重新分页
+        """
+        def sort_key(instance):
+            return tuple(getattr(instance, name.lstrip('-')) for name in self.ordering)
+
+        rows = sorted(self.rows + self._fetch(queryset), key=sort_key, reverse=self.ordering[0].startswith('-'))
+        self._set_rows(rows[:self.page_size_value + 1])
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data)
+        ]))
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+
+# 将'scripts'上级目录到搜索包目录列表中
+import sys
+sys.path.insert(0, '../')
+
+# 购物车cookie编码格式的性能测试: 对比旧的pickle+base64格式与新的varint+签名格式
+import base64
+import os
+import pickle
+import random
+import timeit
+
+# 设置django运行所依赖环境变量
+if not os.getenv('DJANGO_SETTINGS_MODULE'):
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'meiduo_mall.settings.dev'
+
+# 让django进行一次初始化
+import django
+django.setup()
+
+from cart import codec
+
+
+def pickle_dumps(cart_dict):
+    return base64.b64encode(pickle.dumps(cart_dict)).decode()
+
+
+def pickle_loads(data):
+    return pickle.loads(base64.b64decode(data))
+
+
+def make_cart(size):
+    """生成包含size条记录的购物车字典"""
+    sku_ids = random.sample(range(1, 100000), size)
+    return {
+        sku_id: {'count': random.randint(1, 20), 'selected': random.random() < 0.8}
+        for sku_id in sku_ids
+    }
+
+
+def bench(func, arg, number):
+    """返回func(arg)单次执行的平均耗时(微秒)"""
+    return min(timeit.repeat(lambda: func(arg), number=number, repeat=5)) / number * 1e6
+
+
+if __name__ == '__main__':
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    print('%6s | %22s | %22s | %22s' % ('items', 'encode us (old/new)', 'decode us (old/new)', 'cookie bytes (old/new)'))
+    for size in (1, 5, 20, 50, 100):
+        cart_dict = make_cart(size)
+
+        old_data = pickle_dumps(cart_dict)
+        new_data = codec.dumps(cart_dict)
+        assert codec.loads(new_data) == cart_dict
+        assert codec.loads(old_data) == cart_dict
+
+        print('%6d | %10.2f / %9.2f | %10.2f / %9.2f | %10d / %9d' % (
+            size,
+            bench(pickle_dumps, cart_dict, number), bench(codec.dumps, cart_dict, number),
+            bench(pickle_loads, old_data, number), bench(codec.loads, new_data, number),
+            len(old_data), len(new_data),
+        ))